@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+from benchmarks.retrieval_bench import _git_rev
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy SDKs whose presence on a function's import path is reported
+SDKS = ("numpy", "openai", "pymongo", "azure.storage.blob", "pypdf")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def function_modules() -> List[str]:
+    return sorted(
+        name for name in os.listdir(ROOT)
+        if os.path.isfile(os.path.join(ROOT, name, "function.json"))
+    )
+
+
+def import_profile(module: str) -> Dict:
+    """
+    Import one function module in a fresh interpreter (what a cold worker
+    does) and read -X importtime: total microseconds and the SDKs pulled in.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    cumulative: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            cumulative[m.group(4)] = int(m.group(2))
+    return {
+        "ok": proc.returncode == 0,
+        "total_us": cumulative.get(module, 0),
+        "sdks": {sdk: round(cumulative[sdk] / 1000, 1) for sdk in SDKS if sdk in cumulative},
+    }
+
+
+def compare(current: dict, baseline_path: str) -> List[str]:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {r["module"]: r for r in baseline.get("results", [])}
+    lines = []
+    for r in current["results"]:
+        prev = old.get(r["module"])
+        if prev and prev.get("import_ms"):
+            delta = (r["import_ms"] - prev["import_ms"]) / prev["import_ms"]
+            lines.append(f"{r['module']}: {prev['import_ms']} -> {r['import_ms']} ms ({delta:+.1%})")
+    return lines
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Cold import time of each function module")
+    parser.add_argument("--modules", help="comma-separated function folders (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module (median reported)")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON report to diff against")
+    args = parser.parse_args(argv)
+
+    modules = [m for m in (args.modules or "").split(",") if m] or function_modules()
+    report = {
+        "benchmark": "cold_start",
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "params": {"repeat": args.repeat},
+        "results": [],
+    }
+
+    for module in modules:
+        runs = [import_profile(module) for _ in range(max(1, args.repeat))]
+        failed: Optional[Dict] = next((r for r in runs if not r["ok"]), None)
+        if failed is not None:
+            print(f"[{module}] import failed", file=sys.stderr)
+            continue
+        result = {
+            "module": module,
+            "import_ms": round(statistics.median(r["total_us"] for r in runs) / 1000, 1),
+            "sdks_ms": runs[-1]["sdks"],
+        }
+        report["results"].append(result)
+        print(f"[{module}] {result['import_ms']} ms  sdks={result['sdks_ms']}", file=sys.stderr)
+
+    if args.compare:
+        for line in compare(report, args.compare):
+            print(line, file=sys.stderr)
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out)
+    else:
+        print(out)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.openai_stub import OpenAIStub
+from benchmarks.sample_pdfs import make_pdf, revise_pages, synthetic_pages
+
+
+class StageTimer:
+    """
+    Accumulates wall time per ingest stage. Stages run on the queue's worker
+    threads, so totals are summed across threads (can exceed file wall time).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.seconds: Dict[str, float] = defaultdict(float)
+            self.calls: Dict[str, int] = defaultdict(int)
+
+    def wrap(self, stage: str, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - t0
+                with self._lock:
+                    self.seconds[stage] += elapsed
+                    self.calls[stage] += 1
+        return timed
+
+    def patch(self, module, attr: str, stage: str) -> None:
+        setattr(module, attr, self.wrap(stage, getattr(module, attr)))
+
+    def report(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                stage: {"seconds": round(self.seconds[stage], 4), "calls": self.calls[stage]}
+                for stage in sorted(self.seconds)
+            }
+
+
+class RssSampler:
+    """
+    Peak resident set size while a file is ingested. Samples /proc/self/statm
+    on Linux; elsewhere falls back to the process-wide ru_maxrss.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _current(self) -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss if sys.platform == "darwin" else rss * 1024
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self.peak_bytes = self._current()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self._current())
+
+
+class LocalBlob:
+    """
+    Stand-in for func.InputStream: a local file seen as pdfs/{category}/{name}.
+    """
+
+    def __init__(self, path: Path, category: str):
+        self._path = path
+        self.name = f"pdfs/{category}/{path.name}"
+        self.length = path.stat().st_size
+        self.uri = path.resolve().as_uri()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._path.read_bytes()
+
+
+def generate_samples(directory: Path, count: int, pages: int, seed: int, revisions: bool = False) -> List[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    out = []
+    for i in range(count):
+        path = directory / f"sample_{pages}p_{i:03d}.pdf"
+        if not path.exists():
+            path.write_bytes(make_pdf(synthetic_pages(pages, seed=seed + i)))
+        out.append(path)
+    if revisions:
+        # Lightly edited copies, ingested after all the originals
+        for i in range(count):
+            path = directory / f"sample_{pages}p_{i:03d}_rev.pdf"
+            if not path.exists():
+                path.write_bytes(make_pdf(revise_pages(synthetic_pages(pages, seed=seed + i), seed=seed + i)))
+            out.append(path)
+    return out
+
+
+def configure_environment(args, endpoint: str) -> None:
+    # settings reads the environment on every access, so this must happen
+    # before the services are first used (not necessarily imported)
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": endpoint,
+        "AZURE_OPENAI_API_KEY": "benchmark",
+        "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "text-embedding-stub",
+        "WORK_QUEUE_BACKEND": "memory",
+    })
+    for key, value in (
+        ("INGEST_RANGE_PAGES", args.range_pages),
+        ("INGEST_PAGE_BATCH", args.page_batch),
+        ("CHUNK_STRATEGY", args.chunk_strategy),
+    ):
+        if value is not None:
+            os.environ[key] = str(value)
+
+
+def instrument(timer: StageTimer, collection, local_blobs: Dict[str, Path]) -> None:
+    import blob_trigger
+    from services import blob_store, ingest
+
+    for module in (blob_trigger, ingest):
+        timer.patch(module, "open_pdf", "open_pdf")
+        timer.patch(module, "extract_pages", "extract_text")
+    timer.patch(blob_trigger, "extract_metadata", "metadata")
+    timer.patch(ingest, "chunk_page_range", "chunk")
+    timer.patch(ingest, "generate_embeddings", "embed")
+    collection.insert_many = timer.wrap("insert_many", collection.insert_many)
+
+    # Fan-out workers re-download the PDF; serve it from the local directory
+    blob_store.download_pdf_bytes = timer.wrap(
+        "download", lambda blob_path: local_blobs[blob_path].read_bytes()
+    )
+
+
+def ingest_file(path: Path, category: str, timer: StageTimer, workers: int, collection) -> dict:
+    import blob_trigger
+    from config.settings import settings
+    from services import ingest_jobs
+    from services.work_queue import drain
+
+    blob = LocalBlob(path, category)
+    blob_path = f"{category}/{path.name}"
+
+    timer.reset()
+    with RssSampler() as rss:
+        t0 = time.perf_counter()
+        blob_trigger.main(blob)
+        messages = drain(settings.INGEST_QUEUE_NAME, workers=workers)
+        wall = time.perf_counter() - t0
+
+    job = ingest_jobs.get_job(blob_path) or {}
+    pages = job.get("total_pages", 0)
+    chunks = collection.count_documents({"blob_path": blob_path})
+    return {
+        "file": path.name,
+        "bytes": blob.length,
+        "status": job.get("status"),
+        "pages": pages,
+        "chunks": chunks,
+        "near_duplicates": job.get("near_dups", 0),
+        "queue_messages": messages,
+        "wall_s": round(wall, 3),
+        "pages_per_s": round(pages / wall, 2) if wall else None,
+        "chunks_per_s": round(chunks / wall, 2) if wall else None,
+        "peak_rss_mb": round(rss.peak_bytes / (1024 * 1024), 1),
+        "stages": timer.report(),
+    }
+
+
+def rechunk_all(category: str, max_tokens: int, workers: int) -> dict:
+    """
+    Re-chunk everything ingested with a new CHUNK_MAX_TOKENS, from the stored
+    page text (services/rechunk.py) instead of re-parsing the PDFs.
+    """
+    from config.settings import settings
+    from services import rechunk
+    from services.work_queue import drain
+
+    os.environ["CHUNK_MAX_TOKENS"] = str(max_tokens)
+    t0 = time.perf_counter()
+    job = rechunk.start_rechunk(category)
+    messages = drain(settings.RECHUNK_QUEUE_NAME, workers=workers)
+    wall = time.perf_counter() - t0
+    result = rechunk.progress(rechunk.get_job(job["_id"]))
+    result.update(chunk_max_tokens=max_tokens, queue_messages=messages, wall_s=round(wall, 3))
+    return result
+
+
+def reembed_all(field: str, workers: int) -> dict:
+    """
+    Re-embed every chunk into a new field (services/reembed.py), as when
+    switching embedding deployments; the stub serves both deployments.
+    """
+    from config.settings import settings
+    from services import reembed
+    from services.work_queue import drain
+
+    t0 = time.perf_counter()
+    job = reembed.start_reembed(field, settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT + "-next")
+    messages = drain(settings.REEMBED_QUEUE_NAME, workers=workers)
+    wall = time.perf_counter() - t0
+    result = reembed.progress(reembed.get_job(job["_id"]))
+    result.update(queue_messages=messages, wall_s=round(wall, 3))
+    return result
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="End-to-end ingest benchmark (blob_trigger.main, stubbed services)")
+    parser.add_argument("--pdf-dir", help="directory of sample PDFs (default: generate synthetic ones)")
+    parser.add_argument("--generate", type=int, default=3, help="synthetic PDFs to generate without --pdf-dir")
+    parser.add_argument("--pages", type=int, default=60, help="pages per synthetic PDF")
+    parser.add_argument("--revisions", action="store_true", help="also ingest a lightly edited copy of each synthetic PDF")
+    parser.add_argument("--category", default="benchmark")
+    parser.add_argument("--store", choices=["memory", "mongomock"], default="memory")
+    parser.add_argument("--workers", type=int, default=4, help="parallel ingest_worker instances")
+    parser.add_argument("--dim", type=int, default=1536, help="stub embedding dimensions")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="stub latency per embeddings call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 429")
+    parser.add_argument("--retry-after-ms", type=int, default=50)
+    parser.add_argument("--embed-sleep", type=float, help="override the embeddings client throttle between batches (seconds)")
+    parser.add_argument("--range-pages", type=int, help="INGEST_RANGE_PAGES for this run")
+    parser.add_argument("--page-batch", type=int, help="INGEST_PAGE_BATCH for this run")
+    parser.add_argument("--chunk-strategy", choices=["structured", "legacy"])
+    parser.add_argument("--rechunk-max-tokens", type=int, help="afterwards, re-chunk everything with this CHUNK_MAX_TOKENS")
+    parser.add_argument("--reembed-field", help="afterwards, re-embed every chunk into this embedding_<version> field")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+
+    stub = OpenAIStub(
+        dim=args.dim,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        retry_after_ms=args.retry_after_ms,
+        seed=args.seed,
+    ).start()
+    configure_environment(args, stub.endpoint)
+
+    from benchmarks.memory_store import install
+    from services import embeddings
+
+    if args.store == "mongomock":
+        import mongomock
+        collection = install(mongomock.MongoClient())
+    else:
+        collection = install()
+
+    if args.embed_sleep is not None:
+        embeddings.SLEEP_SECONDS = args.embed_sleep
+
+    if args.pdf_dir:
+        files = sorted(Path(args.pdf_dir).glob("*.pdf"))
+    else:
+        files = generate_samples(
+            Path(tempfile.gettempdir()) / "pdfrag_bench_pdfs", args.generate, args.pages, args.seed, args.revisions
+        )
+    if not files:
+        parser.error("no PDFs to ingest")
+
+    timer = StageTimer()
+    local_blobs = {f"{args.category}/{p.name}": p for p in files}
+    instrument(timer, collection, local_blobs)
+
+    report = {
+        "benchmark": "ingest",
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "embedding_sleep_s": embeddings.SLEEP_SECONDS,
+        "files": [],
+    }
+    try:
+        for path in files:
+            result = ingest_file(path, args.category, timer, args.workers, collection)
+            report["files"].append(result)
+            stages = ", ".join(f"{k}={v['seconds']}s" for k, v in result["stages"].items())
+            print(
+                f"[{result['file']}] {result['status']} {result['pages']}p/{result['chunks']}c "
+                f"({result['near_duplicates']} near-duplicates) "
+                f"in {result['wall_s']}s ({result['pages_per_s']} p/s, {result['chunks_per_s']} c/s, "
+                f"peak {result['peak_rss_mb']} MB) {stages}",
+                file=sys.stderr,
+            )
+        if args.rechunk_max_tokens:
+            result = rechunk_all(args.category, args.rechunk_max_tokens, args.workers)
+            report["rechunk"] = result
+            print(
+                f"[rechunk {args.rechunk_max_tokens} tokens] {result['status']} {result['pdfs_done']} PDFs, "
+                f"{result['chunks_before']} -> {result['chunks_after']} chunks in {result['wall_s']}s "
+                f"({result['embeddings_reused']} embeddings reused, {result['embeddings_computed']} computed)",
+                file=sys.stderr,
+            )
+        if args.reembed_field:
+            result = reembed_all(args.reembed_field, args.workers)
+            report["reembed"] = result
+            print(
+                f"[reembed {args.reembed_field}] {result['status']} {result['chunks_done']}/{result['chunks_total']} "
+                f"chunks in {result['wall_s']}s ({result['chunks_per_second']} c/s, {result['requests']} requests, "
+                f"{result['rate_limited']} rate limited, {result['missing']} missing)",
+                file=sys.stderr,
+            )
+    finally:
+        report["stub"] = stub.stats()
+        stub.stop()
+
+    out = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out)
+    else:
+        print(out)
+    return report
+
+
+if __name__ == "__main__":
+    main()
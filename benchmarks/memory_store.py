@@ -0,0 +1,322 @@
+# Minimal in-memory stand-in for the parts of pymongo the services use.
+# Much faster than mongomock for large synthetic corpora (documents are not
+# deep-copied on read). Supports equality plus $in/$nin/$ne/$gt/$gte/$lt/
+# $lte/$regex/$exists/$or/$and queries ($in also on array fields),
+# $set/$inc/$unset/$setOnInsert updates and bulk_write of UpdateOne requests.
+import re
+import threading
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    from bson import ObjectId
+except ImportError:  # pragma: no cover - pymongo ships bson
+    ObjectId = None
+
+try:
+    from pymongo.errors import DuplicateKeyError
+except ImportError:  # pragma: no cover
+    class DuplicateKeyError(Exception):
+        pass
+
+_MISSING = object()
+
+
+def _get(doc: Dict, path: str) -> Any:
+    cur: Any = doc
+    for part in path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return _MISSING
+        cur = cur[part]
+    return cur
+
+
+def _match_op(value: Any, op: str, arg: Any) -> bool:
+    if op == "$in":
+        if isinstance(value, list):
+            # Array fields match when any element does
+            return any(v in arg for v in value)
+        return value is not _MISSING and value in arg or (value is _MISSING and None in arg)
+    if op == "$nin":
+        return not _match_op(value, "$in", arg)
+    if op == "$ne":
+        return (None if value is _MISSING else value) != arg
+    if op == "$exists":
+        return (value is not _MISSING) == bool(arg)
+    if op == "$regex":
+        return isinstance(value, str) and re.search(arg, value) is not None
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$gt":
+            return value > arg
+        if op == "$gte":
+            return value >= arg
+        if op == "$lt":
+            return value < arg
+        if op == "$lte":
+            return value <= arg
+    except TypeError:
+        return False
+    raise NotImplementedError(f"query operator {op}")
+
+
+def matches(doc: Dict, query: Optional[Dict]) -> bool:
+    for key, cond in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+            continue
+        if key == "$and":
+            if not all(matches(doc, q) for q in cond):
+                return False
+            continue
+
+        value = _get(doc, key)
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            if not all(_match_op(value, op, arg) for op, arg in cond.items()):
+                return False
+        elif (None if value is _MISSING else value) != cond:
+            return False
+    return True
+
+
+def _project(doc: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return doc
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    exclude = {k for k, v in projection.items() if not v}
+    return {k: v for k, v in doc.items() if k not in exclude}
+
+
+def _apply_update(doc: Dict, update: Dict, inserting: bool) -> None:
+    for op, fields in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            doc.update(fields)
+        elif op == "$inc":
+            for k, v in fields.items():
+                doc[k] = doc.get(k, 0) + v
+        elif op == "$unset":
+            for k in fields:
+                doc.pop(k, None)
+        elif op != "$setOnInsert":
+            raise NotImplementedError(f"update operator {op}")
+
+
+def _new_id():
+    return ObjectId() if ObjectId else uuid.uuid4().hex
+
+
+class MemoryCursor:
+    def __init__(self, docs: List[Dict], projection: Optional[Dict]):
+        self._docs = docs
+        self._projection = projection
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key, direction: int = 1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, d in reversed(keys):
+            self._docs.sort(
+                key=lambda doc: (_get(doc, field) is _MISSING, _get(doc, field) if _get(doc, field) is not _MISSING else 0),
+                reverse=d < 0,
+            )
+        return self
+
+    def skip(self, n: int):
+        self._skip = n
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def batch_size(self, n: int):
+        return self
+
+    def __iter__(self):
+        end = self._skip + self._limit if self._limit else None
+        for doc in self._docs[self._skip:end]:
+            yield _project(doc, self._projection)
+
+
+class MemoryCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self._docs: Dict[Any, Dict] = {}
+        self._lock = threading.RLock()
+
+    # --- reads ---
+    def _scan(self, query: Optional[Dict]) -> List[Dict]:
+        with self._lock:
+            docs = list(self._docs.values())
+        if not query:
+            return docs
+        _id = query.get("_id", _MISSING)
+        if _id is not _MISSING and not isinstance(_id, dict):
+            doc = self._docs.get(_id)
+            return [doc] if doc is not None and matches(doc, query) else []
+        return [d for d in docs if matches(d, query)]
+
+    def find(self, query: Optional[Dict] = None, projection: Optional[Dict] = None, **kwargs) -> MemoryCursor:
+        return MemoryCursor(self._scan(query), projection)
+
+    def find_one(self, query: Optional[Dict] = None, projection: Optional[Dict] = None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        return next(iter(cursor.limit(1)), None)
+
+    def count_documents(self, query: Dict) -> int:
+        return len(self._scan(query))
+
+    def distinct(self, field: str, query: Optional[Dict] = None) -> List[Any]:
+        seen: List[Any] = []
+        for doc in self._scan(query):
+            v = _get(doc, field)
+            if v is not _MISSING and v not in seen:
+                seen.append(v)
+        return seen
+
+    def create_index(self, *args, **kwargs) -> str:
+        return "noop"
+
+    def aggregate(self, *args, **kwargs):
+        raise NotImplementedError("aggregate is not supported by the memory store")
+
+    # --- writes ---
+    def insert_one(self, doc: Dict):
+        with self._lock:
+            doc.setdefault("_id", _new_id())
+            if doc["_id"] in self._docs:
+                raise DuplicateKeyError(f"duplicate _id {doc['_id']}")
+            self._docs[doc["_id"]] = doc
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    def insert_many(self, docs: Iterable[Dict], ordered: bool = True):
+        ids = [self.insert_one(d).inserted_id for d in docs]
+        return SimpleNamespace(inserted_ids=ids)
+
+    def _upsert_doc(self, query: Dict) -> Dict:
+        doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+        doc.setdefault("_id", _new_id())
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"duplicate _id {doc['_id']}")
+        return doc
+
+    def find_one_and_update(self, query, update, projection=None, return_document=False, upsert=False, sort=None):
+        with self._lock:
+            candidates = self._scan(query)
+            if sort:
+                candidates = list(MemoryCursor(candidates, None).sort(sort))
+            if candidates:
+                doc = candidates[0]
+                before = dict(doc)
+                _apply_update(doc, update, inserting=False)
+                return _project(dict(doc) if return_document else before, projection)
+            if not upsert:
+                return None
+            doc = self._upsert_doc(query)
+            _apply_update(doc, update, inserting=True)
+            self._docs[doc["_id"]] = doc
+            return _project(dict(doc), projection) if return_document else None
+
+    def update_one(self, query, update, upsert: bool = False):
+        with self._lock:
+            candidates = self._scan(query)
+            if candidates:
+                _apply_update(candidates[0], update, inserting=False)
+                return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+            if not upsert:
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+            doc = self._upsert_doc(query)
+            _apply_update(doc, update, inserting=True)
+            self._docs[doc["_id"]] = doc
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+
+    def update_many(self, query, update, upsert: bool = False):
+        with self._lock:
+            candidates = self._scan(query)
+            for doc in candidates:
+                _apply_update(doc, update, inserting=False)
+            return SimpleNamespace(matched_count=len(candidates), modified_count=len(candidates), upserted_id=None)
+
+    def bulk_write(self, requests, ordered: bool = True):
+        # pymongo UpdateOne requests only
+        modified = 0
+        for op in requests:
+            modified += self.update_one(op._filter, op._doc, upsert=op._upsert).modified_count
+        return SimpleNamespace(modified_count=modified)
+
+    def replace_one(self, query, replacement: Dict, upsert: bool = False):
+        with self._lock:
+            candidates = self._scan(query)
+            if candidates:
+                old = candidates[0]
+                new = dict(replacement)
+                new["_id"] = old["_id"]
+                self._docs[old["_id"]] = new
+                return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+            if not upsert:
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+            doc = dict(replacement)
+            doc.setdefault("_id", query.get("_id", _new_id()))
+            self._docs[doc["_id"]] = doc
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+
+    def delete_one(self, query):
+        with self._lock:
+            candidates = self._scan(query)[:1]
+            for doc in candidates:
+                del self._docs[doc["_id"]]
+            return SimpleNamespace(deleted_count=len(candidates))
+
+    def delete_many(self, query):
+        with self._lock:
+            candidates = self._scan(query)
+            for doc in candidates:
+                del self._docs[doc["_id"]]
+            return SimpleNamespace(deleted_count=len(candidates))
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self._collections: Dict[str, MemoryCollection] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(name)
+            return self._collections[name]
+
+    __getattr__ = __getitem__
+
+
+class MemoryClient:
+    def __init__(self):
+        self._dbs: Dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self._dbs:
+            self._dbs[name] = MemoryDatabase()
+        return self._dbs[name]
+
+
+def install(client=None):
+    """
+    Point services.mongo_store at an in-memory (or mongomock) client instead
+    of a real server. Returns the chunk collection.
+    """
+    from services import mongo_store as store
+
+    client = client if client is not None else MemoryClient()
+    store._client = client
+    store._collection = client[store.MONGO_DB_NAME][store.MONGO_COLLECTION_NAME]
+    return store._collection
@@ -0,0 +1,216 @@
+# Local Azure OpenAI-compatible embeddings and chat endpoint for offline
+# benchmarks. Embeddings are deterministic per input text, so repeated runs
+# store identical vectors; latency and HTTP 429 responses can be injected.
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+
+_EMBEDDINGS_PATH = re.compile(r"^/openai/deployments/[^/]+/embeddings$")
+# Azure (deployment) and plain OpenAI-style routes
+_CHAT_PATH = re.compile(r"^(/openai/deployments/[^/]+|/v1)?/chat/completions$")
+
+
+def deterministic_embedding(text: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+class OpenAIStub:
+    """
+    Threaded HTTP server on 127.0.0.1 answering
+    POST /openai/deployments/{name}/embeddings and chat completions
+    (/openai/deployments/{name}/chat/completions or /v1/chat/completions,
+    streamed or not). latency_ms is the time to the first byte/token.
+    """
+
+    def __init__(
+        self,
+        dim: int = 1536,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after_ms: int = 50,
+        seed: int = 0,
+        reply: str = "Stub answer.",
+        token_ms: float = 0.0,
+    ):
+        self.dim = dim
+        self.reply = reply
+        self.token_ms = token_ms
+        self.completions = 0
+        self.aborted = 0
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.retry_after_ms = retry_after_ms
+        self.requests = 0
+        self.throttled = 0
+        self.inputs = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "OpenAIStub":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                path = self.path.split("?", 1)[0]
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if _CHAT_PATH.match(path):
+                    stub._handle_chat(self, json.loads(body or b"{}"))
+                    return
+                if not _EMBEDDINGS_PATH.match(path):
+                    self._send(404, {"error": {"code": "NotFound", "message": path}})
+                    return
+                stub._handle(self, json.loads(body or b"{}"))
+
+            def _send(self, status: int, payload: dict, headers: Optional[dict] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="openai-stub", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _delay_or_throttle(self, handler) -> bool:
+        """
+        Sleep the injected latency; answer 429 (and return False) for the
+        injected share of requests.
+        """
+        with self._lock:
+            self.requests += 1
+            delay = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+            throttle = self._rng.random() < self.error_rate
+            if throttle:
+                self.throttled += 1
+
+        if delay:
+            time.sleep(delay / 1000)
+
+        if throttle:
+            handler._send(
+                429,
+                {"error": {"code": "429", "message": "Rate limit is exceeded (benchmark stub)"}},
+                {"retry-after-ms": str(self.retry_after_ms), "retry-after": str(max(1, self.retry_after_ms // 1000))},
+            )
+            return False
+        return True
+
+    def _handle(self, handler, request: dict) -> None:
+        if not self._delay_or_throttle(handler):
+            return
+
+        texts: List[str] = request.get("input") or []
+        if isinstance(texts, str):
+            texts = [texts]
+        with self._lock:
+            self.inputs += len(texts)
+
+        # The openai SDK asks for base64 (packed float32) unless told otherwise
+        as_base64 = request.get("encoding_format") == "base64"
+        data = []
+        for i, text in enumerate(texts):
+            vec = deterministic_embedding(text, self.dim)
+            emb = base64.b64encode(vec.tobytes()).decode("ascii") if as_base64 else vec.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": emb})
+
+        tokens = sum(len(t.split()) for t in texts)
+        handler._send(200, {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _handle_chat(self, handler, request: dict) -> None:
+        if not self._delay_or_throttle(handler):
+            return
+
+        model = request.get("model", "stub")
+        words = self.reply.split(" ")
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+
+        if not request.get("stream"):
+            with self._lock:
+                self.completions += 1
+            handler._send(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        # Server-sent events, one word per chunk, token_ms apart
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+
+        def event(choices, extra=None) -> bytes:
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": choices}
+            chunk.update(extra or {})
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        try:
+            for i, word in enumerate(words):
+                if i and self.token_ms:
+                    time.sleep(self.token_ms / 1000)
+                text = word if i == 0 else " " + word
+                handler.wfile.write(event([{"index": 0, "delta": {"content": text}, "finish_reason": None}]))
+                handler.wfile.flush()
+            handler.wfile.write(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+            if (request.get("stream_options") or {}).get("include_usage"):
+                handler.wfile.write(event([], {"usage": usage}))
+            handler.wfile.write(b"data: [DONE]\n\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client closed the stream (e.g. a hedged request that lost)
+            with self._lock:
+                self.aborted += 1
+            return
+        with self._lock:
+            self.completions += 1
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "inputs": self.inputs,
+            "completions": self.completions,
+            "aborted": self.aborted,
+        }
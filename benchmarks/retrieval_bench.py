@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.memory_store import install
+from services import vector_index
+from services.search_filters import SearchFilter
+from services.vector_search import MIN_SCORE
+
+# Engines under test: name -> fn(query_embedding, category, top_k, filters) -> [chunk _id]
+ENGINES: Dict[str, Callable[[List[float], str, int, Optional[SearchFilter]], List]] = {}
+
+
+def engine(name: str):
+    def register(fn):
+        ENGINES[name] = fn
+        return fn
+    return register
+
+
+@engine("search_vectors")
+def _search_vectors(query, category, top_k, filters=None):
+    from services.vector_search import search_vectors
+    return [d["_id"] for d in search_vectors(query, category, top_k=top_k, filters=filters)]
+
+
+def make_corpus(n_chunks: int, dim: int, n_categories: int, n_clusters: int, seed: int):
+    """
+    Clustered unit vectors (topic centers + noise), so neighbours have
+    realistic cosine scores instead of the ~0 of independent random vectors.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, n_clusters, size=n_chunks)
+    vecs = centers[assign] + rng.normal(scale=1.0, size=(n_chunks, dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    categories = np.array([f"cat{i:03d}" for i in range(n_categories)])[rng.integers(0, n_categories, size=n_chunks)]
+    return centers, vecs, categories
+
+
+def make_queries(centers: np.ndarray, n_queries: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    picks = centers[rng.integers(0, len(centers), size=n_queries)]
+    q = picks + rng.normal(scale=1.0, size=picks.shape).astype(np.float32)
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def _pdf_name(category: str, i: int) -> str:
+    return f"{category}-doc{i // 200}.pdf"
+
+
+def make_filter(kind: str, rng, categories: np.ndarray, category) -> Tuple[Optional[SearchFilter], Optional[np.ndarray]]:
+    """
+    A random filter of the given kind and the corpus rows it selects
+    (same synthetic metadata as load_store). (None, None) for "none".
+    """
+    n = len(categories)
+    rows = np.arange(n)
+    if kind == "year":
+        year = 2015 + int(rng.integers(0, 8))
+        return SearchFilter(year_from=year, year_to=year + 2), (2015 + rows % 10 >= year) & (2015 + rows % 10 <= year + 2)
+    if kind == "pages":
+        page = int(rng.integers(1, 42))
+        pages = (rows % 200) // 4 + 1
+        return SearchFilter(page_from=page, page_to=page + 9), (pages >= page) & (pages <= page + 9)
+    if kind == "pdfs":
+        scope = rows if category is None else np.flatnonzero(categories == category)
+        picks = rng.choice(scope, size=3)
+        names = sorted({_pdf_name(categories[i], int(i)) for i in picks})
+        mask = np.zeros(n, dtype=bool)
+        for i in picks:
+            mask |= (categories == categories[i]) & (rows // 200 == i // 200)
+        return SearchFilter(pdf_names=names), mask
+    return None, None
+
+
+def load_store(vecs: np.ndarray, categories: np.ndarray, store: str):
+    if store == "mongomock":
+        import mongomock
+        collection = install(mongomock.MongoClient())
+    else:
+        collection = install()
+
+    docs = []
+    pdfs: Dict[str, Dict] = {}
+    for i, (v, c) in enumerate(zip(vecs, categories)):
+        entry = pdfs.setdefault(f"{c}/{_pdf_name(c, i)}", {"category": str(c), "pdf_name": _pdf_name(c, i), "chunk_count": 0})
+        entry["chunk_count"] += 1
+        docs.append({
+            "_id": i,
+            "category": str(c),
+            "pdf_name": _pdf_name(c, i),
+            "blob_path": f"{c}/{_pdf_name(c, i)}",
+            "chunk_index": i % 200,
+            "page_number": (i % 200) // 4 + 1,
+            "year": 2015 + i % 10,
+            "text": "",
+            "embedding": v.tolist(),
+        })
+        if len(docs) == 10000:
+            collection.insert_many(docs)
+            docs = []
+    if docs:
+        collection.insert_many(docs)
+
+    # Catalog entries: global search plans its per-category shards from them
+    from config.settings import settings
+    from services import catalog
+    from services.mongo_store import mongo_store
+    mongo_store.get_collection(settings.CATALOG_COLLECTION).insert_many([
+        dict(entry, _id=path, blob_path=path, status=catalog.READY) for path, entry in pdfs.items()
+    ])
+    # Complete already: the memory store can't run the backfill's aggregation
+    mongo_store.get_collection(settings.CATALOG_COLLECTION + "_meta").insert_one({"_id": catalog.BACKFILL_MARKER_ID})
+    catalog.invalidate()
+    return collection
+
+
+def exact_top_k(vecs: np.ndarray, categories: np.ndarray, query: np.ndarray, category, k: int, rows: Optional[np.ndarray] = None) -> List[int]:
+    select = np.ones(len(vecs), dtype=bool) if rows is None else rows.copy()
+    if category is not None:
+        select &= categories == category
+    idx = np.flatnonzero(select)
+    scores = vecs[idx] @ query
+    order = np.argsort(-scores)[:k]
+    # Mirror the service's relevance floor so recall only counts reachable hits
+    return [int(idx[i]) for i in order if scores[i] >= MIN_SCORE]
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_engine(name, queries, scopes, filters, vecs, categories, top_k, warmup):
+    fn = ENGINES[name]
+    for q, scope, (flt, _) in list(zip(queries, scopes, filters))[:warmup]:
+        fn(q.tolist(), scope, top_k, flt)
+
+    latencies = []
+    recalls = []
+    rss_before = _rss_mb()
+    for q, scope, (flt, rows) in list(zip(queries, scopes, filters))[warmup:]:
+        t0 = time.perf_counter()
+        got = fn(q.tolist(), scope, top_k, flt)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        truth = exact_top_k(vecs, categories, q, scope, top_k, rows)
+        recalls.append(len(set(got) & set(truth)) / len(truth) if truth else 1.0)
+
+    lat = np.array(latencies)
+    return {
+        "engine": name,
+        "queries": len(latencies),
+        "p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "p95_ms": round(float(np.percentile(lat, 95)), 3),
+        "p99_ms": round(float(np.percentile(lat, 99)), 3),
+        "mean_ms": round(float(lat.mean()), 3),
+        "qps": round(len(lat) / (lat.sum() / 1000), 2),
+        f"recall@{top_k}": round(float(np.mean(recalls)), 4),
+        "index_mb": round(sum(i["bytes"] for i in vector_index.stats()) / 1e6, 1),
+        "peak_rss_mb": round(_rss_mb(), 1),
+        "rss_growth_mb": round(_rss_mb() - rss_before, 1),
+    }
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, baseline_path: str) -> List[str]:
+    """
+    Human-readable deltas against a previous JSON report.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {(r["n_chunks"], r["engine"]): r for r in baseline.get("results", [])}
+    lines = []
+    for r in current["results"]:
+        prev = old.get((r["n_chunks"], r["engine"]))
+        if not prev:
+            continue
+        parts = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "qps"):
+            if prev.get(key):
+                parts.append(f"{key} {prev[key]} -> {r[key]} ({(r[key] - prev[key]) / prev[key]:+.1%})")
+        lines.append(f"{r['engine']} @ {r['n_chunks']}: " + ", ".join(parts))
+    return lines
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark on a synthetic corpus")
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--scope", choices=["category", "global", "mixed"], default="mixed")
+    parser.add_argument("--filter", choices=["none", "year", "pages", "pdfs"], default="none",
+                        help="metadata filter applied to every query")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma-separated engine names")
+    parser.add_argument("--store", choices=["memory", "mongomock"], default="memory")
+    parser.add_argument("--reduced-dim", type=int, default=0,
+                        help="first-pass dims of the in-memory index (VECTOR_INDEX_REDUCED_DIM), 0 = full")
+    parser.add_argument("--reduction", choices=["truncate", "pca"], default="truncate")
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON report to diff against")
+    args = parser.parse_args(argv)
+    os.environ["VECTOR_INDEX_REDUCED_DIM"] = str(args.reduced_dim)
+    os.environ["VECTOR_INDEX_REDUCTION"] = args.reduction
+    os.environ["VECTOR_RESCORE_FACTOR"] = str(args.rescore_factor)
+
+    report = {
+        "benchmark": "retrieval",
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": [],
+    }
+
+    for n in [int(s) for s in args.sizes.split(",") if s]:
+        centers, vecs, categories = make_corpus(n, args.dim, args.categories, args.clusters, args.seed)
+        t0 = time.perf_counter()
+        vector_index.invalidate()
+        load_store(vecs, categories, args.store)
+        load_s = time.perf_counter() - t0
+
+        queries = make_queries(centers, args.queries + args.warmup, args.seed)
+        rng = np.random.default_rng(args.seed + 2)
+        cat_names = sorted(set(categories.tolist()))
+        scopes = []
+        for i in range(len(queries)):
+            if args.scope == "global" or (args.scope == "mixed" and i % 2):
+                scopes.append(None)
+            else:
+                scopes.append(cat_names[int(rng.integers(0, len(cat_names)))])
+        filters = [make_filter(args.filter, rng, categories, scope) for scope in scopes]
+
+        for name in [e for e in args.engines.split(",") if e]:
+            if name not in ENGINES:
+                print(f"unknown engine {name}", file=sys.stderr)
+                continue
+            result = run_engine(name, queries, scopes, filters, vecs, categories, args.top_k, args.warmup)
+            result.update({"n_chunks": n, "dim": args.dim, "store_load_s": round(load_s, 2)})
+            report["results"].append(result)
+            print(f"[{name} @ {n}] p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                  f"qps={result['qps']} recall={result[f'recall@{args.top_k}']} index={result['index_mb']}MB", file=sys.stderr)
+
+    if args.compare:
+        for line in compare(report, args.compare):
+            print(line, file=sys.stderr)
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out)
+    else:
+        print(out)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.openai_stub import OpenAIStub
+
+
+def _per_provider(raw: str, names: List[str], default: float) -> Dict[str, float]:
+    """
+    "a=200,b=50" -> {"a": 200.0, "b": 50.0}; a bare number applies to all.
+    """
+    values = {n: default for n in names}
+    for part in [p for p in raw.split(",") if p]:
+        if "=" in part:
+            name, value = part.split("=", 1)
+            values[name.strip()] = float(value)
+        else:
+            values = {n: float(part) for n in names}
+    return values
+
+
+def configure_environment(args, stubs: Dict[str, OpenAIStub]) -> None:
+    """
+    One OpenAI-compatible provider per stub, routed by services/llm_router.py.
+    """
+    os.environ["LLM_PROVIDERS"] = ",".join(stubs)
+    for name, stub in stubs.items():
+        prefix = f"LLM_{name.upper()}_"
+        os.environ[prefix + "BASE_URL"] = stub.endpoint + "/v1"
+        os.environ[prefix + "MODEL"] = f"stub-{name}"
+        os.environ[prefix + "API_KEY"] = "bench"
+    os.environ["LLM_HEDGE_ENABLED"] = "true" if args.hedge else "false"
+    os.environ["LLM_HEDGE_DELAY_MS"] = str(args.hedge_delay_ms)
+    os.environ["LLM_MAX_RETRIES"] = str(args.max_retries)
+    os.environ["METRICS_ENABLED"] = "false"
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Chat completion router benchmark against local provider stubs")
+    parser.add_argument("--providers", default="primary,backup", help="comma-separated provider names (one stub each)")
+    parser.add_argument("--latency-ms", default="primary=150,backup=600", help="time to first token per provider (name=ms,...)")
+    parser.add_argument("--jitter-ms", default="primary=800", help="uniform extra latency per provider (tail)")
+    parser.add_argument("--error-rate", default="", help="fraction of HTTP 429 answers per provider")
+    parser.add_argument("--token-ms", type=float, default=5.0, help="delay between streamed tokens")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--hedge", action="store_true", help="enable hedged requests (LLM_HEDGE_ENABLED)")
+    parser.add_argument("--hedge-delay-ms", type=int, default=2000)
+    parser.add_argument("--max-retries", type=int, default=0, help="SDK retries per provider")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--log-level", default="ERROR")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+
+    names = [n.strip() for n in args.providers.split(",") if n.strip()]
+    latency = _per_provider(args.latency_ms, names, 0.0)
+    jitter = _per_provider(args.jitter_ms, names, 0.0)
+    errors = _per_provider(args.error_rate, names, 0.0)
+    stubs = {
+        name: OpenAIStub(
+            latency_ms=latency[name],
+            jitter_ms=jitter[name],
+            error_rate=errors[name],
+            seed=args.seed + i,
+            reply=f"Answer from {name} with a few more words to stream.",
+            token_ms=args.token_ms,
+        ).start()
+        for i, name in enumerate(names)
+    }
+    configure_environment(args, stubs)
+
+    from services.llm_router import get_router
+    router = get_router()
+
+    latencies = []
+    answered_by: Dict[str, int] = {n: 0 for n in names}
+    failed = 0
+    messages = [{"role": "user", "content": "benchmark question"}]
+    try:
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            try:
+                _, provider, _ = router.complete(messages, temperature=0.0, max_tokens=64)
+                answered_by[provider.name] += 1
+            except Exception:
+                failed += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+    finally:
+        stub_stats = {name: stub.stats() for name, stub in stubs.items()}
+        for stub in stubs.values():
+            stub.stop()
+
+    lat = np.array(latencies)
+    report = {
+        "benchmark": "router",
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "requests": len(lat),
+        "failed": failed,
+        "p50_ms": round(float(np.percentile(lat, 50)), 1),
+        "p95_ms": round(float(np.percentile(lat, 95)), 1),
+        "p99_ms": round(float(np.percentile(lat, 99)), 1),
+        "answered_by": answered_by,
+        "hedges": router.hedges,
+        "hedge_wins": router.hedge_wins,
+        "providers": {
+            p.name: {
+                "p50_s": p.stats.latency(0.5),
+                "p95_first_token_s": p.stats.latency(0.95, first_token=True),
+                "error_rate": round(p.stats.error_rate(), 3),
+                "healthy": p.stats.healthy,
+            }
+            for p in router.providers
+        },
+        "stubs": stub_stats,
+    }
+    print(
+        f"[router hedge={args.hedge}] p50={report['p50_ms']}ms p95={report['p95_ms']}ms p99={report['p99_ms']}ms "
+        f"failed={failed} answered_by={answered_by} hedges={router.hedges} (won {router.hedge_wins})",
+        file=sys.stderr,
+    )
+
+    out = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out)
+    else:
+        print(out)
+    return report
+
+
+if __name__ == "__main__":
+    main()
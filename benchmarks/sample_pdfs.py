@@ -0,0 +1,92 @@
+# Dependency-free generator of small text PDFs (Helvetica, one content
+# stream per page) for the ingest benchmark when no sample directory is given.
+import random
+from typing import List
+
+WORDS = (
+    "matrix vector integral derivative theorem proof lemma function limit series "
+    "energy force mass velocity reaction molecule cell protein empire treaty war "
+    "revolution manual install configure device voltage sensor module output input "
+    "the of and to in is that for with as on by this are be from at an which it"
+).split()
+
+LINES_PER_PAGE = 48
+CHARS_PER_LINE = 90
+
+
+def _escape(line: str) -> bytes:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace")
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """
+    Build a PDF with one page per string ("\\n" separates lines).
+    """
+    objs: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objs.append(body)
+        return len(objs)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    # Page objects reference the page tree, which is added after them
+    pages_id = len(objs) + 2 * len(pages) + 1
+    kids = []
+    for text in pages:
+        content = b"BT /F1 10 Tf 40 800 Td 15 TL " + b" ".join(
+            b"(" + _escape(line) + b") '" for line in text.split("\n")
+        ) + b" ET"
+        stream = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, stream, font)
+        ))
+    add(b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % len(kids))
+    root = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, root, xref)
+    return bytes(out)
+
+
+def synthetic_pages(n_pages: int, seed: int = 0) -> List[str]:
+    """
+    Pages of pseudo-prose with a numbered section heading every few pages.
+    """
+    rng = random.Random(seed)
+    pages = []
+    for p in range(n_pages):
+        lines = []
+        if p % 3 == 0:
+            lines.append(f"{p // 3 + 1}. Section {rng.choice(WORDS).title()} {rng.choice(WORDS).title()}")
+        while len(lines) < LINES_PER_PAGE:
+            line = ""
+            while len(line) < CHARS_PER_LINE:
+                word = rng.choice(WORDS)
+                line += word + (". " if rng.random() < 0.08 else " ")
+            lines.append(line.strip())
+        pages.append("\n".join(lines))
+    return pages
+
+
+def revise_pages(pages: List[str], seed: int = 0) -> List[str]:
+    """
+    A light revision of a document: one word replaced on every page, so
+    most chunks come out as near-duplicates of the original's.
+    """
+    rng = random.Random(seed)
+    revised = []
+    for text in pages:
+        words = text.split(" ")
+        i = rng.randrange(len(words))
+        words[i] = rng.choice(WORDS)
+        revised.append(" ".join(words))
+    return revised
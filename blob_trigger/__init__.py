@@ -1,13 +1,19 @@
 import logging
 import azure.functions as func
+import hashlib
 import os
-import io
-from pypdf import PdfReader
+from datetime import datetime, timezone
 
-from services.pdf_processor import extract_text_and_metadata
-from services.chunker import chunk_text
-from services.embeddings import generate_embeddings
+from services.pdf_processor import open_pdf, extract_pages, extract_metadata
+from services.ingest import enqueue_range, process_range_message
+from services import catalog, ingest_jobs
 from services.mongo_store import mongo_store
+from services.profiler import profile_if_slow
+from services.tracing import span, trace
+from config.settings import settings
+
+# Pages sampled for the year fallback when the PDF has no creation date
+METADATA_SAMPLE_PAGES = 5
 
 
 def main(myblob: func.InputStream):
@@ -17,6 +23,11 @@ def main(myblob: func.InputStream):
         myblob.length
     )
 
+    with trace("blob_trigger", blob=myblob.name) as tr, profile_if_slow("blob_trigger", tr):
+        _ingest(myblob)
+
+
+def _ingest(myblob: func.InputStream):
     try:
         # myblob.name format: pdfs/{category}/{filename}
         path_parts = myblob.name.split("/")
@@ -31,101 +42,83 @@ def main(myblob: func.InputStream):
         logging.info("Parsed category=%s, filename=%s", category, filename)
 
         # 1. Read blob bytes
-        pdf_bytes = myblob.read()
+        with span("read_blob") as s:
+            pdf_bytes = myblob.read()
+            s.set(bytes=len(pdf_bytes or b""))
         if not pdf_bytes:
             logging.warning("Blob is empty. Skipping processing.")
             return
 
-        # 2. Extract metadata (year/date)
-        _, metadata = extract_text_and_metadata(pdf_bytes)
-
-        # 3. Page-wise extraction & chunking
-        MAX_TOTAL_CHUNKS = 1200
-        all_chunks = []
-        all_page_nums = []
-
+        # 2. Open PDF & extract metadata (year/date)
         try:
-            reader = PdfReader(io.BytesIO(pdf_bytes))
-            for i, page in enumerate(reader.pages):
-                if len(all_chunks) >= MAX_TOTAL_CHUNKS:
-                    logging.info("MAX_TOTAL_CHUNKS reached, stopping extraction.")
-                    break
-
-                page_text = page.extract_text()
-                if not page_text or not page_text.strip():
-                    continue
-
-                page_chunks = chunk_text(page_text)
-                if page_chunks:
-                    remaining = MAX_TOTAL_CHUNKS - len(all_chunks)
-                    actual_chunks = page_chunks[:remaining]
-                    
-                    all_chunks.extend(actual_chunks)
-                    all_page_nums.extend([i + 1] * len(actual_chunks))
-
+            with span("open_pdf") as s:
+                reader = open_pdf(pdf_bytes)
+                total_pages = len(reader.pages)
+                s.set(pages=total_pages)
+            with span("metadata", sample_pages=METADATA_SAMPLE_PAGES):
+                sample = "\n".join(extract_pages(reader, 0, METADATA_SAMPLE_PAGES))
+                metadata = extract_metadata(reader, sample)
         except Exception as pdf_err:
             logging.exception("PDF page extraction failed")
             return
 
-        if not all_chunks:
-            logging.warning("No chunks generated from PDF.")
-            return
-
-        logging.info("Generated %d chunks across pages", len(all_chunks))
-
-        # 4. Generate embeddings
-        embeddings = generate_embeddings(all_chunks)
-
-        if len(embeddings) != len(all_chunks):
-            logging.error(
-                "Embedding mismatch: chunks=%d embeddings=%d",
-                len(all_chunks),
-                len(embeddings)
-            )
-            return
-
-        # 5. MongoDB operations (SAFE)
-        collection = mongo_store.collection
-        if collection is None:
+        # 3. MongoDB operations (SAFE)
+        if mongo_store.collection is None:
             logging.error("MongoDB collection not available. Skipping insert.")
             return
 
-        # Remove existing chunks for same PDF
-        mongo_store.delete_pdf(category, filename)
+        # Remove existing chunks for same PDF, then (re)start the ingest job
+        with span("delete_existing"):
+            mongo_store.delete_pdf(category, filename)
 
-        documents = []
-        year = metadata.get("year", 2025)
-        date_str = metadata.get("date", "")
-
-        # Prepare metadata
-        from datetime import datetime, timezone
-        upload_time = datetime.now(timezone.utc)
         blob_path_str = f"{category}/{filename}"
+        upload_time = datetime.now(timezone.utc)
+        pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+        ranges = ingest_jobs.split_ranges(total_pages, settings.INGEST_RANGE_PAGES)
+        run_id = ingest_jobs.start_job(
+            blob_path_str,
+            category,
+            filename,
+            total_pages,
+            metadata,
+            upload_time,
+            ranges,
+            pdf_hash=pdf_hash,
+        )
+        if run_id is None:
+            logging.error("Ingest job store not available. Skipping insert.")
+            return
 
-        for idx, (txt, emb, p_num) in enumerate(
-            zip(all_chunks, embeddings, all_page_nums)
-        ):
-            documents.append({
-                "category": category,
-                "pdf_name": filename,
-                "blob_path": blob_path_str,
-                "chunk_index": idx,
-                "text": txt,
-                "embedding": emb,
-                "year": year,
-                "date": date_str,
-                "page_number": p_num,
-                "uploaded_at": upload_time
-            })
-
-        if documents:
-            collection.insert_many(documents)
-            logging.info(
-                "Stored PDF %s with %d chunks (page-level)",
+        # Document catalog entry (list_api / categories_api read this)
+        with span("catalog_upsert"):
+            catalog.upsert_entry(
+                blob_path_str,
+                category,
                 filename,
-                len(documents)
+                page_count=total_pages,
+                chunk_count=0,
+                year=metadata.get("year", 2025),
+                date=metadata.get("date", ""),
+                uploaded_at=upload_time,
+                size=len(pdf_bytes),
+                hash=pdf_hash,
+                status=catalog.PROCESSING,
             )
 
+        # 4. Page ranges -> chunks -> embeddings -> Mongo.
+        # Small PDFs are done inline; larger ones fan out to ingest_worker
+        # instances via the ingest queue, and the last range marks the PDF ready.
+        if len(ranges) == 1:
+            process_range_message(
+                {"blob_path": blob_path_str, "run_id": run_id, "start": ranges[0][0]},
+                reader=reader,
+            )
+        else:
+            with span("fan_out", ranges=len(ranges)):
+                for start, _ in ranges:
+                    enqueue_range(blob_path_str, run_id, start)
+            logging.info("Fanned out %s into %d page ranges", blob_path_str, len(ranges))
+
     except Exception as exc:
         logging.exception("Blob trigger failed")
         # Re-raise so Azure logs it clearly (but logic bugs are now fixed)
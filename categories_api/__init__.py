@@ -1,9 +1,12 @@
 import logging
 import azure.functions as func
 import json
-from services.mongo_store import mongo_store
+from services import catalog
 from services.auth import validate_pin
+from services.http_cache import json_response
+from services.tracing import traced
 
+@traced("categories_api")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("Categories API triggered")
 
@@ -12,12 +15,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         return auth_error
 
     try:
-        cats = mongo_store.get_all_categories()
-        return func.HttpResponse(
-            json.dumps({"categories": sorted(list(cats))}),
-            status_code=200,
-            mimetype="application/json"
-        )
+        cats = catalog.list_categories()
+        return json_response(req, {"categories": sorted(list(cats))})
     except Exception as e:
         logging.exception("Categories API failed")
         return func.HttpResponse(
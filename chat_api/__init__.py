@@ -1,12 +1,53 @@
 import json
 import logging
 import azure.functions as func
-import os
+import urllib.parse
 
 from services.embeddings import get_embedding
 from services.vector_search import search_vectors
+from services.search_filters import SearchFilter
+from services.rerank import rerank_chunks
 from services.chat_completion import get_chat_completion
 from services.mongo_store import mongo_store
+from services import catalog, sessions
+from services.profiler import profile_if_slow
+from services.tracing import current_span, span, trace
+
+
+def _download_url(chunk: dict) -> str:
+    """
+    Inline viewer link that opens at the cited page; download_api serves
+    byte ranges so the browser viewer fetches only what it needs. The
+    client authorizes it with its own pin (header or ?pin=).
+    """
+    blob_path = chunk.get("blob_path") or f"{chunk.get('category')}/{chunk.get('pdf_name')}"
+    params = {"blob": blob_path, "inline": "1"}
+    return f"/api/download?{urllib.parse.urlencode(params)}#page={chunk.get('page_number', 1)}"
+
+
+def _respond(payload: dict, tr, status_code: int = 200) -> func.HttpResponse:
+    """
+    JSON response; with a recording trace (debug requests) the stage
+    timings and span tree are attached under "debug".
+    """
+    if tr is not None and status_code == 200:
+        payload["debug"] = dict(tr.to_dict(), stage_ms=tr.stage_ms())
+    return func.HttpResponse(
+        json.dumps(payload, default=str),
+        status_code=status_code,
+        mimetype="application/json",
+    )
+
+
+def _debug_requested(req: func.HttpRequest) -> bool:
+    if req.params.get("debug", "").lower() in ("1", "true"):
+        return True
+    try:
+        body = req.get_json()
+    except ValueError:
+        return False
+    # Other bodies (lists, null) get _answer's JSON error response
+    return isinstance(body, dict) and bool(body.get("debug"))
 
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
@@ -16,6 +57,15 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     if auth_error := validate_pin(req):
         return auth_error
 
+    debug = _debug_requested(req)
+    with trace("chat_api", request_id=req.headers.get("x-request-id"), record=debug) as tr, \
+            profile_if_slow("chat_api", tr, req.headers.get("x-request-id")):
+        response = _answer(req, tr if debug else None)
+        current_span().set(status=response.status_code)
+        return response
+
+
+def _answer(req: func.HttpRequest, tr) -> func.HttpResponse:
     try:
         body = req.get_json()
         question = body.get("question", "").strip()
@@ -23,28 +73,33 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         category = (category_raw if category_raw else "all").lower()
 
         if not question:
-            return func.HttpResponse(
-                json.dumps({"error": "Question is required"}),
-                status_code=400,
-                mimetype="application/json",
-            )
+            return _respond({"error": "Question is required"}, tr, status_code=400)
 
         # 0. Check Database Health
         if mongo_store.collection is None:
-             return func.HttpResponse(
-                json.dumps({
+             return _respond({
                     "answer": "⚠️ **System Error:** The application cannot connect to the database. Please verify your Azure 'MONGO_URI' setting.",
                     "sources": [],
                     "results": []
-                }),
-                mimetype="application/json",
-            )
+                }, tr)
+
+        # Session mode: follow-ups are rewritten to standalone queries and may
+        # reuse the evidence retrieved for earlier turns
+        session = None
+        if body.get("session_id") is not None:
+            if not sessions.valid_session_id(body["session_id"]):
+                return _respond({"error": "Invalid session_id"}, tr, status_code=400)
+            session = sessions.load_session(body["session_id"])
 
         # 1. Query Simplification
         # Allow simple natural language queries without over-thinking
         import re
         search_query = question
-        lower_q = question.lower()
+        if session is not None:
+            search_query = session.standalone_query(question)
+            if search_query != question:
+                logging.info(f"Follow-up rewritten: '{question}' -> '{search_query}'")
+        lower_q = search_query.lower()
         
         # Simple cleanup: remove common conversational prefixes
         # e.g. "tell me about matrices" -> "matrices"
@@ -83,7 +138,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         # 3. Default -> Auto-scope (Implicit)
         else:
             logging.info("Scope: Implicit (None selected) -> Attempting Auto-Scope")
-            last_doc = mongo_store.get_last_uploaded_pdf()
+            last_doc = catalog.get_latest_pdf()
             if last_doc:
                 scope_pdf_name = last_doc.get("pdf_name")
                 # Optional: also scope category if desired, but pdf_name is primary filter
@@ -96,8 +151,16 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         if body.get("filename"):
              scope_pdf_name = body.get("filename")
 
+        # Metadata filters (PDFs, year/date/page ranges), applied inside the search;
+        # "filename" may also be a list of PDFs
+        try:
+            search_filter = SearchFilter.from_request(body, pdf_name=scope_pdf_name)
+        except ValueError as e:
+            return _respond({"error": f"Invalid filters: {e}"}, tr, status_code=400)
+
         # 1️⃣ Embed query
-        query_embedding = get_embedding(search_query)
+        with span("embed_query"):
+            query_embedding = get_embedding(search_query)
 
         # ---- SAFETY NORMALIZATION ----
 
@@ -109,24 +172,61 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         if scope_pdf_name:
             scope_category = None
 
-        # 2️⃣ Vector search
-        chunks = search_vectors(
-            query_embedding=query_embedding,
-            category=scope_category,
-            pdf_name=scope_pdf_name,
-            top_k=8,
-        )
+        # 2️⃣ Vector search (over-fetch when reranking so stages have room to choose)
+        from config.settings import settings
+        top_k = settings.RETRIEVAL_TOP_K
+        fetch_k = max(top_k, settings.RERANK_FETCH_K) if settings.RERANK_STAGES else top_k
+
+        # Sessions: skip retrieval when the follow-up stays within the cached
+        # evidence, or narrow it to the PDFs that evidence came from
+        scope_key = f"{scope_category or 'all'}|{search_filter.key}"
+        retrieval = sessions.FULL
+        retrieval_filter = search_filter
+        candidates = None
+        if session is not None:
+            with span("session_plan") as s:
+                plan = session.plan(query_embedding, scope_key, top_k)
+                if plan.mode == sessions.REUSE:
+                    candidates = plan.docs[:fetch_k]
+                    retrieval = sessions.REUSE
+                elif plan.mode == sessions.NARROW and not search_filter.pdf_names:
+                    retrieval_filter = search_filter.with_pdf_names(plan.pdf_names)
+                    retrieval = sessions.NARROW
+                s.set(mode=retrieval, similarity=round(plan.similarity, 3))
+
+        if candidates is None:
+            with span("vector_search", category=scope_category or "all", top_k=fetch_k) as s:
+                candidates = search_vectors(
+                    query_embedding=query_embedding,
+                    category=scope_category,
+                    top_k=fetch_k,
+                    filters=retrieval_filter,
+                )
+                if retrieval == sessions.NARROW and len(candidates) < top_k:
+                    # The follow-up left the cached PDFs after all
+                    candidates = search_vectors(
+                        query_embedding=query_embedding,
+                        category=scope_category,
+                        top_k=fetch_k,
+                        filters=search_filter,
+                    )
+                    retrieval = sessions.FULL
+                s.set(candidates=len(candidates))
+
+        # 2️⃣b Rerank (MMR etc.) to get more distinct evidence per prompt token
+        rerank_ms = {}
+        with span("rerank"):
+            chunks = rerank_chunks(query_embedding, search_query, candidates, top_k, timings=rerank_ms)
+        if rerank_ms:
+            logging.info(f"Rerank: {len(candidates)} -> {len(chunks)} chunks, added latency ms={rerank_ms}")
 
         #  NO chunks \u2192 NO answer
         if not chunks:
-            return func.HttpResponse(
-                json.dumps({
+            return _respond({
                     "answer": "The answer is not available in the uploaded documents.",
                     "sources": [],
                     "results": []
-                }),
-                mimetype="application/json",
-            )
+                }, tr)
 
         # 3️⃣ Build STRICT RAG prompt
         context_text = "\n\n".join(
@@ -217,6 +317,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                     "Accuracy and helpfulness are more important than brevity."
                 ),
             },
+            *(session.history_messages() if session is not None else []),
             {
                 "role": "user",
                 "content": f"Context:\n{context_text}\n\nQuestion:\n{question}",
@@ -225,32 +326,35 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 
         answer = get_chat_completion(messages)
 
+        if session is not None:
+            session.record_turn(question, search_query, query_embedding, answer, candidates, scope_key)
+            sessions.save_session(session)
+
         # 4️⃣ Build sources (Must be strings for UI compatibility)
         sources = [c.get("pdf_name", "unknown") for c in chunks]
 
-        # Get PIN to authorize download links
-        env_pin = os.environ.get("ACCESS_PIN", "")
-
         # Rich metadata (optional, ensuring no data loss)
         results = [
             {
                 "pdf_name": c.get("pdf_name", "unknown"),
                 "category": c.get("category", "unknown"),
                 "page": c.get("page_number", "N/A"),
+                "page_end": c.get("page_end", c.get("page_number", "N/A")),
                 "year": c.get("year", "N/A"),
-                "download_url": c.get("download_url", "#") 
+                "download_url": c.get("download_url") or _download_url(c),
             }
             for c in chunks
         ]
 
-        return func.HttpResponse(
-            json.dumps({
-                "answer": answer,
-                "sources": sources,
-                "results": results,
-            }),
-            mimetype="application/json",
-        )
+        payload = {
+            "answer": answer,
+            "sources": sources,
+            "results": results,
+        }
+        if session is not None:
+            payload["session_id"] = session.id
+            payload["retrieval"] = retrieval
+        return _respond(payload, tr)
 
     except Exception as e:
         logging.exception("Chat API failed")
@@ -19,6 +19,34 @@ class Settings:
     def AZURE_STORAGE_CONNECTION_STRING(self):
         return os.getenv("AZURE_STORAGE_CONNECTION_STRING") or os.getenv("AzureWebJobsStorage")
 
+    @property
+    def BLOB_MAX_CONCURRENCY(self):
+        # Parallel ranged GETs / block uploads per blob transfer
+        return int(os.getenv("BLOB_MAX_CONCURRENCY", "4"))
+
+    @property
+    def DOWNLOAD_SAS_REDIRECT(self):
+        # Always redirect full downloads to a short-lived SAS URL
+        return os.getenv("DOWNLOAD_SAS_REDIRECT", "false").lower() == "true"
+
+    @property
+    def DOWNLOAD_SAS_TTL_SECONDS(self):
+        return int(os.getenv("DOWNLOAD_SAS_TTL_SECONDS", "300"))
+
+    @property
+    def DOWNLOAD_MAX_INLINE_BYTES(self):
+        # Larger full downloads are redirected to SAS when possible; byte
+        # ranges are served at most this many bytes at a time
+        return int(os.getenv("DOWNLOAD_MAX_INLINE_BYTES", str(32 * 1024 * 1024)))
+
+    @property
+    def UPLOAD_MAX_PARALLEL_FILES(self):
+        return int(os.getenv("UPLOAD_MAX_PARALLEL_FILES", "4"))
+
+    @property
+    def UPLOAD_SAS_TTL_SECONDS(self):
+        return int(os.getenv("UPLOAD_SAS_TTL_SECONDS", "900"))
+
     @property
     def AZURE_OPENAI_API_KEY(self):
         return os.getenv("AZURE_OPENAI_API_KEY")
@@ -35,14 +63,261 @@ class Settings:
     def AZURE_OPENAI_EMBEDDING_DEPLOYMENT(self):
         return os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 
+    @property
+    def EMBEDDING_DIMENSIONS(self):
+        # "dimensions" request parameter (text-embedding-3-* only); 0 = model default.
+        # Changes the stored dimension: existing chunks must be re-embedded.
+        return int(os.getenv("EMBEDDING_DIMENSIONS", "0"))
+
+    @property
+    def EMBEDDING_FIELD(self):
+        # Chunk field holding the vectors that ingest writes and search reads.
+        # Switch together with the deployment once a re-embed job has filled it.
+        return os.getenv("EMBEDDING_FIELD", "embedding")
+
     @property
     def EMBEDDING_BATCH_SIZE(self):
         return int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
 
+    @property
+    def CHUNK_STRATEGY(self):
+        # "structured" (token/sentence aware, spans pages) or "legacy" (char windows per page)
+        return os.getenv("CHUNK_STRATEGY", "structured").lower()
+
+    @property
+    def CHUNK_MAX_TOKENS(self):
+        return int(os.getenv("CHUNK_MAX_TOKENS", "500"))
+
+    @property
+    def CHUNK_OVERLAP_TOKENS(self):
+        return int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+
+    @property
+    def NEAR_DUP_ENABLED(self):
+        # Link near-duplicate chunks of a category to one embedded canonical chunk
+        return os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+
+    @property
+    def NEAR_DUP_THRESHOLD(self):
+        # Estimated Jaccard similarity (word 5-gram MinHash) that counts as a duplicate
+        return float(os.getenv("NEAR_DUP_THRESHOLD", "0.9"))
+
+    @property
+    def INGEST_PAGE_BATCH(self):
+        # Pages extracted/embedded/stored between checkpoints
+        return int(os.getenv("INGEST_PAGE_BATCH", "20"))
+
+    @property
+    def INGEST_TIME_BUDGET_SECONDS(self):
+        # Work per invocation before handing off to a continuation message
+        return int(os.getenv("INGEST_TIME_BUDGET_SECONDS", "240"))
+
+    @property
+    def WORK_LEASE_SECONDS(self):
+        # Lease on an ingest range / re-chunk PDF / re-embed range: one time
+        # budget plus slack. Keep it equal to host.json's queue
+        # visibilityTimeout x maxDequeueCount (60 s x 5) so the runtime's own
+        # retries of a crashed worker's message outlast the lease
+        return int(os.getenv("WORK_LEASE_SECONDS", str(self.INGEST_TIME_BUDGET_SECONDS + 60)))
+
+    @property
+    def INGEST_RANGE_PAGES(self):
+        # Pages per fan-out work item; smaller PDFs are ingested inline
+        return int(os.getenv("INGEST_RANGE_PAGES", "50"))
+
+    @property
+    def WORK_QUEUE_BACKEND(self):
+        # "azure" (Storage / Azurite) or "memory" (in-process, local runs)
+        return os.getenv("WORK_QUEUE_BACKEND", "azure").lower()
+
+    @property
+    def INGEST_QUEUE_NAME(self):
+        return os.getenv("INGEST_QUEUE_NAME", "ingest-jobs")
+
+    @property
+    def INGEST_JOBS_COLLECTION(self):
+        return os.getenv("INGEST_JOBS_COLLECTION", "ingest_jobs")
+
+    @property
+    def DELETE_QUEUE_NAME(self):
+        return os.getenv("DELETE_QUEUE_NAME", "delete-jobs")
+
+    @property
+    def DELETE_JOBS_COLLECTION(self):
+        return os.getenv("DELETE_JOBS_COLLECTION", "delete_jobs")
+
+    @property
+    def DELETE_BLOB_WORKERS(self):
+        # Concurrent 256-blob batch requests
+        return int(os.getenv("DELETE_BLOB_WORKERS", "4"))
+
+    @property
+    def REEMBED_QUEUE_NAME(self):
+        return os.getenv("REEMBED_QUEUE_NAME", "reembed-jobs")
+
+    @property
+    def REEMBED_JOBS_COLLECTION(self):
+        return os.getenv("REEMBED_JOBS_COLLECTION", "reembed_jobs")
+
+    @property
+    def REEMBED_RANGE_CHUNKS(self):
+        # Chunks per _id range work item of a re-embed job
+        return int(os.getenv("REEMBED_RANGE_CHUNKS", "5000"))
+
+    @property
+    def REEMBED_BATCH_SIZE(self):
+        # Texts per embeddings request
+        return int(os.getenv("REEMBED_BATCH_SIZE", "64"))
+
+    @property
+    def REEMBED_CONCURRENCY(self):
+        # Embeddings requests in flight per worker
+        return int(os.getenv("REEMBED_CONCURRENCY", "4"))
+
+    @property
+    def REEMBED_MAX_RPM(self):
+        # Per-worker request and (estimated) token rates; 0 = unlimited
+        return int(os.getenv("REEMBED_MAX_RPM", "300"))
+
+    @property
+    def REEMBED_MAX_TPM(self):
+        return int(os.getenv("REEMBED_MAX_TPM", "0"))
+
+    @property
+    def PAGE_TEXT_ENABLED(self):
+        # Keep extracted page text (compressed, keyed by PDF hash) for re-chunking
+        return os.getenv("PAGE_TEXT_ENABLED", "true").lower() == "true"
+
+    @property
+    def PAGE_TEXT_COLLECTION(self):
+        return os.getenv("PAGE_TEXT_COLLECTION", "page_text")
+
+    @property
+    def RECHUNK_QUEUE_NAME(self):
+        return os.getenv("RECHUNK_QUEUE_NAME", "rechunk-jobs")
+
+    @property
+    def RECHUNK_JOBS_COLLECTION(self):
+        return os.getenv("RECHUNK_JOBS_COLLECTION", "rechunk_jobs")
+
+    @property
+    def CATALOG_COLLECTION(self):
+        return os.getenv("CATALOG_COLLECTION", "pdf_catalog")
+
+    @property
+    def CATALOG_CACHE_TTL_SECONDS(self):
+        return int(os.getenv("CATALOG_CACHE_TTL_SECONDS", "30"))
+
+    @property
+    def LATEST_PDF_CACHE_TTL_SECONDS(self):
+        return int(os.getenv("LATEST_PDF_CACHE_TTL_SECONDS", "10"))
+
+    @property
+    def VECTOR_INDEX_ENABLED(self):
+        # Keep per-category search matrices in memory instead of re-reading embeddings per query
+        return os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true"
+
+    @property
+    def VECTOR_INDEX_MAX_MB(self):
+        return int(os.getenv("VECTOR_INDEX_MAX_MB", "512"))
+
+    @property
+    def VECTOR_INDEX_TTL_SECONDS(self):
+        return int(os.getenv("VECTOR_INDEX_TTL_SECONDS", "600"))
+
+    @property
+    def VECTOR_INDEX_CHECK_SECONDS(self):
+        # How often an instance checks whether a category's chunks changed
+        return int(os.getenv("VECTOR_INDEX_CHECK_SECONDS", "5"))
+
+    @property
+    def VECTOR_INDEX_REDUCED_DIM(self):
+        # First-pass dims kept in memory per row (0 = full); hits are rescored with the full embeddings
+        return int(os.getenv("VECTOR_INDEX_REDUCED_DIM", "0"))
+
+    @property
+    def VECTOR_INDEX_REDUCTION(self):
+        # "truncate" (leading dims, for Matryoshka models like text-embedding-3-*) or "pca"
+        return os.getenv("VECTOR_INDEX_REDUCTION", "truncate").lower()
+
+    @property
+    def VECTOR_RESCORE_FACTOR(self):
+        # Candidates per final result taken from a reduced index for exact rescoring
+        return int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+    @property
+    def SEARCH_SHARDS_ENABLED(self):
+        # Global searches score the per-category indexes in parallel instead of one whole-collection index
+        return os.getenv("SEARCH_SHARDS_ENABLED", "true").lower() == "true"
+
+    @property
+    def SEARCH_SHARD_WORKERS(self):
+        return int(os.getenv("SEARCH_SHARD_WORKERS", "4"))
+
+    @property
+    def SEARCH_SHARD_TIMEOUT_MS(self):
+        # Global search deadline, index builds included: categories not built and shards
+        # still running by then are dropped and the search returns partial results
+        return int(os.getenv("SEARCH_SHARD_TIMEOUT_MS", "2000"))
+
+    @property
+    def WARMUP_CATEGORIES(self):
+        # Comma-separated categories to preload, or "auto" (latest PDF's category + largest ones)
+        return os.getenv("WARMUP_CATEGORIES", "auto")
+
+    @property
+    def WARMUP_MAX_INDEXES(self):
+        return int(os.getenv("WARMUP_MAX_INDEXES", "3"))
+
     @property
     def MAX_TOP_K(self):
         return int(os.getenv("MAX_TOP_K", "20"))
     
+    @property
+    def RETRIEVAL_TOP_K(self):
+        return int(os.getenv("RETRIEVAL_TOP_K", "8"))
+
+    @property
+    def RERANK_FETCH_K(self):
+        # Candidates pulled from vector search before reranking
+        return int(os.getenv("RERANK_FETCH_K", "24"))
+
+    @property
+    def RERANK_STAGES(self):
+        # Comma-separated, applied in order. Empty disables reranking.
+        raw = os.getenv("RERANK_STAGES", "mmr")
+        return [s.strip().lower() for s in raw.split(",") if s.strip()]
+
+    @property
+    def MMR_LAMBDA(self):
+        return float(os.getenv("MMR_LAMBDA", "0.7"))
+
+    @property
+    def RERANK_BACKEND(self):
+        # "lexical" (pure NumPy) or "onnx" (local cross-encoder model)
+        return os.getenv("RERANK_BACKEND", "lexical").lower()
+
+    @property
+    def RERANK_MODEL_PATH(self):
+        return os.getenv("RERANK_MODEL_PATH", "models/cross-encoder")
+
+    @property
+    def RERANK_BATCH_SIZE(self):
+        return int(os.getenv("RERANK_BATCH_SIZE", "8"))
+
+    @property
+    def RERANK_WORKERS(self):
+        return int(os.getenv("RERANK_WORKERS", "4"))
+
+    @property
+    def RERANK_CACHE_SIZE(self):
+        return int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+
+    @property
+    def RERANK_BLEND(self):
+        # Weight of the reranker score vs. the retrieval cosine score
+        return float(os.getenv("RERANK_BLEND", "0.5"))
+
     @property
     def AZURE_OPENAI_CHAT_DEPLOYMENT(self):
         return os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-4o")
@@ -59,5 +334,144 @@ class Settings:
     def GROQ_MODEL(self):
         return os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
 
+    @property
+    def LLM_PROVIDERS(self):
+        # Comma-separated chat providers the router may use (azure, groq, or any
+        # OpenAI-compatible name configured via LLM_<NAME>_BASE_URL/_MODEL/_API_KEY)
+        raw = os.getenv("LLM_PROVIDERS") or self.LLM_PROVIDER
+        return [p.strip().lower() for p in raw.split(",") if p.strip()]
+
+    @property
+    def LLM_TIMEOUT_SECONDS(self):
+        return float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+    @property
+    def LLM_MAX_RETRIES(self):
+        # SDK retries per provider before the router falls back to the next one
+        return int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+    @property
+    def LLM_HEDGE_ENABLED(self):
+        # Ask a second provider when the first hasn't started answering within its p95
+        return os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+
+    @property
+    def LLM_HEDGE_DELAY_MS(self):
+        # Hedge delay until a provider has enough latency samples of its own
+        return int(os.getenv("LLM_HEDGE_DELAY_MS", "2000"))
+
+    @property
+    def LLM_HEDGE_MIN_MS(self):
+        return int(os.getenv("LLM_HEDGE_MIN_MS", "250"))
+
+    @property
+    def LLM_STATS_WINDOW(self):
+        # Calls per provider kept for latency / error-rate routing
+        return int(os.getenv("LLM_STATS_WINDOW", "100"))
+
+    @property
+    def LLM_STATS_WINDOW_SECONDS(self):
+        return int(os.getenv("LLM_STATS_WINDOW_SECONDS", "600"))
+
+    @property
+    def LLM_MAX_ERROR_RATE(self):
+        # Providers above this rolling error ratio are only used as a last resort
+        return float(os.getenv("LLM_MAX_ERROR_RATE", "0.5"))
+
+    @property
+    def LLM_COOLDOWN_SECONDS(self):
+        return int(os.getenv("LLM_COOLDOWN_SECONDS", "30"))
+
+    @property
+    def SESSION_STORE(self):
+        # Chat session state: "memory" (per instance) or "mongo" (shared, SESSION_COLLECTION)
+        return os.getenv("SESSION_STORE", "memory").lower()
+
+    @property
+    def SESSION_COLLECTION(self):
+        return os.getenv("SESSION_COLLECTION", "chat_sessions")
+
+    @property
+    def SESSION_TTL_SECONDS(self):
+        # Idle time after which a session is forgotten
+        return int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+
+    @property
+    def SESSION_MAX_SESSIONS(self):
+        # In-memory store bound (LRU); each session keeps its evidence embeddings
+        return int(os.getenv("SESSION_MAX_SESSIONS", "200"))
+
+    @property
+    def SESSION_MAX_TURNS(self):
+        return int(os.getenv("SESSION_MAX_TURNS", "5"))
+
+    @property
+    def SESSION_MAX_CHUNKS(self):
+        # Retrieved chunks kept per session as reusable evidence
+        return int(os.getenv("SESSION_MAX_CHUNKS", "32"))
+
+    @property
+    def SESSION_HISTORY_TURNS(self):
+        # Previous question/answer pairs sent to the LLM with a follow-up
+        return int(os.getenv("SESSION_HISTORY_TURNS", "2"))
+
+    @property
+    def SESSION_REWRITE(self):
+        # Follow-up -> standalone query: "heuristic", "llm" or "off"
+        return os.getenv("SESSION_REWRITE", "heuristic").lower()
+
+    @property
+    def SESSION_REUSE_SIMILARITY(self):
+        # Query similarity to an earlier turn above which retrieval is skipped
+        return float(os.getenv("SESSION_REUSE_SIMILARITY", "0.85"))
+
+    @property
+    def SESSION_NARROW_SIMILARITY(self):
+        # ... above which retrieval is narrowed to the PDFs of the cached evidence
+        return float(os.getenv("SESSION_NARROW_SIMILARITY", "0.6"))
+
+    @property
+    def TRACING_EXPORTER(self):
+        # "none" (spans are no-ops unless a chat request asks for debug),
+        # "log" (one JSON line per invocation) or "otel" (OpenTelemetry API)
+        return os.getenv("TRACING_EXPORTER", "none").lower()
+
+    @property
+    def METRICS_ENABLED(self):
+        # In-process latency/token/cache collectors served by metrics_api
+        return os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    @property
+    def PROFILE_SLOW_MS(self):
+        # Keep a profile of chat/ingest invocations slower than this; 0 = off
+        return int(os.getenv("PROFILE_SLOW_MS", "0"))
+
+    @property
+    def PROFILE_MODE(self):
+        # "sample" (stack sampler, low overhead) or "cprofile" (deterministic, one request at a time)
+        return os.getenv("PROFILE_MODE", "sample").lower()
+
+    @property
+    def PROFILE_SAMPLE_INTERVAL_MS(self):
+        return int(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+
+    @property
+    def PROFILE_MAX_PER_HOUR(self):
+        return int(os.getenv("PROFILE_MAX_PER_HOUR", "10"))
+
+    @property
+    def PROFILE_STORAGE(self):
+        # "local" (PROFILE_DIR) or "blob" (PROFILE_CONTAINER)
+        return os.getenv("PROFILE_STORAGE", "local").lower()
+
+    @property
+    def PROFILE_DIR(self):
+        import tempfile
+        return os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "pdfrag-profiles"))
+
+    @property
+    def PROFILE_CONTAINER(self):
+        return os.getenv("PROFILE_CONTAINER", "profiles")
+
 
 settings = Settings()
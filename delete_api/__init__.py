@@ -1,8 +1,10 @@
 import logging
 import azure.functions as func
 import json
-from services.mongo_store import mongo_store
+from services import bulk_delete
+from services.tracing import traced
 
+@traced("delete_api")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Delete Category API triggered.')
 
@@ -11,15 +13,47 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         return auth_error
 
     try:
-        category = req.params.get('category')
-        if not category:
-             # Try body
-             try:
-                 body = req.get_json()
-                 category = body.get('category')
-             except ValueError:
-                 pass
-        
+        # Progress polling for background category deletes
+        job_id = req.params.get('job_id')
+        if req.method == "GET":
+            if not job_id:
+                return func.HttpResponse(
+                    json.dumps({"error": "Missing job_id param"}),
+                    status_code=400,
+                    mimetype="application/json"
+                )
+            job = bulk_delete.get_job(job_id)
+            if not job:
+                return func.HttpResponse(
+                    json.dumps({"error": "Unknown job"}),
+                    status_code=404,
+                    mimetype="application/json"
+                )
+            return func.HttpResponse(
+                json.dumps({
+                    "job_id": job_id,
+                    "category": job.get("category"),
+                    "status": job.get("status"),
+                    "chunks_deleted": job.get("chunks_deleted", 0),
+                    "blobs_deleted": job.get("blobs_deleted", 0),
+                    "error": job.get("error"),
+                }),
+                status_code=200,
+                mimetype="application/json"
+            )
+
+        try:
+            body = req.get_json() or {}
+        except ValueError:
+            body = {}
+        if not isinstance(body, dict):
+            return func.HttpResponse(
+                json.dumps({"error": "Request body must be a JSON object"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+
+        category = req.params.get('category') or body.get('category')
         if not category:
             return func.HttpResponse(
                 json.dumps({"error": "Missing category param"}),
@@ -27,63 +61,52 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
 
-        # Optional: delete specific PDF
-        pdf_name = req.params.get('pdf_name')
-        if not pdf_name:
-            try:
-                body = req.get_json()
-                # body might have category and pdf_name
-                # If category was found via params, body parsing might be skipped above, 
-                # but let's re-parse body if we need pdf_name
-                if body:
-                    pdf_name = body.get('pdf_name')
-            except ValueError:
-                pass
+        # Optional: delete specific PDF(s) - single name or a list in the body
+        pdf_names = body.get('pdf_names') or []
+        if not isinstance(pdf_names, list) or not all(isinstance(n, str) for n in pdf_names):
+            return func.HttpResponse(
+                json.dumps({"error": "pdf_names must be a list of names"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        pdf_names = list(pdf_names)
+        pdf_name = req.params.get('pdf_name') or body.get('pdf_name')
+        if pdf_name:
+            pdf_names.append(pdf_name)
 
-        # Lazy import to avoid circular dependency or lighter init
-        from azure.storage.blob import BlobServiceClient
-        from config.settings import settings
+        if pdf_names:
+            logging.info(f"Manual deletion requested for PDFs in {category}: {pdf_names}")
+            result = bulk_delete.delete_pdfs_now(category, pdf_names)
 
-        # Connect to Blob
-        blob_service_client = None
-        container_client = None
-        if settings.AZURE_STORAGE_CONNECTION_STRING:
-            try:
-                blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-                container_client = blob_service_client.get_container_client("pdfs")
-            except Exception as e:
-                logging.error(f"Failed to connect to Blob Storage: {e}")
+            if len(pdf_names) == 1:
+                message = f"PDF '{pdf_names[0]}' in category '{category}' deleted successfully."
+            else:
+                message = f"{len(pdf_names)} PDFs in category '{category}' deleted successfully."
 
-        if pdf_name:
-            logging.info(f"Manual deletion requested for PDF: {category}/{pdf_name}")
-            mongo_store.delete_pdf(category, pdf_name)
-            
-            # Delete Blob
-            if container_client:
-                blob_path = f"{category}/{pdf_name}"
-                blob_client = container_client.get_blob_client(blob_path)
-                if blob_client.exists():
-                    blob_client.delete_blob()
-                    logging.info(f"Deleted blob: {blob_path}")
+            return func.HttpResponse(
+                json.dumps({"message": message, **result}),
+                status_code=200,
+                mimetype="application/json"
+            )
 
-            message = f"PDF '{pdf_name}' in category '{category}' deleted successfully."
-        else:
-            logging.info(f"Manual deletion requested for ENTIRE category: {category}")
-            mongo_store.delete_category(category)
-            
-            # Delete Blobs in Category folder
-            if container_client:
-                prefix = f"{category}/"
-                blobs = container_client.list_blobs(name_starts_with=prefix)
-                for blob in blobs:
-                    container_client.delete_blob(blob.name)
-                logging.info(f"Deleted all blobs with prefix: {prefix}")
+        # Entire category: chunks and blobs are removed by delete_worker in the
+        # background; clients poll GET ?job_id=... for progress.
+        logging.info(f"Manual deletion requested for ENTIRE category: {category}")
+        job_id = bulk_delete.start_category_delete(category)
+        if job_id is None:
+            return func.HttpResponse(
+                json.dumps({"error": "Database not available"}),
+                status_code=503,
+                mimetype="application/json"
+            )
 
-            message = f"Category '{category}' deleted successfully."
-        
         return func.HttpResponse(
-            json.dumps({"message": message}),
-            status_code=200,
+            json.dumps({
+                "message": f"Deletion of category '{category}' started.",
+                "job_id": job_id,
+                "status": bulk_delete.QUEUED,
+            }),
+            status_code=202,
             mimetype="application/json"
         )
 
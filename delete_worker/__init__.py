@@ -0,0 +1,16 @@
+import json
+import logging
+import azure.functions as func
+
+from services.bulk_delete import process_delete_message
+from services.tracing import traced
+
+
+@traced("delete_worker")
+def main(msg: func.QueueMessage) -> None:
+    """
+    Runs a background category delete queued by delete_api.
+    """
+    payload = json.loads(msg.get_body().decode("utf-8"))
+    logging.info("Delete worker: job %s (dequeue #%s)", payload.get("job_id"), msg.dequeue_count)
+    process_delete_message(payload)
@@ -1,9 +1,67 @@
 import logging
 import azure.functions as func
-import os
-from azure.storage.blob import BlobServiceClient
+import re
 import urllib.parse
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 
+from config.settings import settings
+from services.blob_store import get_blob_service, PDF_CONTAINER
+from services.tracing import traced
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single 'bytes=' range -> inclusive (start, end). None means serve the
+    whole blob; (-1, -1) means unsatisfiable.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        # Multi-range or malformed: RFC 7233 allows ignoring it
+        return None
+
+    first, last = match.group(1), match.group(2)
+    if not first:
+        # Suffix range: last N bytes
+        length = int(last)
+        if length == 0:
+            return (-1, -1)
+        return (max(0, size - length), size - 1)
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return (-1, -1)
+    return (start, min(end, size - 1))
+
+
+def _sas_url(blob_client, filename: str, inline: bool) -> Optional[str]:
+    """
+    Short-lived read-only SAS URL, or None if the account key isn't available.
+    """
+    from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+    account_key = getattr(blob_client.credential, "account_key", None)
+    if not account_key:
+        return None
+
+    disposition = "inline" if inline else "attachment"
+    token = generate_blob_sas(
+        account_name=blob_client.account_name,
+        container_name=blob_client.container_name,
+        blob_name=blob_client.blob_name,
+        account_key=account_key,
+        permission=BlobSasPermissions(read=True),
+        expiry=datetime.now(timezone.utc) + timedelta(seconds=settings.DOWNLOAD_SAS_TTL_SECONDS),
+        content_disposition=f"{disposition}; filename*=UTF-8''{urllib.parse.quote(filename)}",
+        content_type="application/pdf",
+    )
+    return f"{blob_client.url}?{token}"
+
+
+@traced("download_api")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("Download API triggered")
 
@@ -20,36 +78,94 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse("Invalid blob path", status_code=400)
 
     try:
-        connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING") or os.getenv("AzureWebJobsStorage")
-        if not connection_string:
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceNotFoundError
+
+        blob_service_client = get_blob_service()
+        if blob_service_client is None:
             return func.HttpResponse("Storage connection missing", status_code=500)
 
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
         # Using the same container 'pdfs' as defined in upload_api and blob_trigger
-        container_client = blob_service_client.get_container_client("pdfs")
-        blob_client = container_client.get_blob_client(blob_path)
+        blob_client = blob_service_client.get_blob_client(PDF_CONTAINER, blob_path)
 
-        if not blob_client.exists():
+        # One round-trip for existence, size and version
+        try:
+            props = blob_client.get_blob_properties()
+        except ResourceNotFoundError:
             return func.HttpResponse(f"File not found: {blob_path}", status_code=404)
 
-        # Download stream
-        stream = blob_client.download_blob()
-        file_bytes = stream.readall()
+        size = props.size
+        etag = props.etag if props.etag.startswith('"') else f'"{props.etag}"'
+        inline = req.params.get("inline") in ("1", "true")
 
         # Content Disposition
         # filename is the last part of the path
         filename = blob_path.split("/")[-1]
         # Encode filename for header to handle spaces/special chars
         encoded_filename = urllib.parse.quote(filename)
+        disposition = "inline" if inline else "attachment"
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Cache-Control": "private, max-age=0, must-revalidate",
+        }
+        if props.last_modified:
+            headers["Last-Modified"] = props.last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+        # Conditional GET: client copy is current
+        if_none_match = req.headers.get("If-None-Match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return func.HttpResponse(status_code=304, headers=headers)
+
+        # Range request (ignored if If-Range names another version)
+        byte_range = None
+        range_header = req.headers.get("Range")
+        if_range = req.headers.get("If-Range")
+        if range_header and (not if_range or if_range.strip() == etag):
+            byte_range = _parse_range(range_header, size)
+            if byte_range == (-1, -1):
+                headers["Content-Range"] = f"bytes */{size}"
+                return func.HttpResponse(status_code=416, headers=headers)
+            if byte_range is not None:
+                # Open-ended ranges ("bytes=0-" is a viewer's first request)
+                # are served in pieces; a shorter 206 is valid (RFC 7233)
+                start, end = byte_range
+                byte_range = (start, min(end, start + settings.DOWNLOAD_MAX_INLINE_BYTES - 1))
+
+        # Full downloads of big files bypass the Function via a short-lived SAS
+        if byte_range is None and (
+            settings.DOWNLOAD_SAS_REDIRECT or size > settings.DOWNLOAD_MAX_INLINE_BYTES
+        ):
+            sas_url = _sas_url(blob_client, filename, inline)
+            if sas_url:
+                return func.HttpResponse(
+                    status_code=302,
+                    headers={"Location": sas_url, "Cache-Control": "no-store"},
+                )
+            logging.warning("SAS redirect unavailable (no account key); serving %s inline", blob_path)
+
+        headers["Content-Type"] = "application/pdf"
+        headers["Content-Disposition"] = f"{disposition}; filename={encoded_filename}; filename*=UTF-8''{encoded_filename}"
+
+        # Ranged downloads of the exact version we validated against
+        if byte_range is not None:
+            start, end = byte_range
+            stream = blob_client.download_blob(
+                offset=start,
+                length=end - start + 1,
+                etag=props.etag,
+                match_condition=MatchConditions.IfNotModified,
+            )
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return func.HttpResponse(stream.readall(), headers=headers, status_code=206)
 
-        return func.HttpResponse(
-            file_bytes,
-            headers={
-                "Content-Type": "application/pdf",
-                "Content-Disposition": f"attachment; filename={encoded_filename}; filename*=UTF-8''{encoded_filename}"
-            },
-            status_code=200
+        stream = blob_client.download_blob(
+            etag=props.etag,
+            match_condition=MatchConditions.IfNotModified,
+            max_concurrency=settings.BLOB_MAX_CONCURRENCY,
         )
+        return func.HttpResponse(stream.readall(), headers=headers, status_code=200)
 
     except Exception as e:
         logging.exception("Download failed")
@@ -1,15 +1,115 @@
+import gzip
+import hashlib
 import logging
 import azure.functions as func
 import os
+import re
+import threading
+from typing import Dict, Optional
 
+from services.http_cache import etag_matches, preferred_encoding
+from services.tracing import traced
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# Explicit MIME types; anything else is not served
+MIME_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".json": "application/json",
+    ".svg": "image/svg+xml",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".ico": "image/x-icon",
+}
+COMPRESSIBLE = (".html", ".css", ".js", ".json", ".svg")
+MIN_COMPRESS_BYTES = 1024
+
+# Fingerprinted URLs (?v=<hash>) never change; everything else revalidates by ETag
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+# Local asset references in index.html that get a ?v=<hash> fingerprint
+_ASSET_REF = re.compile(r'((?:src|href)=")((?:/api/ui/)?)([\w.-]+\.(?:js|css))(")')
+
+
+class _Asset:
+    def __init__(self, name: str, body: bytes):
+        self.name = name
+        self.mime = MIME_TYPES[os.path.splitext(name)[1].lower()]
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        # coding -> body, in server preference order
+        self.variants: Dict[str, bytes] = {}
+        if name.lower().endswith(COMPRESSIBLE) and len(body) >= MIN_COMPRESS_BYTES:
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=11)
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        self.variants["identity"] = body
+
+    def etag(self, coding: str) -> str:
+        # One strong ETag per representation
+        return f'"{self.digest}"' if coding == "identity" else f'"{self.digest}-{coding}"'
+
+
+_assets: Optional[Dict[str, _Asset]] = None
+_lock = threading.Lock()
+
+
+def _fingerprint(html: bytes, digests: Dict[str, str]) -> bytes:
+    def replace(m):
+        digest = digests.get(m.group(3))
+        if digest is None:
+            return m.group(0)
+        return f"{m.group(1)}{m.group(2)}{m.group(3)}?v={digest}{m.group(4)}"
+
+    return _ASSET_REF.sub(replace, html.decode("utf-8")).encode("utf-8")
+
+
+def _load_assets() -> Dict[str, _Asset]:
+    """
+    Read and compress every servable file once per instance. index.html is
+    rewritten to reference the other assets by content hash.
+    """
+    global _assets
+    if _assets is not None:
+        return _assets
+
+    with _lock:
+        if _assets is not None:
+            return _assets
+
+        raw: Dict[str, bytes] = {}
+        for name in os.listdir(BASE_DIR):
+            path = os.path.join(BASE_DIR, name)
+            ext = os.path.splitext(name)[1].lower()
+            if name == "function.json" or ext not in MIME_TYPES or not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                raw[name] = f.read()
+
+        assets = {name: _Asset(name, body) for name, body in raw.items() if name != "index.html"}
+        if "index.html" in raw:
+            digests = {name: a.digest for name, a in assets.items()}
+            assets["index.html"] = _Asset("index.html", _fingerprint(raw["index.html"], digests))
+
+        logging.info(
+            "UI assets cached: %s",
+            {name: {c: len(b) for c, b in a.variants.items()} for name, a in assets.items()}
+        )
+        _assets = assets
+        return _assets
+
+
+@traced("frontend")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
-        # Determine Base Directory safely
-        try:
-            BASE_DIR = os.path.dirname(os.path.realpath(__file__))
-        except Exception:
-            BASE_DIR = os.path.abspath(".")
-
         # Get the file path from route params safely
         filename = "index.html"
         if req.route_params and "file" in req.route_params:
@@ -17,46 +117,28 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             if val:
                 filename = val
 
-        # Handle root or empty
-        if not filename or filename == "/":
-            filename = "index.html"
-        
-        # Sanitize filename
-        filename = filename.lstrip("/\\")
+        # Sanitize filename; only files at the top of frontend/ are cached
+        filename = filename.lstrip("/\\") or "index.html"
 
-        # Resolve path
-        file_path = os.path.abspath(os.path.join(BASE_DIR, filename))
+        asset = _load_assets().get(filename)
+        if asset is None:
+            logging.warning(f"File not found: {filename}")
+            return func.HttpResponse("Not Found", status_code=404)
 
-        # Security check
-        if not file_path.startswith(BASE_DIR):
-            return func.HttpResponse("Forbidden", status_code=403)
+        coding = preferred_encoding(req, list(asset.variants))
+        versioned = req.params.get("v") == asset.digest
+        headers = {
+            "ETag": asset.etag(coding),
+            "Cache-Control": IMMUTABLE if versioned else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
 
-        # Existence check
-        if not os.path.exists(file_path) or not os.path.isfile(file_path):
-            logging.warning(f"File not found: {file_path}")
-            return func.HttpResponse("Not Found", status_code=404)
+        if etag_matches(req, asset.etag(coding)):
+            return func.HttpResponse(status_code=304, headers=headers)
 
-        # Explicit MIME type handling
-        mime_type = "application/octet-stream"
-        lower_name = filename.lower()
-        if lower_name.endswith(".html"):
-            mime_type = "text/html; charset=utf-8"
-        elif lower_name.endswith(".css"):
-            mime_type = "text/css; charset=utf-8"
-        elif lower_name.endswith(".js"):
-            mime_type = "application/javascript; charset=utf-8"
-        elif lower_name.endswith(".json"):
-            mime_type = "application/json"
-        elif lower_name.endswith(".png"):
-            mime_type = "image/png"
-        elif lower_name.endswith(".jpg") or lower_name.endswith(".jpeg"):
-            mime_type = "image/jpeg"
-        elif lower_name.endswith(".ico"):
-            mime_type = "image/x-icon"
-
-        with open(file_path, "rb") as f:
-            content = f.read()
-            return func.HttpResponse(content, mimetype=mime_type)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return func.HttpResponse(asset.variants[coding], mimetype=asset.mime, headers=headers)
 
     except Exception as e:
         logging.exception("Critical error serving UI file")
@@ -5,6 +5,11 @@ document.addEventListener('DOMContentLoaded', () => {
     // where the UI handles the 'api' prefix naturally or is hosted under same domain.
     const API_BASE_URL = "/api";
 
+    // Files above this size are uploaded straight to Blob Storage (SAS + block staging)
+    const DIRECT_UPLOAD_THRESHOLD = 20 * 1024 * 1024;
+    const BLOCK_SIZE = 4 * 1024 * 1024;
+    const BLOCK_CONCURRENCY = 4;
+
     // --- Elements ---
     const btnUpload = document.getElementById('btn-upload');
     const btnDeleteCat = document.getElementById('btn-delete-cat');
@@ -125,28 +130,39 @@ document.addEventListener('DOMContentLoaded', () => {
         showStatus(uploadStatus, `Uploading ${files.length} file(s)...`, 'loading');
 
         try {
-            const formData = new FormData();
-            formData.append('category', category);
-
-            // Append all files with unique keys to ensure backend captures all
+            const large = [];
+            const small = [];
             for (let i = 0; i < files.length; i++) {
-                formData.append(`file_${i}`, files[i]);
+                (files[i].size > DIRECT_UPLOAD_THRESHOLD ? large : small).push(files[i]);
             }
 
-            const response = await fetch(`${API_BASE_URL}/upload`, {
-                method: 'POST',
-                body: formData
-            });
+            // Per-file results: { file, status, error }
+            let results = [];
 
-            if (!response.ok) {
-                const errorText = await response.text();
-                throw new Error(errorText || `Server Error: ${response.status}`);
+            // Large files go straight to Blob Storage; fall back to multipart if unavailable
+            if (large.length > 0) {
+                const direct = await uploadLargeFiles(category, large);
+                if (direct === null) {
+                    small.push(...large);
+                } else {
+                    results = results.concat(direct);
+                }
             }
 
-            const result = await response.json();
-            showStatus(uploadStatus, result.message || 'Upload successful!', 'success');
+            if (small.length > 0) {
+                results = results.concat(await uploadMultipart(category, small));
+            }
+
+            const ok = results.filter(r => r.status === 'uploaded');
+            const failed = results.filter(r => r.status !== 'uploaded');
+
+            if (failed.length === 0) {
+                showStatus(uploadStatus, ok.length === 1 ? 'Upload successful!' : `Uploaded ${ok.length} files.`, 'success');
+            } else {
+                const details = failed.map(r => `${r.file}: ${r.status === 'exists' ? 'already exists' : (r.error || 'failed')}`).join('; ');
+                showStatus(uploadStatus, `Uploaded ${ok.length} of ${results.length} file(s). ${details}`, 'error');
+            }
 
-            // Clear input
             // Clear input
             fileInput.value = '';
 
@@ -156,8 +172,106 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Multipart upload through upload_api (files uploaded in parallel server-side)
+    async function uploadMultipart(category, files) {
+        const formData = new FormData();
+        formData.append('category', category);
+
+        // Append all files with unique keys to ensure backend captures all
+        files.forEach((f, i) => formData.append(`file_${i}`, f));
+
+        const response = await fetch(`${API_BASE_URL}/upload`, {
+            method: 'POST',
+            body: formData
+        });
+
+        const result = await response.json().catch(() => ({}));
+        if (result.results) {
+            return result.results;
+        }
+        if (!response.ok) {
+            throw new Error(result.error || `Server Error: ${response.status}`);
+        }
+        return files.map(f => ({ file: f.name, status: 'uploaded' }));
+    }
+
+    // Direct-to-blob upload via SAS URLs from upload_sas_api. Returns null if unavailable.
+    async function uploadLargeFiles(category, files) {
+        const response = await fetch(`${API_BASE_URL}/upload_sas`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ category: category, files: files.map(f => f.name) })
+        });
+        if (!response.ok) {
+            return null;
+        }
+
+        const data = await response.json();
+        const byName = new Map(files.map(f => [f.name, f]));
+
+        return Promise.all((data.results || []).map(async r => {
+            if (r.status !== 'ready') {
+                return { file: r.file, status: r.status };
+            }
+            try {
+                await uploadBlocks(byName.get(r.file), r.upload_url);
+                return { file: r.file, status: 'uploaded' };
+            } catch (err) {
+                console.error(err);
+                const exists = err.status === 409 || err.status === 412;
+                return { file: r.file, status: exists ? 'exists' : 'error', error: err.message };
+            }
+        }));
+    }
+
+    // Stage the file as blocks (BLOCK_CONCURRENCY in flight), then commit the block list
+    async function uploadBlocks(file, uploadUrl) {
+        const total = Math.ceil(file.size / BLOCK_SIZE);
+        const blockIds = [];
+        for (let i = 0; i < total; i++) {
+            blockIds.push(btoa(String(i).padStart(6, '0')));
+        }
+
+        let next = 0;
+        async function worker() {
+            while (next < total) {
+                const i = next++;
+                const chunk = file.slice(i * BLOCK_SIZE, Math.min(file.size, (i + 1) * BLOCK_SIZE));
+                const res = await fetch(`${uploadUrl}&comp=block&blockid=${encodeURIComponent(blockIds[i])}`, {
+                    method: 'PUT',
+                    body: chunk
+                });
+                if (!res.ok) {
+                    throw new Error(`Block upload failed: ${res.status}`);
+                }
+            }
+        }
+        await Promise.all(Array.from({ length: Math.min(BLOCK_CONCURRENCY, total) }, worker));
+
+        const xml = `<?xml version="1.0" encoding="utf-8"?><BlockList>${blockIds.map(id => `<Latest>${id}</Latest>`).join('')}</BlockList>`;
+        const res = await fetch(`${uploadUrl}&comp=blocklist`, {
+            method: 'PUT',
+            headers: {
+                'x-ms-blob-content-type': 'application/pdf',
+                // Never overwrite an existing document
+                'If-None-Match': '*'
+            },
+            body: xml
+        });
+        if (!res.ok) {
+            const err = new Error(`Commit failed: ${res.status}`);
+            err.status = res.status;
+            throw err;
+        }
+    }
+
 
     // --- 2. Chat Logic (REAL) ---
+    // One conversation per page load: follow-up questions can build on earlier answers
+    const sessionId = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
     btnAsk.addEventListener('click', async () => {
         const question = txtQuestion.value.trim();
         const category = selCategory.value;
@@ -174,7 +288,8 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const payload = {
                 question: question,
-                category: category || null
+                category: category || null,
+                session_id: sessionId
             };
 
             const response = await fetch(`${API_BASE_URL}/chat`, {
@@ -371,7 +486,12 @@ document.addEventListener('DOMContentLoaded', () => {
                     throw new Error(errorText || `Server Error: ${response.status}`);
                 }
 
-                const result = await response.json();
+                let result = await response.json();
+
+                // Category deletes run in the background: poll until the job finishes
+                if (result.job_id) {
+                    result = await pollDeleteJob(result.job_id);
+                }
                 showStatus(deleteStatus, result.message, 'success');
 
                 // Refresh list if we just deleted a PDF
@@ -382,8 +502,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
                 // Reload categories in case we wiped a category entirely (optional, but good UX)
                 if (mode === 'category') {
-                    // Slight delay to allow backend to update if needed
-                    setTimeout(loadDeleteCategories, 1000);
+                    loadDeleteCategories();
+                    loadCategories();
                 }
 
             } catch (err) {
@@ -393,6 +513,26 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    async function pollDeleteJob(jobId) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1500));
+
+            const response = await fetch(`${API_BASE_URL}/delete_category?job_id=${encodeURIComponent(jobId)}`);
+            if (!response.ok) {
+                throw new Error(`Server Error: ${response.status}`);
+            }
+
+            const job = await response.json();
+            if (job.status === 'done') {
+                return { message: `Category '${job.category}' deleted (${job.blobs_deleted} files, ${job.chunks_deleted} chunks).` };
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Background delete failed');
+            }
+            showStatus(deleteStatus, `Deleting... ${job.blobs_deleted} files, ${job.chunks_deleted} chunks removed so far`, 'loading');
+        }
+    }
+
     // ...
 
     function displayAnswer(data) {
@@ -0,0 +1,21 @@
+import json
+import logging
+import azure.functions as func
+
+from services.ingest import process_range_message
+
+
+def main(msg: func.QueueMessage) -> None:
+    """
+    Ingests one page-range work item (or the continuation of one).
+    Scale-out comes from the Functions queue trigger running many of these.
+    """
+    payload = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(
+        "Ingest worker: %s from page %s (run %s, dequeue #%s)",
+        payload.get("blob_path"),
+        payload.get("start"),
+        payload.get("run_id"),
+        msg.dequeue_count,
+    )
+    process_range_message(payload)
@@ -1,8 +1,11 @@
 import logging
 import azure.functions as func
 import json
-from services.mongo_store import mongo_store
+from services import catalog
+from services.http_cache import json_response
+from services.tracing import traced
 
+@traced("list_api")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('List PDFs API triggered.')
 
@@ -15,12 +18,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         
         # Mode 1: List Categories
         if type_param == 'categories':
-            cats = mongo_store.get_all_categories()
-            return func.HttpResponse(
-                json.dumps({"categories": sorted(list(cats))}),
-                status_code=200,
-                mimetype="application/json"
-            )
+            cats = catalog.list_categories()
+            return json_response(req, {"categories": sorted(list(cats))})
 
         # Mode 2: List PDFs in Category
         category = req.params.get('category')
@@ -31,29 +30,31 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
 
-        # FIX: Directly query collection instead of calling non-existent list_pdfs method
-        pdfs = []
-        collection = mongo_store.collection
-        
-        if collection is not None:
-            try:
-                # Retrieve unique PDF names for the given category
-                distinct_pdfs = collection.distinct("pdf_name", {"category": category})
-                # Filter out any None/Empty values and sort
-                pdfs = sorted([p for p in distinct_pdfs if p])
-            except Exception as db_err:
-                logging.error(f"Error querying MongoDB for PDFs: {db_err}")
-                # Fallback to empty list gracefully
-                pdfs = []
-        else:
-            logging.warning("MongoDB collection not available for listing PDFs.")
-            pdfs = []
-        
-        return func.HttpResponse(
-            json.dumps({"category": category, "pdfs": pdfs}),
-            status_code=200,
-            mimetype="application/json"
-        )
+        # Pagination (no limit -> whole category, as before)
+        try:
+            offset = max(0, int(req.params.get('offset', 0)))
+            limit = max(0, int(req.params.get('limit', 0)))
+        except ValueError:
+            return func.HttpResponse(
+                json.dumps({"error": "offset/limit must be integers"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+
+        # Served from the per-PDF catalog (not distinct() over all chunks)
+        entries, total = catalog.list_pdfs(category, offset=offset, limit=limit or None)
+
+        payload = {
+            "category": category,
+            "pdfs": [e["pdf_name"] for e in entries],
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+        }
+        if req.params.get('details') in ('1', 'true'):
+            payload["items"] = entries
+
+        return json_response(req, payload)
 
     except Exception as e:
         logging.exception("List API failed")
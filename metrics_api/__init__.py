@@ -0,0 +1,39 @@
+import logging
+import azure.functions as func
+import json
+
+from config.settings import settings
+from services import metrics
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Prometheus text exposition of this instance's in-process collectors
+    (latency histograms, OpenAI tokens/429s, Mongo scan sizes, caches, memory).
+    Scrape with ?pin=... or the x-access-pin header.
+    """
+    from services.auth import validate_pin
+    if auth_error := validate_pin(req):
+        return auth_error
+
+    if not settings.METRICS_ENABLED:
+        return func.HttpResponse(
+            json.dumps({"error": "Metrics are disabled (METRICS_ENABLED=false)"}),
+            status_code=404,
+            mimetype="application/json"
+        )
+
+    # Make sure the caches are registered even if nothing used them yet
+    from services import catalog, cross_encoder  # noqa: F401
+
+    try:
+        body = metrics.render()
+    except Exception:
+        logging.exception("Metrics rendering failed")
+        return func.HttpResponse("# metrics rendering failed\n", status_code=500, mimetype="text/plain")
+
+    return func.HttpResponse(
+        body,
+        status_code=200,
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8", "Cache-Control": "no-store"},
+    )
@@ -0,0 +1,64 @@
+import logging
+import azure.functions as func
+import json
+from services import rechunk
+from services.tracing import traced
+
+
+def _json(payload: dict, status_code: int) -> func.HttpResponse:
+    return func.HttpResponse(
+        json.dumps(payload, default=str),
+        status_code=status_code,
+        mimetype="application/json"
+    )
+
+
+@traced("rechunk_api")
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Rechunk API triggered.')
+
+    from services.auth import validate_pin
+    if auth_error := validate_pin(req):
+        return auth_error
+
+    try:
+        # Progress polling
+        if req.method == "GET":
+            job_id = req.params.get('job_id')
+            if not job_id:
+                return _json({"error": "Missing job_id param"}, 400)
+            job = rechunk.get_job(job_id)
+            if not job:
+                return _json({"error": "Unknown job"}, 404)
+            return _json(rechunk.progress(job), 200)
+
+        try:
+            body = req.get_json() or {}
+        except ValueError:
+            body = {}
+        if not isinstance(body, dict):
+            return _json({"error": "Request body must be a JSON object"}, 400)
+
+        # Scope: everything, one category, or some PDFs of a category
+        category = req.params.get('category') or body.get('category')
+        pdf_names = body.get('pdf_names') or None
+        if pdf_names is not None and (
+                not isinstance(pdf_names, list)
+                or not all(isinstance(n, str) for n in pdf_names)):
+            return _json({"error": "pdf_names must be a list of names"}, 400)
+        if pdf_names and not category:
+            return _json({"error": "pdf_names requires a category"}, 400)
+
+        job = rechunk.start_rechunk(category.lower() if category else None, pdf_names)
+        if job is None:
+            return _json({"error": "Database not available"}, 503)
+
+        logging.info(f"Rechunk job {job['_id']} started for {job['pdfs_total']} PDFs")
+        return _json({
+            "message": f"Re-chunking of {job['pdfs_total']} PDFs started.",
+            **rechunk.progress(job),
+        }, 202)
+
+    except Exception as e:
+        logging.exception("Rechunk failed")
+        return _json({"error": str(e)}, 500)
@@ -0,0 +1,21 @@
+import json
+import logging
+import azure.functions as func
+
+from services.rechunk import process_rechunk_message
+from services.tracing import traced
+
+
+@traced("rechunk_worker")
+def main(msg: func.QueueMessage) -> None:
+    """
+    Rebuilds the chunks of one PDF of a rechunk job queued by rechunk_api.
+    """
+    payload = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(
+        "Rechunk worker: %s (job %s, dequeue #%s)",
+        payload.get("blob_path"),
+        payload.get("job_id"),
+        msg.dequeue_count,
+    )
+    process_rechunk_message(payload)
@@ -0,0 +1,62 @@
+import logging
+import azure.functions as func
+import json
+from services import reembed
+from services.tracing import traced
+
+
+def _json(payload: dict, status_code: int) -> func.HttpResponse:
+    return func.HttpResponse(
+        json.dumps(payload, default=str),
+        status_code=status_code,
+        mimetype="application/json"
+    )
+
+
+@traced("reembed_api")
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Reembed API triggered.')
+
+    from services.auth import validate_pin
+    if auth_error := validate_pin(req):
+        return auth_error
+
+    try:
+        # Progress polling
+        if req.method == "GET":
+            job_id = req.params.get('job_id')
+            if not job_id:
+                return _json({"error": "Missing job_id param"}, 400)
+            job = reembed.get_job(job_id)
+            if not job:
+                return _json({"error": "Unknown job"}, 404)
+            return _json(reembed.progress(job), 200)
+
+        try:
+            body = req.get_json() or {}
+        except ValueError:
+            body = {}
+
+        # Target: the new deployment and the chunk field its vectors go to
+        field = body.get('field') or ""
+        deployment = body.get('deployment') or ""
+        try:
+            dimensions = int(body.get('dimensions') or 0)
+        except (TypeError, ValueError):
+            return _json({"error": "dimensions must be an integer"}, 400)
+        if error := reembed.validate_target(field, deployment):
+            return _json({"error": error}, 400)
+
+        job = reembed.start_reembed(field, deployment, dimensions)
+        if job is None:
+            return _json({"error": "Database not available"}, 503)
+
+        logging.info(f"Reembed job {job['_id']} into {field} over {job['chunks_total']} chunks")
+        return _json({
+            "message": f"Re-embedding of {job['chunks_total']} chunks into {field} started.",
+            **reembed.progress(job),
+        }, 202)
+
+    except Exception as e:
+        logging.exception("Reembed failed")
+        return _json({"error": str(e)}, 500)
@@ -0,0 +1,21 @@
+import json
+import logging
+import azure.functions as func
+
+from services.reembed import process_reembed_message
+from services.tracing import traced
+
+
+@traced("reembed_worker")
+def main(msg: func.QueueMessage) -> None:
+    """
+    Re-embeds one _id range of a reembed job queued by reembed_api.
+    """
+    payload = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(
+        "Reembed worker: range %s (job %s, dequeue #%s)",
+        payload.get("range"),
+        payload.get("job_id"),
+        msg.dequeue_count,
+    )
+    process_reembed_message(payload)
@@ -0,0 +1,122 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional
+from config.settings import settings
+
+if TYPE_CHECKING:
+    from azure.storage.blob import BlobServiceClient, ContainerClient
+
+# Container used by upload_api, blob_trigger and download_api
+PDF_CONTAINER = "pdfs"
+
+# Blob batch API limit (sub-requests per batch)
+DELETE_BATCH_SIZE = 256
+
+# Block size for staged uploads
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# Global lazy clients (connection pool is reused across invocations)
+_service_client: Optional["BlobServiceClient"] = None
+
+
+def get_blob_service() -> Optional["BlobServiceClient"]:
+    global _service_client
+    if _service_client is not None:
+        return _service_client
+
+    conn = settings.AZURE_STORAGE_CONNECTION_STRING
+    if not conn:
+        logging.error("Storage connection string missing")
+        return None
+
+    from azure.storage.blob import BlobServiceClient
+
+    # Anything above max_single_put_size is staged as blocks, uploaded
+    # max_concurrency at a time by upload_blob
+    _service_client = BlobServiceClient.from_connection_string(
+        conn,
+        max_single_put_size=BLOCK_SIZE * 2,
+        max_block_size=BLOCK_SIZE,
+    )
+    return _service_client
+
+
+def get_container_client(container: str = PDF_CONTAINER) -> Optional["ContainerClient"]:
+    service = get_blob_service()
+    if service is None:
+        return None
+    return service.get_container_client(container)
+
+
+def generate_upload_sas(blob_path: str, ttl_seconds: int) -> Optional[str]:
+    """
+    Short-lived create/write SAS URL for a direct browser upload to
+    pdfs/{blob_path}, or None if the account key isn't available.
+    """
+    from datetime import datetime, timedelta, timezone
+    from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+    container_client = get_container_client()
+    if container_client is None:
+        return None
+    blob_client = container_client.get_blob_client(blob_path)
+
+    account_key = getattr(blob_client.credential, "account_key", None)
+    if not account_key:
+        return None
+
+    token = generate_blob_sas(
+        account_name=blob_client.account_name,
+        container_name=blob_client.container_name,
+        blob_name=blob_client.blob_name,
+        account_key=account_key,
+        permission=BlobSasPermissions(create=True, write=True),
+        expiry=datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds),
+    )
+    return f"{blob_client.url}?{token}"
+
+
+def download_pdf_bytes(blob_path: str) -> bytes:
+    """
+    Full download of pdfs/{blob_path}.
+    """
+    container_client = get_container_client()
+    if container_client is None:
+        raise RuntimeError("Storage connection string missing")
+    return container_client.get_blob_client(blob_path).download_blob().readall()
+
+
+def delete_blobs_batched(
+    container_client: "ContainerClient",
+    names: Iterable[str],
+    workers: int = 4,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Delete blobs with the batch API (256 per request), several batches in flight.
+    Missing blobs are ignored. Returns the number of blobs deleted.
+    """
+    def run(batch: List[str]) -> int:
+        deleted = 0
+        responses = container_client.delete_blobs(*batch, raise_on_any_failure=False)
+        for name, resp in zip(batch, responses):
+            if resp.status_code in (200, 202):
+                deleted += 1
+            elif resp.status_code != 404:
+                logging.warning("Failed to delete blob %s: HTTP %s", name, resp.status_code)
+        if progress:
+            progress(deleted)
+        return deleted
+
+    def batches():
+        batch: List[str] = []
+        for name in names:
+            batch.append(name)
+            if len(batch) == DELETE_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="blob-delete") as pool:
+        return sum(pool.map(run, batches()))
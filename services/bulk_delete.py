@@ -0,0 +1,169 @@
+import logging
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from config.settings import settings
+from services import catalog, page_text
+from services.mongo_store import mongo_store
+from services.work_queue import enqueue, register_handler
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def _jobs():
+    return mongo_store.get_collection(settings.DELETE_JOBS_COLLECTION)
+
+
+def _forget_ingest_jobs(category: str, pdf_names: Optional[List[str]] = None) -> None:
+    """
+    Drop ingest job state so in-flight range workers stop writing chunks.
+    """
+    jobs = mongo_store.get_collection(settings.INGEST_JOBS_COLLECTION)
+    ranges = mongo_store.get_collection(settings.INGEST_JOBS_COLLECTION + "_ranges")
+    if jobs is None or ranges is None:
+        return
+
+    if pdf_names is None:
+        prefix = f"^{re.escape(category)}/"
+        jobs.delete_many({"_id": {"$regex": prefix}})
+        ranges.delete_many({"blob_path": {"$regex": prefix}})
+    else:
+        paths = [f"{category}/{n}" for n in pdf_names]
+        jobs.delete_many({"_id": {"$in": paths}})
+        ranges.delete_many({"blob_path": {"$in": paths}})
+
+
+def delete_pdfs_now(category: str, pdf_names: List[str]) -> dict:
+    """
+    Synchronous delete of a few PDFs: chunks, ingest state and blobs.
+    """
+    from services.blob_store import get_container_client, delete_blobs_batched
+
+    hashes = [e.get("hash") for e in catalog.find_entries(category, pdf_names)]
+    catalog.remove_pdfs(category, pdf_names)
+    chunks = mongo_store.delete_pdfs(category, pdf_names)
+    catalog.bump_generation(category)
+    _forget_ingest_jobs(category, pdf_names)
+    page_text.forget(hashes)
+
+    blobs = 0
+    container_client = get_container_client()
+    if container_client is not None:
+        blobs = delete_blobs_batched(
+            container_client,
+            [f"{category}/{n}" for n in pdf_names],
+            workers=settings.DELETE_BLOB_WORKERS,
+        )
+    return {"chunks_deleted": chunks, "blobs_deleted": blobs}
+
+
+def start_category_delete(category: str) -> Optional[str]:
+    """
+    Queue a background delete of a whole category. Returns the job id.
+    """
+    jobs = _jobs()
+    if jobs is None:
+        return None
+
+    job_id = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    jobs.insert_one({
+        "_id": job_id,
+        "category": category,
+        "status": QUEUED,
+        "chunks_deleted": 0,
+        "blobs_deleted": 0,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    })
+    enqueue(settings.DELETE_QUEUE_NAME, {"job_id": job_id})
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    jobs = _jobs()
+    if jobs is None:
+        return None
+    return jobs.find_one({"_id": job_id})
+
+
+def run_delete_job(job_id: str) -> None:
+    """
+    Delete all chunks and blobs of a category, recording progress on the job doc.
+    Safe to re-run: both steps only delete what is still there.
+    """
+    from services.blob_store import get_container_client, delete_blobs_batched
+
+    jobs = _jobs()
+    if jobs is None:
+        raise RuntimeError("MongoDB not available")
+
+    job = jobs.find_one_and_update(
+        {"_id": job_id, "status": {"$in": [QUEUED, RUNNING, FAILED]}},
+        {"$set": {"status": RUNNING, "updated_at": datetime.now(timezone.utc)}},
+    )
+    if job is None:
+        logging.info("Delete job %s already finished or unknown", job_id)
+        return
+
+    category = job["category"]
+    lock = threading.Lock()
+
+    def bump(field: str):
+        def progress(n: int) -> None:
+            with lock:
+                jobs.update_one(
+                    {"_id": job_id},
+                    {"$inc": {field: n}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+                )
+        return progress
+
+    try:
+        # 1. Stop ingestion and remove chunks (listed/searchable data goes first)
+        hashes = [e.get("hash") for e in catalog.find_entries(category)]
+        catalog.remove_category(category)
+        _forget_ingest_jobs(category)
+        mongo_store.delete_category(category, progress=bump("chunks_deleted"))
+        catalog.bump_generation(category)
+        page_text.forget(hashes)
+
+        # 2. Blobs in the category folder, 256 per batch request
+        container_client = get_container_client()
+        if container_client is not None:
+            names = (b.name for b in container_client.list_blobs(name_starts_with=f"{category}/"))
+            delete_blobs_batched(
+                container_client,
+                names,
+                workers=settings.DELETE_BLOB_WORKERS,
+                progress=bump("blobs_deleted"),
+            )
+
+        jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": DONE, "updated_at": datetime.now(timezone.utc)}},
+        )
+        logging.info("Delete job %s for category '%s' done", job_id, category)
+
+    except Exception as e:
+        logging.exception("Delete job %s failed", job_id)
+        jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": FAILED, "error": str(e), "updated_at": datetime.now(timezone.utc)}},
+        )
+        raise
+
+
+def process_delete_message(payload: dict) -> None:
+    run_delete_job(payload["job_id"])
+
+
+# In-memory queue backend dispatches delete messages here
+register_handler(settings.DELETE_QUEUE_NAME, process_delete_message)
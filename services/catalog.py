@@ -0,0 +1,443 @@
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services import metrics
+from services.mongo_store import mongo_store
+from services.tracing import span
+from services.ttl_cache import TTLCache
+
+# Ingest statuses of a catalog entry
+PROCESSING = "processing"
+READY = "ready"
+FAILED = "failed"
+
+# Fields returned to list clients (no internal ids)
+_PUBLIC_FIELDS = {
+    "_id": 0,
+    "pdf_name": 1,
+    "category": 1,
+    "blob_path": 1,
+    "page_count": 1,
+    "chunk_count": 1,
+    "near_duplicates": 1,
+    "year": 1,
+    "date": 1,
+    "uploaded_at": 1,
+    "size": 1,
+    "hash": 1,
+    "status": 1,
+}
+
+# Category list and per-category PDF lists, read by list_api / categories_api
+catalog_cache = TTLCache(settings.CATALOG_CACHE_TTL_SECONDS, max_size=512)
+metrics.REGISTRY.register_cache("catalog", catalog_cache)
+
+# Marker doc (in the _meta collection) of the one-off backfill from the chunk collection
+BACKFILL_MARKER_ID = "catalog_backfill"
+
+_indexes_ready = False
+_backfill_checked = False
+_backfill_done = False
+_init_lock = threading.Lock()
+_backfill_lock = threading.Lock()
+
+
+def _catalog():
+    """
+    The catalog collection, with its indexes created and the backfill run
+    (once per deployment) before any caller reads or writes it.
+    """
+    global _indexes_ready
+    col = mongo_store.get_collection(settings.CATALOG_COLLECTION)
+    if col is None:
+        return col
+
+    if not _indexes_ready:
+        with _init_lock:
+            if not _indexes_ready:
+                try:
+                    col.create_index([("category", 1), ("pdf_name", 1)])
+                    col.create_index([("uploaded_at", -1)])
+                except Exception:
+                    logging.exception("Failed to create catalog indexes")
+                _indexes_ready = True
+    if not _backfill_checked:
+        _ensure_backfill(col)
+    return col
+
+
+def invalidate(category: Optional[str] = None) -> None:
+    catalog_cache.invalidate("categories")
+    if category is None:
+        catalog_cache.clear()
+    else:
+        catalog_cache.invalidate(("pdfs", category))
+
+
+def upsert_entry(blob_path: str, category: str, pdf_name: str, **fields) -> None:
+    """
+    Create/refresh the catalog entry of a PDF (called when ingestion starts).
+    The backfill (via _catalog) runs first: the first upload after rollout
+    must not hide the PDFs ingested before the catalog existed.
+    """
+    col = _catalog()
+    if col is None:
+        return
+
+    doc = {
+        "blob_path": blob_path,
+        "category": category,
+        "pdf_name": pdf_name,
+        "updated_at": datetime.now(timezone.utc),
+        **fields,
+    }
+    col.update_one({"_id": blob_path}, {"$set": doc}, upsert=True)
+    invalidate(category)
+    # Re-ingest: the previous chunks of this PDF are gone
+    bump_generation(category)
+
+
+def mark_status(blob_path: str, status: str, **fields) -> None:
+    col = _catalog()
+    if col is None:
+        return
+
+    entry = col.find_one_and_update(
+        {"_id": blob_path},
+        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc), **fields}},
+        projection={"category": 1},
+    )
+    invalidate(entry.get("category") if entry else None)
+    if status == READY and entry:
+        bump_generation(entry.get("category"))
+
+
+def remove_pdfs(category: str, pdf_names: List[str]) -> None:
+    col = _catalog()
+    if col is None:
+        return
+    blob_paths = [f"{category}/{n}" for n in pdf_names]
+    col.delete_many({"_id": {"$in": blob_paths}})
+    invalidate(category)
+    bump_generation(category)
+    _drop_latest_if_deleted(blob_paths)
+
+
+def remove_category(category: str) -> None:
+    col = _catalog()
+    if col is None:
+        return
+    col.delete_many({"category": category})
+    invalidate(category)
+    bump_generation(category)
+
+    meta = _meta()
+    if meta is not None and meta.find_one({"_id": LATEST_POINTER_ID, "category": category}, {"_id": 1}):
+        recompute_latest_pdf()
+
+
+def find_entries(category: Optional[str] = None, pdf_names: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Uncached catalog entries (with _id = blob path) for background jobs,
+    optionally limited to a category and some of its PDFs.
+    """
+    col = _catalog()
+    if col is None:
+        return []
+    query: Dict = {}
+    if category:
+        query["category"] = category
+    if pdf_names:
+        query["pdf_name"] = {"$in": list(pdf_names)}
+    return list(col.find(query))
+
+
+def _ensure_backfill(col) -> None:
+    """
+    One-off migration for deployments predating the catalog: build entries
+    from the chunk collection, then record BACKFILL_MARKER_ID in _meta.
+    Keyed on the marker rather than on an empty catalog, so entries written
+    meanwhile (or by an interrupted run) don't skip it; existing entries
+    are kept. A failed run is retried by the next process.
+    """
+    global _backfill_checked, _backfill_done
+    with _backfill_lock:
+        if _backfill_checked:
+            return
+        meta = _meta()
+        chunks = mongo_store.collection
+        try:
+            if meta is None or chunks is None:
+                return
+            if meta.find_one({"_id": BACKFILL_MARKER_ID}, {"_id": 1}) is None:
+                added = _backfill(col, chunks)
+                now = datetime.now(timezone.utc)
+                meta.update_one(
+                    {"_id": BACKFILL_MARKER_ID},
+                    {"$setOnInsert": {"entries": added, "completed_at": now}},
+                    upsert=True,
+                )
+                if added:
+                    # Recomputed from the complete catalog on next use
+                    meta.delete_one({"_id": LATEST_POINTER_ID})
+                    latest_cache.clear()
+                    catalog_cache.clear()
+            _backfill_done = True
+        except Exception:
+            logging.exception("Catalog backfill failed")
+        finally:
+            _backfill_checked = True
+
+
+def backfilled() -> bool:
+    """
+    True once the catalog is known to list every PDF of the chunk collection
+    (the backfill marker exists).
+    """
+    col = _catalog()
+    return col is not None and _backfill_done
+
+
+def _backfill(col, chunks) -> int:
+    """
+    Insert an entry per PDF found in the chunk collection. Returns the
+    number of entries added.
+    """
+    if chunks.find_one({}, {"_id": 1}) is None:
+        return 0
+
+    logging.info("Catalog backfill from chunk collection")
+    pipeline = [
+        {"$group": {
+            "_id": {"category": "$category", "pdf_name": "$pdf_name"},
+            "blob_path": {"$first": "$blob_path"},
+            "chunk_count": {"$sum": 1},
+            "page_count": {"$max": "$page_number"},
+            "year": {"$first": "$year"},
+            "date": {"$first": "$date"},
+            "uploaded_at": {"$max": "$uploaded_at"},
+        }},
+    ]
+    now = datetime.now(timezone.utc)
+    added = 0
+    for row in chunks.aggregate(pipeline, allowDiskUse=True):
+        category = row["_id"].get("category") or "uncategorized"
+        pdf_name = row["_id"].get("pdf_name")
+        if not pdf_name:
+            continue
+        blob_path = row.get("blob_path") or f"{category}/{pdf_name}"
+        result = col.update_one(
+            {"_id": blob_path},
+            {"$setOnInsert": {
+                "blob_path": blob_path,
+                "category": category,
+                "pdf_name": pdf_name,
+                "chunk_count": row["chunk_count"],
+                "page_count": row.get("page_count"),
+                "year": row.get("year"),
+                "date": row.get("date"),
+                "uploaded_at": row.get("uploaded_at"),
+                "status": READY,
+                "updated_at": now,
+            }},
+            upsert=True,
+        )
+        if result.upserted_id is not None:
+            added += 1
+    logging.info("Catalog backfill added %d entries", added)
+    return added
+
+
+def list_categories() -> List[str]:
+    def load() -> List[str]:
+        col = _catalog()
+        if col is None:
+            return mongo_store.get_all_categories()
+
+        cleaned = {c or "uncategorized" for c in col.distinct("category")}
+        cleaned.add("uncategorized")
+        return sorted(cleaned)
+
+    return catalog_cache.get_or_load("categories", load)
+
+
+def _category_entries(category: str) -> List[Dict]:
+    def load() -> List[Dict]:
+        col = _catalog()
+        if col is None:
+            return []
+
+        entries = []
+        for e in col.find({"category": category}, _PUBLIC_FIELDS).sort("pdf_name", 1):
+            if e.get("uploaded_at"):
+                e["uploaded_at"] = e["uploaded_at"].isoformat()
+            entries.append(e)
+        return entries
+
+    return catalog_cache.get_or_load(("pdfs", category), load)
+
+
+def list_pdfs(category: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """
+    Catalog entries of a category sorted by name, paginated. Returns (page, total).
+    """
+    entries = _category_entries(category)
+    end = None if not limit else offset + limit
+    return entries[offset:end], len(entries)
+
+
+# ---------------------------------------------------------
+# "Latest document" pointer (chat auto-scope)
+# ---------------------------------------------------------
+
+LATEST_POINTER_ID = "latest_pdf"
+
+latest_cache = TTLCache(settings.LATEST_PDF_CACHE_TTL_SECONDS, max_size=1)
+metrics.REGISTRY.register_cache("latest_pdf", latest_cache)
+
+
+def _meta():
+    return mongo_store.get_collection(settings.CATALOG_COLLECTION + "_meta")
+
+
+def set_latest_pdf(blob_path: str, category: str, pdf_name: str, uploaded_at: datetime) -> None:
+    """
+    Point "latest" at this PDF unless a newer upload already holds it.
+    Single conditional upsert, so concurrent ingests can't regress it.
+    """
+    meta = _meta()
+    if meta is None:
+        return
+
+    from pymongo.errors import DuplicateKeyError
+    try:
+        meta.update_one(
+            {"_id": LATEST_POINTER_ID, "uploaded_at": {"$lte": uploaded_at}},
+            {"$set": {
+                "blob_path": blob_path,
+                "category": category,
+                "pdf_name": pdf_name,
+                "uploaded_at": uploaded_at,
+            }},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Pointer exists with a newer uploaded_at
+        return
+    latest_cache.clear()
+
+
+def recompute_latest_pdf() -> Optional[Dict]:
+    """
+    Rebuild the pointer from the catalog (indexed on uploaded_at), e.g. after
+    the latest PDF was deleted.
+    """
+    meta = _meta()
+    col = _catalog()
+    # _catalog() runs the backfill first, so pre-catalog PDFs are candidates
+    if meta is None or col is None:
+        return None
+
+    # Only PDFs with chunks, as set_latest_pdf (entries from before statuses count as ready)
+    entry = col.find_one({"status": {"$in": [READY, None]}}, sort=[("uploaded_at", -1)])
+    latest_cache.clear()
+    if entry is None:
+        meta.delete_one({"_id": LATEST_POINTER_ID})
+        return None
+
+    meta.replace_one(
+        {"_id": LATEST_POINTER_ID},
+        {
+            "blob_path": entry["blob_path"],
+            "category": entry.get("category", "uncategorized"),
+            "pdf_name": entry["pdf_name"],
+            "uploaded_at": entry.get("uploaded_at"),
+        },
+        upsert=True,
+    )
+    return {
+        "pdf_name": entry["pdf_name"],
+        "category": entry.get("category", "uncategorized"),
+        "blob_path": entry["blob_path"],
+    }
+
+
+def get_latest_pdf() -> Optional[Dict]:
+    """
+    Most recently uploaded PDF for chat auto-scope: one _id lookup, cached
+    for LATEST_PDF_CACHE_TTL_SECONDS.
+    """
+    def load() -> Optional[Dict]:
+        s.set(cache_hit=False)
+        # The backfill may replace a pointer set before it ran
+        _catalog()
+        meta = _meta()
+        if meta is None:
+            return None
+        doc = meta.find_one({"_id": LATEST_POINTER_ID})
+        if doc is None:
+            # First use, or dropped by the backfill
+            return recompute_latest_pdf()
+        return {
+            "pdf_name": doc.get("pdf_name"),
+            "category": doc.get("category", "uncategorized"),
+            "blob_path": doc.get("blob_path"),
+        }
+
+    with span("latest_pdf", cache_hit=True) as s:
+        return latest_cache.get_or_load(LATEST_POINTER_ID, load)
+
+
+def _drop_latest_if_deleted(blob_paths: List[str]) -> None:
+    meta = _meta()
+    if meta is None:
+        return
+    if meta.find_one({"_id": LATEST_POINTER_ID, "blob_path": {"$in": blob_paths}}, {"_id": 1}):
+        recompute_latest_pdf()
+
+
+# ---------------------------------------------------------
+# Chunk generations (in-memory vector index invalidation)
+# ---------------------------------------------------------
+
+# Counter doc per category plus one for the whole collection
+GENERATION_PREFIX = "gen:"
+ALL_CATEGORIES = "*"
+
+generation_cache = TTLCache(settings.VECTOR_INDEX_CHECK_SECONDS, max_size=1024)
+
+
+def bump_generation(category: Optional[str]) -> None:
+    """
+    Record that the chunks of a category changed, so every instance rebuilds
+    its cached index of that category (and the global one) on next use.
+    """
+    meta = _meta()
+    if meta is None:
+        return
+    keys = [ALL_CATEGORIES] + ([category] if category else [])
+    for key in keys:
+        meta.update_one({"_id": GENERATION_PREFIX + key}, {"$inc": {"n": 1}}, upsert=True)
+        generation_cache.invalidate(key)
+    if not category:
+        generation_cache.clear()
+
+
+def get_generation(category: Optional[str]) -> int:
+    """
+    Current chunk generation of a category (None = all), cached for
+    VECTOR_INDEX_CHECK_SECONDS.
+    """
+    key = category or ALL_CATEGORIES
+
+    def load() -> int:
+        meta = _meta()
+        if meta is None:
+            return 0
+        doc = meta.find_one({"_id": GENERATION_PREFIX + key})
+        return int(doc.get("n", 0)) if doc else 0
+
+    return generation_cache.get_or_load(key, load)
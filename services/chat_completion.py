@@ -1,47 +1,29 @@
 import logging
-import os
 from typing import List, Dict, Any
-from openai import AzureOpenAI
-from config.settings import settings
-
-# Global lazy client
-_chat_client = None
-
-def get_chat_client():
-    global _chat_client
-    if _chat_client:
-        return _chat_client
-
-    if not (
-        settings.AZURE_OPENAI_API_KEY
-        and settings.AZURE_OPENAI_ENDPOINT
-        and settings.AZURE_OPENAI_CHAT_DEPLOYMENT
-    ):
-        raise RuntimeError("Azure OpenAI Chat configuration missing")
-
-    _chat_client = AzureOpenAI(
-        api_key=settings.AZURE_OPENAI_API_KEY,
-        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-        api_version=settings.AZURE_OPENAI_API_VERSION,
-    )
-    return _chat_client
+from services.tracing import span
 
 
 def get_chat_completion(messages: List[Dict[str, str]]) -> str:
     """
-    Executes a chat completion validation/request against Azure OpenAI.
-    Lazy initialization validation included.
+    Executes a chat completion through the provider router (services/llm_router.py):
+    fastest healthy provider of LLM_PROVIDERS, fallback on errors, optional hedging.
     """
-    client = get_chat_client()
-    
+    from services.llm_router import get_router
+
     try:
-        completion = client.chat.completions.create(
-            model=settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1500
-        )
-        return completion.choices[0].message.content
+        with span("chat_completion") as s:
+            content, provider, usage = get_router().complete(
+                messages,
+                temperature=0.7,
+                max_tokens=1500
+            )
+            s.set(provider=provider.name, model=provider.model)
+            if usage:
+                s.set(
+                    prompt_tokens=usage.prompt_tokens,
+                    completion_tokens=usage.completion_tokens,
+                )
+        return content
     except Exception as e:
         logging.exception("Chat completion failed")
         raise e
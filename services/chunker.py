@@ -1,10 +1,14 @@
-from typing import List
+import re
+from typing import Dict, Iterator, List, NamedTuple, Optional
 
 
 # Constants for ingestion stability
 CHUNK_SIZE = 2200
 CHUNK_OVERLAP = 200
-MAX_CHUNKS = 1200
+
+# Structure-aware chunker sizing (tokens)
+CHUNK_MAX_TOKENS = 500
+CHUNK_OVERLAP_TOKENS = 50
 
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
     """
@@ -21,10 +25,6 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
     text_len = len(text)
 
     while start < text_len:
-        # Stop if we exceed max chunks
-        if len(chunks) >= MAX_CHUNKS:
-            break
-
         end = min(start + chunk_size, text_len)
         chunk = text[start:end].strip()
         if chunk:
@@ -32,3 +32,200 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
         start += chunk_size - overlap
 
     return chunks
+
+
+# ---------------------------------------------------------
+# Structure-aware chunking (token sized, sentence/heading aware)
+# ---------------------------------------------------------
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_PARA_SPLIT_RE = re.compile(r"\n[ \t]*\n+")
+_SENTENCE_END_RE = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]]))\s+(?=[\"'(\[]?[A-Z0-9])")
+_NUMBERED_HEADING_RE = re.compile(r"^(?:(?:\d+(?:\.\d+)*\.?|[IVXLC]+\.)\s+[A-Z]|(?i:chapter|section|appendix)\b)")
+
+_encoder = None
+_encoder_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count using tiktoken when installed, else a word/punctuation
+    approximation that tracks cl100k counts closely for English prose.
+    """
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = None
+
+    if _encoder is not None:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return len(_TOKEN_RE.findall(text))
+
+
+class _Unit(NamedTuple):
+    text: str
+    tokens: int
+    page: int
+    heading: bool
+    new_paragraph: bool
+
+
+def _is_heading(line: str) -> bool:
+    if not line or len(line) > 80 or line[-1] in ".,;:":
+        return False
+    words = line.split()
+    if len(words) > 12:
+        return False
+    if _NUMBERED_HEADING_RE.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return bool(letters) and (line.isupper() or line.istitle())
+
+
+def _split_long(text: str, max_tokens: int) -> Iterator[str]:
+    """
+    Split a single oversized sentence on word boundaries.
+    """
+    words = text.split()
+    piece: List[str] = []
+    piece_tokens = 0
+    for word in words:
+        t = count_tokens(word)
+        if piece and piece_tokens + t > max_tokens:
+            yield " ".join(piece)
+            piece, piece_tokens = [], 0
+        piece.append(word)
+        piece_tokens += t
+    if piece:
+        yield " ".join(piece)
+
+
+def _sentences(text: str, page_no: int, max_tokens: int) -> Iterator[_Unit]:
+    first = True
+    for sentence in _SENTENCE_END_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        tokens = count_tokens(sentence)
+        pieces = _split_long(sentence, max_tokens) if tokens > max_tokens else (sentence,)
+        for piece in pieces:
+            if piece is not sentence:
+                tokens = count_tokens(piece)
+            yield _Unit(piece, tokens, page_no, False, first)
+            first = False
+
+
+def _unwrap(body: List[str]) -> str:
+    """
+    Join the wrapped lines of a paragraph, rejoining hyphenated words. A
+    hyphen ending the paragraph (or the page) has nothing to join and is kept.
+    """
+    return " ".join(body).replace("\x00 ", "").replace("\x00", "-")
+
+
+def _segment(pages: List[str], page_numbers: List[int], max_tokens: int) -> Iterator[_Unit]:
+    """
+    One pass over the text producing headings and sentences, tagged with
+    their page and whether they open a paragraph.
+    """
+    for page_text, page_no in zip(pages, page_numbers):
+        if not page_text:
+            continue
+        for para in _PARA_SPLIT_RE.split(page_text):
+            # Wrapped lines of one paragraph; "\x00" marks a hyphenated line break
+            body: List[str] = []
+            for raw_line in para.split("\n"):
+                line = raw_line.strip()
+                if not line:
+                    continue
+                if _is_heading(line):
+                    if body:
+                        yield from _sentences(_unwrap(body), page_no, max_tokens)
+                        body = []
+                    yield _Unit(line, count_tokens(line), page_no, True, True)
+                elif len(line) > 1 and line.endswith("-") and line[-2].isalpha():
+                    body.append(line[:-1] + "\x00")
+                else:
+                    body.append(line)
+            if body:
+                yield from _sentences(_unwrap(body), page_no, max_tokens)
+
+
+def _join(units: List[_Unit]) -> str:
+    parts: List[str] = []
+    for i, u in enumerate(units):
+        if i:
+            if units[i - 1].heading:
+                parts.append("\n")
+            elif u.new_paragraph:
+                parts.append("\n\n")
+            else:
+                parts.append(" ")
+        parts.append(u.text)
+    return "".join(parts)
+
+
+def chunk_pages(
+    pages: List[str],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    page_numbers: Optional[List[int]] = None,
+) -> List[Dict]:
+    """
+    Split page texts into token-sized chunks that break on sentence,
+    paragraph and heading boundaries and may span page breaks.
+    Returns [{"text", "page_start", "page_end", "tokens"}] in document order.
+    Linear in the input size; there is no chunk cap.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    if page_numbers is None:
+        page_numbers = list(range(1, len(pages) + 1))
+
+    chunks: List[Dict] = []
+    current: List[_Unit] = []
+    current_tokens = 0
+    # A heading may start a new chunk once the current one is reasonably full
+    min_tokens_before_heading = max_tokens // 4
+
+    def emit():
+        if not current:
+            return
+        # Don't emit a chunk that is nothing but overlap/headings
+        if all(u.heading for u in current):
+            return
+        chunks.append({
+            "text": _join(current),
+            "page_start": min(u.page for u in current),
+            "page_end": max(u.page for u in current),
+            "tokens": current_tokens,
+        })
+
+    def overlap_tail(next_tokens: int) -> List[_Unit]:
+        # Trailing sentences of the emitted chunk, leaving room for the next unit
+        budget = min(overlap_tokens, max_tokens - next_tokens)
+        tail: List[_Unit] = []
+        total = 0
+        for u in reversed(current):
+            if u.heading or total + u.tokens > budget:
+                break
+            tail.append(u)
+            total += u.tokens
+        tail.reverse()
+        return tail
+
+    for unit in _segment(pages, page_numbers, max_tokens):
+        starts_section = unit.heading and current_tokens >= min_tokens_before_heading
+        if current and (starts_section or current_tokens + unit.tokens > max_tokens):
+            emit()
+            current = [] if starts_section else overlap_tail(unit.tokens)
+            current_tokens = sum(u.tokens for u in current)
+        current.append(unit)
+        current_tokens += unit.tokens
+
+    emit()
+    return chunks
@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+from config.settings import settings
+from services import metrics
+from services.tracing import current_span
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Small English stopword list; enough to keep the lexical scorer from
+# rewarding "the"/"of" matches.
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the this to "
+    "was what when where which who why with do does did can you me tell about".split()
+)
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def chunk_id(doc: Dict) -> str:
+    """
+    Stable id for a chunk doc: Mongo _id if present, else blob path + index.
+    """
+    if doc.get("_id") is not None:
+        return str(doc["_id"])
+    return f"{doc.get('blob_path', doc.get('pdf_name', ''))}#{doc.get('chunk_index', '')}"
+
+
+class LexicalScorer:
+    """
+    Pure NumPy (query, chunk) scorer: saturated term-frequency coverage of the
+    query terms plus a bigram phrase bonus. Scores are in [0, 1] and depend
+    only on the pair, so they are safe to cache.
+    """
+
+    name = "lexical"
+    K1 = 1.2
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        q_terms = _tokens(query)
+        if not q_terms or not texts:
+            return np.zeros(len(texts), dtype=np.float32)
+
+        vocab = list(dict.fromkeys(q_terms))
+        q_bigrams = set(zip(q_terms, q_terms[1:]))
+
+        tf = np.zeros((len(texts), len(vocab)), dtype=np.float32)
+        bigram_hits = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            toks = _tokens(text)
+            counts = Counter(toks)
+            tf[row] = [counts.get(t, 0) for t in vocab]
+            if q_bigrams:
+                bigram_hits[row] = len(q_bigrams.intersection(zip(toks, toks[1:])))
+
+        # BM25-style saturation, normalized to [0, 1] per term
+        sat = tf * (self.K1 + 1) / (tf + self.K1)
+        unigram = sat.mean(axis=1) / (self.K1 + 1)
+        bigram = bigram_hits / len(q_bigrams) if q_bigrams else np.zeros_like(unigram)
+        return (0.8 * unigram + 0.2 * np.minimum(bigram, 1.0)).astype(np.float32)
+
+
+class OnnxCrossEncoder:
+    """
+    CPU cross-encoder exported to ONNX (e.g. ms-marco-MiniLM-L-6-v2).
+    Expects model.onnx and tokenizer.json in model_dir.
+    """
+
+    name = "onnx"
+    MAX_LENGTH = 512
+
+    def __init__(self, model_dir: str):
+        # Optional dependencies: only needed when this backend is selected
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = 1  # parallelism comes from our batch pool
+        self._session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"),
+            sess_options=opts,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=self.MAX_LENGTH)
+        self._tokenizer.enable_padding()
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+
+        encodings = self._tokenizer.encode_batch([(query, t) for t in texts])
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feeds = {k: v for k, v in feeds.items() if k in self._input_names}
+
+        logits = self._session.run(None, feeds)[0].reshape(len(texts), -1)[:, 0]
+        return (1.0 / (1.0 + np.exp(-logits))).astype(np.float32)
+
+
+class ScoreCache:
+    """
+    Thread-safe LRU of scores keyed by (query hash, chunk id).
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            val = self._data.get(key)
+            if val is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return val
+
+    def put(self, key: Tuple[str, str], value: float) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Global lazy scorer / pool / cache
+_scorer = None
+_pool: Optional[ThreadPoolExecutor] = None
+_init_lock = threading.Lock()
+score_cache = ScoreCache(settings.RERANK_CACHE_SIZE)
+metrics.REGISTRY.register_cache("rerank_scores", score_cache)
+
+
+def get_scorer():
+    global _scorer
+    if _scorer is not None:
+        return _scorer
+
+    with _init_lock:
+        if _scorer is not None:
+            return _scorer
+
+        backend = settings.RERANK_BACKEND
+        if backend == "onnx":
+            try:
+                _scorer = OnnxCrossEncoder(settings.RERANK_MODEL_PATH)
+                logging.info("Loaded ONNX cross-encoder from %s", settings.RERANK_MODEL_PATH)
+            except Exception:
+                logging.exception("ONNX cross-encoder unavailable, falling back to lexical scorer")
+        if _scorer is None:
+            _scorer = LexicalScorer()
+        return _scorer
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _init_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=settings.RERANK_WORKERS,
+                    thread_name_prefix="rerank",
+                )
+    return _pool
+
+
+def score_pairs(query: str, docs: List[Dict]) -> np.ndarray:
+    """
+    Score (query, chunk) pairs in batches on the thread pool, consulting the
+    cache first. Returns one score per doc.
+    """
+    scores = np.zeros(len(docs), dtype=np.float32)
+    if not docs:
+        return scores
+
+    q_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+    keys = [(q_hash, chunk_id(d)) for d in docs]
+
+    todo = []
+    for i, key in enumerate(keys):
+        cached = score_cache.get(key)
+        if cached is None:
+            todo.append(i)
+        else:
+            scores[i] = cached
+    current_span().set(cache_hits=len(docs) - len(todo), cache_misses=len(todo))
+
+    if todo:
+        scorer = get_scorer()
+        batch_size = max(1, settings.RERANK_BATCH_SIZE)
+        batches = [todo[i : i + batch_size] for i in range(0, len(todo), batch_size)]
+
+        def run(batch: List[int]) -> np.ndarray:
+            return scorer.score(query, [docs[i].get("text", "") for i in batch])
+
+        if len(batches) == 1:
+            results = [run(batches[0])]
+        else:
+            results = list(_get_pool().map(run, batches))
+
+        for batch, batch_scores in zip(batches, results):
+            for i, s in zip(batch, batch_scores):
+                scores[i] = s
+                score_cache.put(keys[i], float(s))
+
+    return scores
+
+
+def cross_encoder_rerank(question: str, docs: List[Dict], keep: int) -> List[Dict]:
+    """
+    Reorder docs by a blend of reranker score and retrieval cosine score.
+    The blended value is stored on each doc as 'rerank_score'.
+    """
+    if not docs:
+        return []
+
+    model_scores = score_pairs(question, docs)
+    blend = settings.RERANK_BLEND
+    for doc, s in zip(docs, model_scores):
+        doc["rerank_score"] = blend * float(s) + (1.0 - blend) * doc.get("score", 0.0)
+
+    ranked = sorted(docs, key=lambda d: d["rerank_score"], reverse=True)
+    return ranked[:keep]
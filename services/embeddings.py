@@ -1,12 +1,49 @@
 import time
 import logging
-from typing import List
-from openai import AzureOpenAI, RateLimitError
+from typing import List, Optional, Tuple
 from config.settings import settings
+from services.tracing import span
 
 BATCH_SIZE = 25          # safe for S0 tier
 SLEEP_SECONDS = 1.5      # throttle
 
+# Global lazy client (the openai package is imported on first use: it is the
+# slowest import of the app and not every function needs it)
+_client = None
+
+
+def get_embedding_client():
+    global _client
+    if _client is None:
+        from openai import AzureOpenAI
+        _client = AzureOpenAI(
+            api_key=settings.AZURE_OPENAI_API_KEY,
+            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+            api_version=settings.AZURE_OPENAI_API_VERSION,
+        )
+    return _client
+
+
+def embed_batch(
+    texts: List[str],
+    deployment: Optional[str] = None,
+    dimensions: Optional[int] = None,
+) -> Tuple[List[List[float]], int]:
+    """
+    One embeddings request (no throttling; the client's retries only).
+    deployment / dimensions default to the serving settings.
+    Returns (embeddings, total tokens).
+    """
+    dimensions = settings.EMBEDDING_DIMENSIONS if dimensions is None else dimensions
+    extra = {"dimensions": dimensions} if dimensions else {}
+    response = get_embedding_client().embeddings.create(
+        model=deployment or settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+        input=texts,
+        **extra,
+    )
+    tokens = response.usage.total_tokens if response.usage else 0
+    return [r.embedding for r in response.data], tokens
+
 
 def generate_embeddings(texts: List[str]) -> List[List[float]]:
     if not texts:
@@ -20,35 +57,34 @@ def generate_embeddings(texts: List[str]) -> List[List[float]]:
         logging.error("Azure OpenAI embedding config missing")
         return []
 
-    client = AzureOpenAI(
-        api_key=settings.AZURE_OPENAI_API_KEY,
-        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-        api_version=settings.AZURE_OPENAI_API_VERSION,
-    )
+    from openai import RateLimitError
 
     all_embeddings: List[List[float]] = []
 
-    for i in range(0, len(texts), BATCH_SIZE):
-        batch = texts[i : i + BATCH_SIZE]
+    with span("embeddings", inputs=len(texts)) as s:
+        for i in range(0, len(texts), BATCH_SIZE):
+            batch = texts[i : i + BATCH_SIZE]
 
-        try:
-            response = client.embeddings.create(
-                model=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
-                input=batch,
-            )
-            all_embeddings.extend([r.embedding for r in response.data])
+            try:
+                embeddings, tokens = embed_batch(batch)
+                all_embeddings.extend(embeddings)
+                s.add("batches")
+                if tokens:
+                    s.add("tokens", tokens)
 
-            time.sleep(SLEEP_SECONDS)
+                time.sleep(SLEEP_SECONDS)
 
-        except RateLimitError as e:
-            logging.warning("Rate limit hit, sleeping and retrying")
-            time.sleep(60)
-            # FIX: Combine previous results with the result of the retry to preserve total count
-            return all_embeddings + generate_embeddings(texts[i:])
+            except RateLimitError as e:
+                logging.warning("Rate limit hit, sleeping and retrying")
+                s.add("rate_limited")
+                time.sleep(60)
+                # FIX: Combine previous results with the result of the retry to preserve total count
+                return all_embeddings + generate_embeddings(texts[i:])
 
-        except Exception:
-            logging.exception("Embedding generation failed")
-            return []
+            except Exception:
+                logging.exception("Embedding generation failed")
+                s.set(error="embedding_failed")
+                return []
 
     return all_embeddings
 
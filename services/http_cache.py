@@ -0,0 +1,66 @@
+import hashlib
+import json
+import azure.functions as func
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(req: func.HttpRequest, etag: str) -> bool:
+    header = req.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    # Weak comparison: W/"x" matches "x"
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def json_response(
+    req: func.HttpRequest,
+    payload: dict,
+    cache_control: str = "private, no-cache",
+) -> func.HttpResponse:
+    """
+    JSON response with a content-hash ETag; answers If-None-Match with 304
+    so clients can revalidate unchanged lists without re-downloading them.
+    """
+    body = json.dumps(payload, sort_keys=True).encode("utf-8")
+    etag = etag_for(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if etag_matches(req, etag):
+        return func.HttpResponse(status_code=304, headers=headers)
+
+    return func.HttpResponse(
+        body,
+        status_code=200,
+        mimetype="application/json",
+        headers=headers,
+    )
+
+
+def preferred_encoding(req: func.HttpRequest, available) -> str:
+    """
+    Best content coding from Accept-Encoding among `available`
+    (in server preference order), or "identity".
+    """
+    header = req.headers.get("Accept-Encoding") or ""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+
+    for coding in available:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > 0:
+            return coding
+    return "identity"
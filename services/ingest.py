@@ -0,0 +1,224 @@
+import logging
+import time
+from typing import List, Optional, Tuple
+from pypdf import PdfReader
+
+from config.settings import settings
+from services import ingest_jobs, near_dup, page_text
+from services.chunker import chunk_text, chunk_pages
+from services.embeddings import generate_embeddings
+from services.mongo_store import mongo_store
+from services.pdf_processor import open_pdf, extract_pages
+from services.profiler import profile_if_slow
+from services.tracing import span, trace
+from services.work_queue import delay_until, enqueue, register_handler
+
+# chunk_index = range_start * RANGE_INDEX_STRIDE + position in the range:
+# unique and in document order per PDF although ranges are stored in parallel
+RANGE_INDEX_STRIDE = 100000
+
+
+def chunk_page_range(page_texts: List[str], first_page: int) -> List[Tuple[str, int, int]]:
+    """
+    Chunk the texts of consecutive pages starting at first_page (1-based).
+    Returns [(text, page_start, page_end)].
+    """
+    page_numbers = list(range(first_page, first_page + len(page_texts)))
+
+    if settings.CHUNK_STRATEGY == "legacy":
+        out = []
+        for page_no, page_text in zip(page_numbers, page_texts):
+            if page_text.strip():
+                out.extend((c, page_no, page_no) for c in chunk_text(page_text))
+        return out
+
+    return [
+        (c["text"], c["page_start"], c["page_end"])
+        for c in chunk_pages(
+            page_texts,
+            max_tokens=settings.CHUNK_MAX_TOKENS,
+            overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+            page_numbers=page_numbers,
+        )
+    ]
+
+
+def chunk_documents(
+    blob_path: str,
+    category: str,
+    pdf_name: str,
+    metadata: dict,
+    uploaded_at,
+    range_start: int,
+    first_index: int,
+    chunks: List[Tuple[str, int, int]],
+    embeddings: List[Optional[List[float]]],
+) -> List[dict]:
+    """
+    Chunk documents as stored in the chunk collection (ingest and re-chunk).
+    Embeddings of near-duplicate chunks are None until DedupPlan.apply links them.
+    """
+    return [
+        {
+            "category": category,
+            "pdf_name": pdf_name,
+            "blob_path": blob_path,
+            "chunk_index": range_start * RANGE_INDEX_STRIDE + first_index + i,
+            "range_start": range_start,
+            "text": txt,
+            settings.EMBEDDING_FIELD: emb,
+            "year": metadata.get("year", 2025),
+            "date": metadata.get("date", ""),
+            "page_number": p_start,
+            "page_end": p_end,
+            "uploaded_at": uploaded_at,
+        }
+        for i, ((txt, p_start, p_end), emb) in enumerate(zip(chunks, embeddings))
+    ]
+
+
+def run_range(blob_path: str, run_id: str, start: int, reader: PdfReader, deadline: float) -> bool:
+    """
+    Advance one page-range work item batch by batch (INGEST_PAGE_BATCH pages),
+    checkpointing the range's page cursor after each insert. Stops when the
+    range is complete or the time.monotonic() deadline passes.
+    Returns True when there is nothing left for this worker to do, False when
+    the caller should schedule a continuation of the range.
+    """
+    job = ingest_jobs.get_job(blob_path)
+    if not job or job.get("run_id") != run_id or job.get("status") != ingest_jobs.RUNNING:
+        logging.info("Ingest job %s no longer active, skipping range %d", blob_path, start)
+        return True
+
+    work = ingest_jobs.claim_range(blob_path, run_id, start, settings.WORK_LEASE_SECONDS)
+    if work is None:
+        retry = ingest_jobs.retry_at(blob_path, run_id, start)
+        if retry is None:
+            logging.info("Range %s@%d already done or superseded", blob_path, start)
+            return True
+        # Leased: the holder may have crashed, try again once its lease expires
+        delay = delay_until(retry)
+        logging.info("Range %s@%d leased, retrying in %ds", blob_path, start, delay)
+        enqueue_range(blob_path, run_id, start, delay)
+        return True
+
+    collection = mongo_store.collection
+    if collection is None:
+        # Let the Functions runtime retry the invocation later
+        ingest_jobs.release_range(blob_path, run_id, start)
+        raise RuntimeError("MongoDB collection not available")
+
+    category = job["category"]
+    filename = job["pdf_name"]
+    metadata = job.get("metadata") or {}
+    pdf_hash = job.get("pdf_hash")
+    range_end = work["end"]
+    cursor = work["page_cursor"]
+    chunk_count = work["chunks_done"]
+
+    # Drop partial output of a batch that crashed before its checkpoint
+    partial = {"blob_path": blob_path, "page_number": {"$gt": cursor, "$lte": range_end}}
+    near_dup.promote_links(collection, partial)
+    collection.delete_many(partial)
+
+    batch_pages = max(1, settings.INGEST_PAGE_BATCH)
+    while cursor < range_end:
+        end = min(cursor + batch_pages, range_end)
+        with span("extract_text", pages=end - cursor) as s:
+            # Same content ingested before: its page text is already stored
+            page_texts = page_text.load(pdf_hash, cursor, end)
+            s.set(stored=page_texts is not None)
+            if page_texts is None:
+                page_texts = extract_pages(reader, cursor, end)
+                page_text.save(pdf_hash, cursor, page_texts)
+            s.set(chars=sum(len(t) for t in page_texts))
+        with span("chunk") as s:
+            chunks = chunk_page_range(page_texts, cursor + 1)
+            s.set(chunks=len(chunks))
+
+        duplicates = 0
+        if chunks:
+            # Near-duplicates of stored chunks are linked, not embedded
+            texts = [c[0] for c in chunks]
+            dedup = near_dup.plan(collection, category, texts)
+            unique = dedup.unique(texts)
+            embeddings = generate_embeddings(unique)
+            if len(embeddings) != len(unique):
+                logging.error(
+                    "Embedding mismatch: chunks=%d embeddings=%d",
+                    len(unique),
+                    len(embeddings)
+                )
+                ingest_jobs.fail(blob_path, run_id, "embedding mismatch")
+                return True
+
+            documents = dedup.apply(chunk_documents(
+                blob_path, category, filename, metadata, job["uploaded_at"],
+                start, chunk_count, chunks, dedup.spread(embeddings),
+            ))
+            for doc in documents:
+                # Chunks of a superseded run are swept when the job completes
+                doc["run_id"] = run_id
+            duplicates = dedup.duplicates
+            with span("insert_many", docs=len(documents)):
+                inserted = collection.insert_many(documents).inserted_ids
+        else:
+            inserted = []
+
+        if not ingest_jobs.checkpoint_range(
+            blob_path, run_id, start, cursor, end, chunk_count + len(chunks), duplicates
+        ):
+            # Superseded (e.g. re-uploaded) or lost the lease: the batch is stale
+            stale = {"_id": {"$in": inserted}}
+            near_dup.promote_links(collection, stale)
+            collection.delete_many(stale)
+            logging.warning("Range %s@%d superseded at page %d, stopping", blob_path, start, cursor)
+            return True
+
+        logging.info(
+            "Ingested %s pages %d-%d (%d chunks, %d near-duplicates)",
+            blob_path, cursor + 1, end, len(chunks), duplicates
+        )
+        cursor = end
+        chunk_count += len(chunks)
+
+        if cursor < range_end and time.monotonic() >= deadline:
+            logging.info("Time budget reached for %s at page %d/%d", blob_path, cursor, range_end)
+            ingest_jobs.release_range(blob_path, run_id, start)
+            return False
+
+    ingest_jobs.complete_range(blob_path, run_id, start, chunk_count)
+    return True
+
+
+def enqueue_range(blob_path: str, run_id: str, start: int, delay_seconds: Optional[int] = None) -> None:
+    enqueue(settings.INGEST_QUEUE_NAME, {"blob_path": blob_path, "run_id": run_id, "start": start}, delay_seconds)
+
+
+def process_range_message(payload: dict, reader: Optional[PdfReader] = None) -> None:
+    """
+    Queue worker entry point: ingest (or continue) one page-range work item.
+    """
+    deadline = time.monotonic() + settings.INGEST_TIME_BUDGET_SECONDS
+    blob_path = payload["blob_path"]
+    run_id = payload["run_id"]
+    start = payload.get("start")
+    if start is None:
+        logging.info("Dropping legacy ingest message for %s", blob_path)
+        return
+
+    with trace("ingest_range", blob=blob_path, start=start) as tr, profile_if_slow("ingest_range", tr):
+        if reader is None:
+            from services.blob_store import download_pdf_bytes
+            with span("download") as s:
+                pdf_bytes = download_pdf_bytes(blob_path)
+                s.set(bytes=len(pdf_bytes))
+            with span("open_pdf"):
+                reader = open_pdf(pdf_bytes)
+
+        if not run_range(blob_path, run_id, start, reader, deadline):
+            enqueue_range(blob_path, run_id, start)
+
+
+# In-memory queue backend dispatches range messages here
+register_handler(settings.INGEST_QUEUE_NAME, process_range_message)
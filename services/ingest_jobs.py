@@ -0,0 +1,278 @@
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from config.settings import settings
+from services import catalog
+from services.mongo_store import mongo_store
+
+# Job / range statuses
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+
+def _jobs():
+    return mongo_store.get_collection(settings.INGEST_JOBS_COLLECTION)
+
+
+def _ranges():
+    return mongo_store.get_collection(settings.INGEST_JOBS_COLLECTION + "_ranges")
+
+
+def range_id(blob_path: str, start: int) -> str:
+    return f"{blob_path}@{start}"
+
+
+def split_ranges(total_pages: int, range_pages: int) -> List[Tuple[int, int]]:
+    """
+    Page ranges [start, end) (0-based) of at most range_pages pages.
+    """
+    range_pages = max(1, range_pages)
+    return [(s, min(s + range_pages, total_pages)) for s in range(0, total_pages, range_pages)]
+
+
+def start_job(
+    blob_path: str,
+    category: str,
+    pdf_name: str,
+    total_pages: int,
+    metadata: dict,
+    uploaded_at: datetime,
+    ranges: List[Tuple[int, int]],
+    pdf_hash: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Create (or restart) the ingest job for a blob and its page-range work items.
+    pdf_hash (sha256 of the PDF) keys the stored page text.
+    Returns the new run_id. A restart supersedes any in-flight run: its
+    checkpoints will no longer match.
+    """
+    jobs = _jobs()
+    range_col = _ranges()
+    if jobs is None or range_col is None:
+        return None
+
+    run_id = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    jobs.replace_one(
+        {"_id": blob_path},
+        {
+            "_id": blob_path,
+            "run_id": run_id,
+            "category": category,
+            "pdf_name": pdf_name,
+            "status": RUNNING,
+            "total_pages": total_pages,
+            "ranges_total": len(ranges),
+            "ranges_done": 0,
+            "chunks_done": 0,
+            "metadata": metadata,
+            "pdf_hash": pdf_hash,
+            "uploaded_at": uploaded_at,
+            "started_at": now,
+            "updated_at": now,
+            "error": None,
+        },
+        upsert=True,
+    )
+
+    range_col.delete_many({"blob_path": blob_path})
+    if ranges:
+        range_col.insert_many([
+            {
+                "_id": range_id(blob_path, start),
+                "blob_path": blob_path,
+                "run_id": run_id,
+                "start": start,
+                "end": end,
+                "page_cursor": start,
+                "chunks_done": 0,
+                "status": RUNNING,
+                "invocations": 0,
+                "lease_until": None,
+                "updated_at": now,
+            }
+            for start, end in ranges
+        ])
+    return run_id
+
+
+def get_job(blob_path: str) -> Optional[dict]:
+    jobs = _jobs()
+    if jobs is None:
+        return None
+    return jobs.find_one({"_id": blob_path})
+
+
+def claim_range(blob_path: str, run_id: str, start: int, lease_seconds: int) -> Optional[dict]:
+    """
+    Take the lease on a running range so only one worker advances it.
+    Returns the range doc, or None if it is done, superseded or leased elsewhere.
+    """
+    from pymongo import ReturnDocument
+
+    range_col = _ranges()
+    if range_col is None:
+        return None
+
+    now = datetime.now(timezone.utc)
+    return range_col.find_one_and_update(
+        {
+            "_id": range_id(blob_path, start),
+            "run_id": run_id,
+            "status": RUNNING,
+            "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+        },
+        {
+            "$set": {"lease_until": now + timedelta(seconds=lease_seconds), "updated_at": now},
+            "$inc": {"invocations": 1},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def retry_at(blob_path: str, run_id: str, start: int) -> Optional[datetime]:
+    """
+    For a range claim_range refused: when it can be claimed again (its
+    lease expiry), or None if it is done or superseded and the message can go.
+    """
+    range_col = _ranges()
+    if range_col is None:
+        return None
+    work = range_col.find_one(
+        {"_id": range_id(blob_path, start), "run_id": run_id, "status": RUNNING},
+        {"lease_until": 1},
+    )
+    if work is None:
+        return None
+    return work.get("lease_until") or datetime.now(timezone.utc)
+
+
+def checkpoint_range(
+    blob_path: str, run_id: str, start: int, expected_cursor: int, page_cursor: int, chunks_done: int,
+    near_dups: int = 0,
+) -> bool:
+    """
+    Advance a range's page cursor atomically (near_dups: chunks of the batch
+    linked to a near-duplicate). False means the worker lost its lease or
+    the run was superseded and must stop.
+    """
+    range_col = _ranges()
+    if range_col is None:
+        return False
+
+    result = range_col.update_one(
+        {
+            "_id": range_id(blob_path, start),
+            "run_id": run_id,
+            "page_cursor": expected_cursor,
+            "status": RUNNING,
+        },
+        {
+            "$set": {
+                "page_cursor": page_cursor,
+                "chunks_done": chunks_done,
+                "updated_at": datetime.now(timezone.utc),
+            },
+            "$inc": {"near_dups": near_dups},
+        },
+    )
+    return result.modified_count == 1
+
+
+def release_range(blob_path: str, run_id: str, start: int) -> None:
+    range_col = _ranges()
+    if range_col is None:
+        return
+    range_col.update_one(
+        {"_id": range_id(blob_path, start), "run_id": run_id},
+        {"$set": {"lease_until": None}},
+    )
+
+
+def complete_range(blob_path: str, run_id: str, start: int, chunks: int) -> bool:
+    """
+    Mark a range done and fold it into the job (completion aggregator).
+    Returns True for the one caller whose range completed the whole document.
+    """
+    from pymongo import ReturnDocument
+
+    range_col = _ranges()
+    jobs = _jobs()
+    if range_col is None or jobs is None:
+        return False
+
+    now = datetime.now(timezone.utc)
+    marked = range_col.find_one_and_update(
+        {"_id": range_id(blob_path, start), "run_id": run_id, "status": RUNNING},
+        {"$set": {"status": READY, "lease_until": None, "updated_at": now}},
+        projection={"near_dups": 1},
+    )
+    if marked is None:
+        # Already counted (duplicate delivery) or superseded
+        return False
+
+    job = jobs.find_one_and_update(
+        {"_id": blob_path, "run_id": run_id},
+        {
+            "$inc": {"ranges_done": 1, "chunks_done": chunks, "near_dups": marked.get("near_dups", 0)},
+            "$set": {"updated_at": now},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    if not job or job["ranges_done"] < job["ranges_total"]:
+        return False
+
+    ready = jobs.update_one(
+        {"_id": blob_path, "run_id": run_id, "status": RUNNING},
+        {"$set": {"status": READY, "completed_at": now, "updated_at": now}},
+    )
+    if ready.modified_count == 1:
+        _sweep_superseded(blob_path, run_id)
+        catalog.mark_status(
+            blob_path, catalog.READY,
+            chunk_count=job["chunks_done"], near_duplicates=job.get("near_dups", 0),
+        )
+        catalog.set_latest_pdf(blob_path, job["category"], job["pdf_name"], job["uploaded_at"])
+        logging.info(
+            "Ingest job %s ready: %d chunks (%d near-duplicates linked) from %d pages",
+            blob_path, job["chunks_done"], job.get("near_dups", 0), job["total_pages"]
+        )
+        return True
+    return False
+
+
+def _sweep_superseded(blob_path: str, run_id: str) -> None:
+    """
+    Delete chunks an earlier run of the PDF inserted after it was superseded
+    (it crashed before its checkpoint could reject the batch).
+    """
+    from services import near_dup
+
+    collection = mongo_store.collection
+    if collection is None:
+        return
+    stale = {"blob_path": blob_path, "run_id": {"$exists": True, "$ne": run_id}}
+    near_dup.promote_links(collection, stale)
+    deleted = collection.delete_many(stale).deleted_count
+    if deleted:
+        logging.warning("Ingest job %s: removed %d chunks of superseded runs", blob_path, deleted)
+
+
+def fail(blob_path: str, run_id: str, error: str) -> None:
+    jobs = _jobs()
+    range_col = _ranges()
+    if jobs is None or range_col is None:
+        return
+    now = datetime.now(timezone.utc)
+    jobs.update_one(
+        {"_id": blob_path, "run_id": run_id},
+        {"$set": {"status": FAILED, "error": error, "updated_at": now}},
+    )
+    range_col.update_many(
+        {"blob_path": blob_path, "run_id": run_id, "status": RUNNING},
+        {"$set": {"status": FAILED, "lease_until": None, "updated_at": now}},
+    )
+    catalog.mark_status(blob_path, catalog.FAILED)
+    logging.error("Ingest job %s failed: %s", blob_path, error)
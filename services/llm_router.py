@@ -0,0 +1,459 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Deque, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services import metrics
+from services.tracing import current_span
+
+# Providers with this many consecutive failures are skipped for LLM_COOLDOWN_SECONDS
+FAILURE_STREAK = 3
+# Recent calls needed before LLM_MAX_ERROR_RATE can mark a provider unhealthy
+ERROR_RATE_MIN_SAMPLES = 10
+# Samples needed before a provider's own p95 replaces LLM_HEDGE_DELAY_MS
+HEDGE_MIN_SAMPLES = 10
+# Share of calls sent to a slower healthy provider so its latency stays measured
+EXPLORE_RATIO = 0.05
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+
+
+class Cancelled(Exception):
+    """
+    Raised inside a hedged attempt that lost the race.
+    """
+
+
+class HedgeFailed(Exception):
+    """
+    Every request of a hedged completion failed; failed lists the providers
+    that returned an error (the caller falls back to the others).
+    """
+
+    def __init__(self, error: Exception, failed: List["Provider"]):
+        super().__init__(str(error))
+        self.error = error
+        self.failed = failed
+
+
+class Provider:
+    """
+    One OpenAI-compatible chat endpoint. Clients are created on first use.
+    """
+
+    def __init__(self, name: str, model: str, base_url: Optional[str] = None, api_key: Optional[str] = None, azure: bool = False):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.azure = azure
+        self.stats = ProviderStats()
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def stream_usage(self) -> bool:
+        # Azure accepts stream_options from api-version 2024-06-01
+        return not self.azure or settings.AZURE_OPENAI_API_VERSION >= "2024-06-01"
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if self.azure:
+                        from openai import AzureOpenAI
+                        self._client = AzureOpenAI(
+                            api_key=self.api_key,
+                            azure_endpoint=self.base_url,
+                            api_version=settings.AZURE_OPENAI_API_VERSION,
+                            timeout=settings.LLM_TIMEOUT_SECONDS,
+                            max_retries=settings.LLM_MAX_RETRIES,
+                        )
+                    else:
+                        from openai import OpenAI
+                        self._client = OpenAI(
+                            api_key=self.api_key,
+                            base_url=self.base_url,
+                            timeout=settings.LLM_TIMEOUT_SECONDS,
+                            max_retries=settings.LLM_MAX_RETRIES,
+                        )
+        return self._client
+
+
+class ProviderStats:
+    """
+    Rolling outcomes of a provider over the last LLM_STATS_WINDOW calls
+    (and at most LLM_STATS_WINDOW_SECONDS old): latency, time to first
+    token of streamed calls, errors, plus a failure streak for cooldown.
+    An unhealthy provider gets a half-open probe (one real request) every
+    LLM_COOLDOWN_SECONDS after its last failure; a successful probe forgets
+    the failures that demoted it.
+    """
+
+    def __init__(self):
+        # (finished_at, ok, latency_s, first_token_s)
+        self._samples: Deque[Tuple[float, bool, float, Optional[float]]] = deque(maxlen=max(1, settings.LLM_STATS_WINDOW))
+        self._lock = threading.Lock()
+        self.streak = 0
+        self.cooldown_until = 0.0
+        self.probe_at = 0.0
+        self.probing = False
+        self.requests = 0
+        self.failures = 0
+        self.successes = 0
+
+    def record(self, ok: bool, latency: float, first_token: Optional[float] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self.probing and ok:
+                self._samples = deque((s for s in self._samples if s[1]), maxlen=self._samples.maxlen)
+            self.probing = False
+            self._samples.append((now, ok, latency, first_token))
+            self.requests += 1
+            if ok:
+                self.streak = 0
+                self.successes += 1
+            else:
+                self.failures += 1
+                self.streak += 1
+                self.probe_at = now + settings.LLM_COOLDOWN_SECONDS
+                if self.streak >= FAILURE_STREAK:
+                    self.cooldown_until = now + settings.LLM_COOLDOWN_SECONDS
+
+    def _recent(self) -> List[Tuple[float, bool, float, Optional[float]]]:
+        horizon = time.monotonic() - settings.LLM_STATS_WINDOW_SECONDS
+        with self._lock:
+            return [s for s in self._samples if s[0] >= horizon]
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        return sum(1 for s in recent if not s[1]) / len(recent) if recent else 0.0
+
+    def latency(self, q: float, first_token: bool = False) -> Optional[float]:
+        """
+        q-quantile (0..1) of successful latencies (or times to first token)
+        in seconds; None without samples.
+        """
+        field = 3 if first_token else 2
+        values = sorted(s[field] for s in self._recent() if s[1] and s[field] is not None)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def sample_count(self, first_token: bool = False) -> int:
+        field = 3 if first_token else 2
+        return sum(1 for s in self._recent() if s[1] and s[field] is not None)
+
+    @property
+    def healthy(self) -> bool:
+        if time.monotonic() < self.cooldown_until:
+            return False
+        recent = self._recent()
+        if len(recent) < ERROR_RATE_MIN_SAMPLES:
+            return True
+        return sum(1 for s in recent if not s[1]) / len(recent) <= settings.LLM_MAX_ERROR_RATE
+
+    def try_probe(self) -> bool:
+        """
+        Claim the half-open probe of an unhealthy provider: True at most
+        once per LLM_COOLDOWN_SECONDS, starting one cooldown after its last failure.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < max(self.cooldown_until, self.probe_at):
+                return False
+            self.probe_at = now + settings.LLM_COOLDOWN_SECONDS
+            self.probing = True
+            return True
+
+
+def _configured_providers() -> List[Provider]:
+    """
+    Providers of LLM_PROVIDERS (default: LLM_PROVIDER) that have credentials.
+    "azure" and "groq" use their existing settings; any other name reads
+    LLM_<NAME>_BASE_URL / LLM_<NAME>_API_KEY / LLM_<NAME>_MODEL.
+    """
+    providers = []
+    for name in settings.LLM_PROVIDERS:
+        env = f"LLM_{name.upper().replace('-', '_')}_"
+        if name == "azure":
+            if not (settings.AZURE_OPENAI_API_KEY and settings.AZURE_OPENAI_ENDPOINT and settings.AZURE_OPENAI_CHAT_DEPLOYMENT):
+                logging.warning("LLM provider 'azure' skipped: Azure OpenAI chat settings missing")
+                continue
+            providers.append(Provider(
+                name, settings.AZURE_OPENAI_CHAT_DEPLOYMENT,
+                base_url=settings.AZURE_OPENAI_ENDPOINT, api_key=settings.AZURE_OPENAI_API_KEY, azure=True,
+            ))
+        elif name == "groq":
+            if not settings.GROQ_API_KEY:
+                logging.warning("LLM provider 'groq' skipped: GROQ_API_KEY missing")
+                continue
+            providers.append(Provider(
+                name, settings.GROQ_MODEL,
+                base_url=os.getenv(env + "BASE_URL", GROQ_BASE_URL), api_key=settings.GROQ_API_KEY,
+            ))
+        else:
+            base_url = os.getenv(env + "BASE_URL")
+            model = os.getenv(env + "MODEL")
+            if not (base_url and model):
+                logging.warning("LLM provider '%s' skipped: %sBASE_URL / %sMODEL missing", name, env, env)
+                continue
+            # Local OpenAI-compatible servers usually accept any key
+            providers.append(Provider(name, model, base_url=base_url, api_key=os.getenv(env + "API_KEY", "none")))
+    return providers
+
+
+class Router:
+    """
+    Sends chat completions to the fastest healthy provider, falling back to
+    the others in turn on errors. With hedging, a second provider is asked
+    in parallel once the first has not started answering within its p95
+    time to first token; the first to stream wins and the other request is
+    closed.
+    """
+
+    def __init__(self, providers: List[Provider]):
+        self.providers = providers
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def ranked(self) -> List[Provider]:
+        """
+        Healthy providers by median latency (unmeasured ones first, in
+        configuration order, so they get measured), then the unhealthy ones
+        as a last resort. Now and then a slower healthy provider goes first
+        so that stale latencies get refreshed, and an unhealthy one whose
+        probe is due goes first to find out whether it recovered.
+        """
+        def key(p: Provider):
+            p50 = p.stats.latency(0.5)
+            return (p50 is not None, p50 or 0.0)
+
+        healthy = sorted((p for p in self.providers if p.stats.healthy), key=key)
+        if len(healthy) > 1 and random.random() < EXPLORE_RATIO:
+            healthy.insert(0, healthy.pop(random.randrange(1, len(healthy))))
+        unhealthy = [p for p in self.providers if p not in healthy]
+        probe = next((p for p in unhealthy if p.stats.try_probe()), None)
+        if probe is not None:
+            unhealthy.remove(probe)
+            return [probe] + healthy + unhealthy
+        return healthy + unhealthy
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+        return self._pool
+
+    def hedge_delay(self, provider: Provider) -> float:
+        if provider.stats.sample_count(first_token=True) >= HEDGE_MIN_SAMPLES:
+            return max(provider.stats.latency(0.95, first_token=True), settings.LLM_HEDGE_MIN_MS / 1000)
+        return settings.LLM_HEDGE_DELAY_MS / 1000
+
+    def complete(self, messages: List[Dict[str, str]], **params) -> Tuple[str, Provider, Optional[object]]:
+        """
+        Returns (content, provider that answered, usage). Raises the last
+        error when every provider failed.
+        """
+        if not self.providers:
+            raise RuntimeError("No LLM provider configured")
+
+        order = self.ranked()
+        last_error: Optional[BaseException] = None
+        if settings.LLM_HEDGE_ENABLED and len(order) >= 2:
+            try:
+                return self._hedged(order[0], order[1], messages, params)
+            except HedgeFailed as e:
+                last_error = e.error
+                order = [p for p in order if p not in e.failed]
+
+        for provider in order:
+            try:
+                return self._call(provider, messages, params)
+            except Exception as e:
+                logging.warning("LLM provider '%s' failed: %s", provider.name, e)
+                last_error = e
+        raise last_error
+
+    def _call(self, provider: Provider, messages, params) -> Tuple[str, Provider, Optional[object]]:
+        start = time.perf_counter()
+        try:
+            completion = provider.client.chat.completions.create(model=provider.model, messages=messages, **params)
+        except Exception as e:
+            provider.stats.record(False, time.perf_counter() - start)
+            _note_error(e)
+            raise
+        provider.stats.record(True, time.perf_counter() - start)
+        return completion.choices[0].message.content, provider, completion.usage
+
+    def _hedged(self, primary: Provider, secondary: Provider, messages, params) -> Tuple[str, Provider, Optional[object]]:
+        race = _Race()
+        pool = self._get_pool()
+        futures = {pool.submit(self._stream, primary, race, messages, params): primary}
+
+        done, _ = wait(futures, timeout=self.hedge_delay(primary))
+        if not race.started.is_set() and not (done and not next(iter(done)).exception()):
+            with self._lock:
+                self.hedges += 1
+            current_span().set(hedged=True)
+            futures[pool.submit(self._stream, secondary, race, messages, params)] = secondary
+
+        errors: List[Tuple[Provider, Exception]] = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                error = f.exception()
+                if error is None:
+                    content, provider, usage = f.result()
+                    if provider is secondary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return content, provider, usage
+                if not isinstance(error, Cancelled):
+                    errors.append((futures[f], error))
+        if not errors:
+            raise HedgeFailed(RuntimeError("hedged completion cancelled"), [])
+        raise HedgeFailed(errors[-1][1], [p for p, _ in errors])
+
+    def _stream(self, provider: Provider, race: "_Race", messages, params) -> Tuple[str, Provider, Optional[object]]:
+        start = time.perf_counter()
+        first_token = None
+        parts: List[str] = []
+        usage = None
+        extra = {"stream_options": {"include_usage": True}} if provider.stream_usage else {}
+        try:
+            stream = provider.client.chat.completions.create(
+                model=provider.model, messages=messages, stream=True, **extra, **params
+            )
+            if not race.attach(provider, stream):
+                raise Cancelled()
+            with stream:
+                for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                        if not race.claim(provider):
+                            raise Cancelled()
+                    parts.append(delta)
+        except Exception as e:
+            if race.lost(provider):
+                # Closed by the winner: neither a failure nor a latency sample
+                raise Cancelled() from e
+            provider.stats.record(False, time.perf_counter() - start)
+            _note_error(e)
+            raise
+        provider.stats.record(True, time.perf_counter() - start, first_token)
+        return "".join(parts), provider, usage
+
+
+class _Race:
+    """
+    Shared state of one hedged completion: the first provider to stream a
+    token wins and the other provider's open stream is closed.
+    """
+
+    def __init__(self):
+        self.winner: Optional[Provider] = None
+        self.started = threading.Event()
+        self._streams: Dict[Provider, object] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, provider: Provider, stream) -> bool:
+        with self._lock:
+            if self.winner is not None and self.winner is not provider:
+                stream.close()
+                return False
+            self._streams[provider] = stream
+            return True
+
+    def claim(self, provider: Provider) -> bool:
+        with self._lock:
+            if self.winner is None:
+                self.winner = provider
+                losers = [s for p, s in self._streams.items() if p is not provider]
+            elif self.winner is not provider:
+                return False
+            else:
+                return True
+        self.started.set()
+        for stream in losers:
+            try:
+                stream.close()
+            except Exception:
+                pass
+        return True
+
+    def lost(self, provider: Provider) -> bool:
+        with self._lock:
+            return self.winner is not None and self.winner is not provider
+
+
+def _note_error(error: Exception) -> None:
+    from openai import RateLimitError
+    if isinstance(error, RateLimitError):
+        current_span().add("rate_limited")
+
+
+_router: Optional[Router] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> Router:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = Router(_configured_providers())
+    return _router
+
+
+def _metrics_lines() -> List[str]:
+    if _router is None:
+        return []
+    lines = [
+        "# HELP pdfrag_llm_provider_latency_seconds Rolling median / p95 completion latency per provider",
+        "# TYPE pdfrag_llm_provider_latency_seconds gauge",
+    ]
+    for p in _router.providers:
+        for q in (0.5, 0.95):
+            value = p.stats.latency(q)
+            if value is not None:
+                lines.append(f'pdfrag_llm_provider_latency_seconds{{provider="{p.name}",quantile="{q}"}} {value:.4f}')
+    lines += [
+        "# HELP pdfrag_llm_provider_error_ratio Rolling error ratio per provider",
+        "# TYPE pdfrag_llm_provider_error_ratio gauge",
+    ]
+    lines += [f'pdfrag_llm_provider_error_ratio{{provider="{p.name}"}} {p.stats.error_rate():.4f}' for p in _router.providers]
+    lines += [
+        "# HELP pdfrag_llm_provider_requests_total Completion attempts per provider and outcome",
+        "# TYPE pdfrag_llm_provider_requests_total counter",
+    ]
+    for p in _router.providers:
+        lines.append(f'pdfrag_llm_provider_requests_total{{provider="{p.name}",outcome="ok"}} {p.stats.successes}')
+        lines.append(f'pdfrag_llm_provider_requests_total{{provider="{p.name}",outcome="error"}} {p.stats.failures}')
+    lines += [
+        "# HELP pdfrag_llm_hedges_total Hedged second requests fired / won by the hedge",
+        "# TYPE pdfrag_llm_hedges_total counter",
+        f'pdfrag_llm_hedges_total{{result="fired"}} {_router.hedges}',
+        f'pdfrag_llm_hedges_total{{result="won"}} {_router.hedge_wins}',
+    ]
+    return lines
+
+
+metrics.REGISTRY.register_collector(_metrics_lines)
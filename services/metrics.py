@@ -0,0 +1,255 @@
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds) and size buckets (docs / items)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+COUNT_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+_PROCESS_START = time.time()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class _MirroredCounter(Gauge):
+    """
+    Counter whose value is copied at scrape time from an object's own tally.
+    """
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        lines = self.header()
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = 'le="' + _fmt(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._caches: Dict[str, object] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name: str, cache) -> None:
+        """
+        Expose a cache with hits/misses counters and len() (TTLCache, ScoreCache).
+        """
+        self._caches[name] = cache
+
+    def register_collector(self, fn: Callable[[], List[str]]) -> None:
+        """
+        Extra exposition lines computed at scrape time.
+        """
+        self._collectors.append(fn)
+
+    def _cache_lines(self) -> List[str]:
+        hits = _MirroredCounter("pdfrag_cache_hits_total", "Cache hits since process start", ["cache"])
+        misses = _MirroredCounter("pdfrag_cache_misses_total", "Cache misses since process start", ["cache"])
+        ratio = Gauge("pdfrag_cache_hit_ratio", "Cache hits / lookups since process start", ["cache"])
+        entries = Gauge("pdfrag_cache_entries", "Entries currently cached", ["cache"])
+        for name, cache in self._caches.items():
+            h, m = cache.hits, cache.misses
+            hits.set(h, name)
+            misses.set(m, name)
+            ratio.set(h / (h + m) if h + m else 0.0, name)
+            entries.set(len(cache), name)
+        return hits.render() + misses.render() + ratio.render() + entries.render()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.extend(self._cache_lines())
+        for fn in self._collectors:
+            lines.extend(fn())
+        lines.extend(_process_lines())
+        return "\n".join(lines) + "\n"
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return None
+
+
+def _process_lines() -> List[str]:
+    lines = [
+        "# HELP process_start_time_seconds Start time of the process since unix epoch",
+        "# TYPE process_start_time_seconds gauge",
+        f"process_start_time_seconds {_fmt(round(_PROCESS_START, 3))}",
+    ]
+    rss = _rss_bytes()
+    if rss is not None:
+        lines += [
+            "# HELP process_resident_memory_bytes Resident memory size in bytes",
+            "# TYPE process_resident_memory_bytes gauge",
+            f"process_resident_memory_bytes {rss}",
+        ]
+    return lines
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.add(Histogram(
+    "pdfrag_request_duration_seconds", "Invocation latency per endpoint/trigger", ["endpoint"]))
+REQUESTS = REGISTRY.add(Counter(
+    "pdfrag_requests_total", "Invocations per endpoint/trigger and outcome", ["endpoint", "status"]))
+STAGE_SECONDS = REGISTRY.add(Histogram(
+    "pdfrag_stage_duration_seconds", "Latency of each traced stage", ["endpoint", "stage"]))
+OPENAI_TOKENS = REGISTRY.add(Counter(
+    "pdfrag_openai_tokens_total", "OpenAI tokens used", ["kind"]))
+EMBEDDING_INPUTS = REGISTRY.add(Counter(
+    "pdfrag_embedding_inputs_total", "Texts sent for embedding"))
+RATE_LIMITED = REGISTRY.add(Counter(
+    "pdfrag_openai_rate_limited_total", "OpenAI calls that ended in HTTP 429 after client retries", ["api"]))
+DOCS_SCANNED = REGISTRY.add(Histogram(
+    "pdfrag_mongo_docs_scanned", "Chunk documents fetched from Mongo per vector search", buckets=COUNT_BUCKETS))
+BYTES_FETCHED = REGISTRY.add(Counter(
+    "pdfrag_mongo_embedding_bytes_total", "Embedding bytes fetched from Mongo by vector search"))
+INDEX_BUILD_SECONDS = REGISTRY.add(Histogram(
+    "pdfrag_vector_index_build_seconds", "Time to build a search matrix/index"))
+SHARD_TIMEOUTS = REGISTRY.add(Counter(
+    "pdfrag_search_shard_timeouts_total", "Global search shards dropped after SEARCH_SHARD_TIMEOUT_MS"))
+SESSION_RETRIEVALS = REGISTRY.add(Counter(
+    "pdfrag_session_retrievals_total", "Chat session turns by retrieval mode (full, narrow, reuse)", ["mode"]))
+NEAR_DUPLICATES = REGISTRY.add(Counter(
+    "pdfrag_near_duplicate_chunks_total", "Ingested chunks linked to a near-duplicate instead of embedded"))
+
+
+def record_trace(tr) -> None:
+    """
+    Fold a finished trace (services.tracing.Trace) into the collectors.
+    """
+    root = tr.spans[0]
+    endpoint = tr.name
+    REQUEST_SECONDS.observe(root.duration_ms / 1000, endpoint)
+    status = root.attrs.get("status") or ("error" if "error" in root.attrs else "ok")
+    REQUESTS.inc(1, endpoint, str(status))
+
+    for s in tr.spans[1:]:
+        STAGE_SECONDS.observe(s.duration_ms / 1000, endpoint, s.name)
+        attrs = s.attrs
+        if not attrs:
+            continue
+        if s.name == "embeddings":
+            EMBEDDING_INPUTS.inc(attrs.get("inputs", 0))
+            if attrs.get("tokens"):
+                OPENAI_TOKENS.inc(attrs["tokens"], "embedding")
+            if attrs.get("rate_limited"):
+                RATE_LIMITED.inc(attrs["rate_limited"], "embeddings")
+        elif s.name == "chat_completion":
+            if attrs.get("prompt_tokens"):
+                OPENAI_TOKENS.inc(attrs["prompt_tokens"], "prompt")
+            if attrs.get("completion_tokens"):
+                OPENAI_TOKENS.inc(attrs["completion_tokens"], "completion")
+            if attrs.get("rate_limited"):
+                RATE_LIMITED.inc(attrs["rate_limited"], "chat")
+        elif s.name in ("mongo_fetch", "fetch_docs"):
+            DOCS_SCANNED.observe(attrs.get("docs_scanned", 0))
+            BYTES_FETCHED.inc(attrs.get("embedding_bytes", 0))
+        elif s.name == "shard_search":
+            SHARD_TIMEOUTS.inc(attrs.get("timed_out", 0))
+        elif s.name == "near_dup":
+            NEAR_DUPLICATES.inc(attrs.get("duplicates", 0))
+        elif s.name == "session_plan":
+            SESSION_RETRIEVALS.inc(1, attrs.get("mode", "full"))
+        elif s.name in ("build_matrix", "build_index"):
+            INDEX_BUILD_SECONDS.observe(s.duration_ms / 1000)
+
+
+def render() -> str:
+    return REGISTRY.render()
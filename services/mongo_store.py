@@ -1,19 +1,24 @@
 import os
 import logging
-from typing import Optional, List
-from pymongo import MongoClient
-from pymongo.collection import Collection
+from typing import TYPE_CHECKING, Callable, Optional, List
+
+# pymongo is imported on first connect (see services/warmup.py); keeps it
+# off the import path of functions that never reach Mongo
+if TYPE_CHECKING:
+    from pymongo import MongoClient
+    from pymongo.collection import Collection
+    from pymongo.database import Database
 
 # Environment variables
 MONGO_URI = os.getenv("MONGO_URI", "").strip()
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "PDFRag")
 MONGO_COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME", "ghmdocuments")
 
-_client: Optional[MongoClient] = None
-_collection: Optional[Collection] = None
+_client: Optional["MongoClient"] = None
+_collection: Optional["Collection"] = None
 
 
-def get_mongo_collection() -> Optional[Collection]:
+def get_mongo_collection() -> Optional["Collection"]:
     """
     Lazily initialize MongoDB collection.
     IMPORTANT: Never use truthy checks on Collection.
@@ -29,6 +34,8 @@ def get_mongo_collection() -> Optional[Collection]:
         return None
 
     try:
+        from pymongo import MongoClient
+
         logging.info("Initializing MongoDB client")
         _client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
 
@@ -51,23 +58,81 @@ def get_mongo_collection() -> Optional[Collection]:
         return None
 
 
+def get_mongo_db() -> Optional["Database"]:
+    """
+    Database handle sharing the pooled client of the main collection.
+    """
+    if get_mongo_collection() is None or _client is None:
+        return None
+    return _client[MONGO_DB_NAME]
+
+
 class MongoStore:
     """
     Safe wrapper around MongoDB operations.
     """
 
     @property
-    def collection(self) -> Optional[Collection]:
+    def collection(self) -> Optional["Collection"]:
         return get_mongo_collection()
 
+    def get_collection(self, name: str) -> Optional["Collection"]:
+        """
+        Auxiliary collection (jobs, catalog, ...) in the same database.
+        """
+        db = get_mongo_db()
+        if db is None:
+            return None
+        return db[name]
+
     def delete_pdf(self, category: str, filename: str) -> None:
         col = self.collection
         if col is None:
             return
-        col.delete_many({
-            "category": category,
-            "pdf_name": filename
-        })
+        from services import near_dup
+        doomed = {"category": category, "pdf_name": filename}
+        near_dup.promote_links(col, doomed)
+        col.delete_many(doomed)
+
+    def delete_in_batches(
+        self,
+        mongo_filter: dict,
+        batch_size: int = 1000,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """
+        Delete matching chunks by _id batches so huge deletes don't hit
+        request timeouts / RU limits in a single operation.
+        progress(n) is called after each batch with the count just deleted.
+        """
+        col = self.collection
+        if col is None:
+            return 0
+
+        total = 0
+        while True:
+            ids = [d["_id"] for d in col.find(mongo_filter, {"_id": 1}).limit(batch_size)]
+            if not ids:
+                break
+            deleted = col.delete_many({"_id": {"$in": ids}}).deleted_count
+            total += deleted
+            if progress:
+                progress(deleted)
+        return total
+
+    def delete_pdfs(self, category: str, filenames: List[str], **kwargs) -> int:
+        if not filenames:
+            return 0
+        doomed = {"category": category, "pdf_name": {"$in": list(filenames)}}
+        col = self.collection
+        if col is not None:
+            # Near-duplicates in other PDFs may be linked to these chunks
+            from services import near_dup
+            near_dup.promote_links(col, doomed)
+        return self.delete_in_batches(doomed, **kwargs)
+
+    def delete_category(self, category: str, **kwargs) -> int:
+        return self.delete_in_batches({"category": category}, **kwargs)
 
     #  FIX: this method was missing (list_api crash)
     def get_all_categories(self) -> List[str]:
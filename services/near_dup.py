@@ -0,0 +1,228 @@
+import logging
+import re
+import threading
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from services.tracing import span
+
+# MinHash signature of NUM_PERM hashes over word shingles, split into
+# LSH_BANDS bands of BAND_ROWS: two chunks become candidates when a whole
+# band matches (~99% likely at Jaccard 0.9, ~3% at 0.5). Stored signatures
+# are only comparable while these constants and the seed stay the same.
+NUM_PERM = 64
+LSH_BANDS = 8
+BAND_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_WORDS = 5
+
+# Chunks with fewer shingles (headings, page furniture) are always kept
+MIN_SHINGLES = 8
+
+# Doomed chunk ids checked for links per query (promote_links)
+PROMOTE_BATCH = 1000
+
+# Universal hashing (a*x + b) mod p over 32-bit shingle hashes, p > 2^32
+_PRIME = np.uint64(4294967311)
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 2 ** 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2 ** 32, NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+
+_indexes_ready = False
+_init_lock = threading.Lock()
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """
+    MinHash (uint32[NUM_PERM]) of the text's lowercase word 5-grams, or
+    None when the text is too short to fingerprint.
+    """
+    words = _WORD.findall(text.lower())
+    count = len(words) - SHINGLE_WORDS + 1
+    if count < MIN_SHINGLES:
+        return None
+    shingles = np.unique(np.fromiter(
+        (zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode()) for i in range(count)),
+        dtype=np.uint64, count=count,
+    ))
+    return ((np.outer(shingles, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> List[int]:
+    # Band number in the high bits: equal rows in different bands don't collide
+    return [
+        (b << 32) | zlib.crc32(sig[b * BAND_ROWS:(b + 1) * BAND_ROWS].tobytes())
+        for b in range(LSH_BANDS)
+    ]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def _ensure_indexes(collection) -> None:
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    with _init_lock:
+        if not _indexes_ready:
+            try:
+                collection.create_index("lsh")
+                collection.create_index("duplicate_of", sparse=True)
+            except Exception:
+                logging.exception("Failed to create near-duplicate indexes")
+            _indexes_ready = True
+
+
+class DedupPlan:
+    """
+    Near-duplicate decisions for a batch of new chunks, aligned with it:
+    the _id each chunk will get, its signature (None if too short) and the
+    canonical chunk it duplicates (None = embedded and stored as usual).
+    """
+
+    def __init__(self, ids: List, signatures: List, links: List, similarities: List[float]):
+        self.ids = ids
+        self.signatures = signatures
+        self.links = links
+        self.similarities = similarities
+
+    @property
+    def duplicates(self) -> int:
+        return sum(1 for link in self.links if link is not None)
+
+    def unique(self, items: List) -> List:
+        """
+        The items (e.g. chunk texts) of the chunks that need an embedding.
+        """
+        return [item for item, link in zip(items, self.links) if link is None]
+
+    def spread(self, embeddings: List[List[float]]) -> List[Optional[List[float]]]:
+        """
+        Embeddings of the unique chunks spread over the whole batch, None for links.
+        """
+        it = iter(embeddings)
+        return [next(it) if link is None else None for link in self.links]
+
+    def apply(self, documents: List[dict]) -> List[dict]:
+        """
+        Give the chunk documents their _id and either a fingerprint (canonical
+        chunks) or a link to their canonical chunk in place of an embedding.
+        """
+        for doc, _id, sig, link, sim in zip(documents, self.ids, self.signatures, self.links, self.similarities):
+            doc["_id"] = _id
+            if link is not None:
+                doc.pop(settings.EMBEDDING_FIELD, None)
+                doc["duplicate_of"] = link
+                doc["similarity"] = round(sim, 3)
+            elif sig is not None:
+                doc["minhash"] = sig.tobytes()
+                doc["lsh"] = band_keys(sig)
+        return documents
+
+
+def plan(collection, category: str, texts: List[str], exclude_blob: Optional[str] = None) -> DedupPlan:
+    """
+    Match new chunk texts against the canonical chunks of their category
+    (LSH band lookup, then signature similarity >= NEAR_DUP_THRESHOLD) and
+    against the earlier chunks of the same batch. exclude_blob leaves out
+    the stored chunks of a PDF that is being replaced.
+    """
+    from bson import ObjectId
+
+    ids = [ObjectId() for _ in texts]
+    if not settings.NEAR_DUP_ENABLED or not texts:
+        return DedupPlan(ids, [None] * len(texts), [None] * len(texts), [0.0] * len(texts))
+
+    _ensure_indexes(collection)
+    threshold = settings.NEAR_DUP_THRESHOLD
+    with span("near_dup", chunks=len(texts)) as s:
+        signatures = [signature(t) for t in texts]
+        keys = [band_keys(sig) if sig is not None else [] for sig in signatures]
+
+        # band key -> [(chunk _id, signature)] of the canonical chunks
+        buckets: Dict[int, List[Tuple]] = defaultdict(list)
+        wanted = sorted({k for ks in keys for k in ks})
+        candidates = 0
+        if wanted:
+            query = {"category": category, "lsh": {"$in": wanted}}
+            if exclude_blob:
+                query["blob_path"] = {"$ne": exclude_blob}
+            for doc in collection.find(query, {"minhash": 1, "lsh": 1}):
+                candidates += 1
+                sig = np.frombuffer(doc["minhash"], dtype=np.uint32)
+                for k in doc.get("lsh") or ():
+                    buckets[k].append((doc["_id"], sig))
+
+        links: List = []
+        similarities: List[float] = []
+        for _id, sig, ks in zip(ids, signatures, keys):
+            best, best_sim, seen = None, 0.0, set()
+            for k in ks:
+                for other, other_sig in buckets.get(k, ()):
+                    if other in seen:
+                        continue
+                    seen.add(other)
+                    sim = similarity(sig, other_sig)
+                    if sim > best_sim:
+                        best, best_sim = other, sim
+            if best is not None and best_sim >= threshold:
+                links.append(best)
+                similarities.append(best_sim)
+                continue
+            links.append(None)
+            similarities.append(0.0)
+            # Later chunks of the batch may duplicate this one
+            for k in ks:
+                buckets[k].append((_id, sig))
+
+        result = DedupPlan(ids, signatures, links, similarities)
+        s.set(candidates=candidates, duplicates=result.duplicates)
+    return result
+
+
+def promote_links(collection, doomed: Dict) -> int:
+    """
+    Call before deleting the chunks matching `doomed`: near-duplicates
+    linked to them from other PDFs must stay searchable. Per doomed
+    canonical chunk the first surviving link inherits its embeddings and
+    fingerprint and becomes canonical; the other links are re-pointed to it.
+    Returns the number of links promoted.
+    """
+    doomed_ids = [d["_id"] for d in collection.find(doomed, {"_id": 1})]
+    doomed_set = set(doomed_ids)
+    promoted = 0
+    for i in range(0, len(doomed_ids), PROMOTE_BATCH):
+        links: Dict = defaultdict(list)
+        query = {"duplicate_of": {"$in": doomed_ids[i:i + PROMOTE_BATCH]}}
+        for doc in collection.find(query, {"duplicate_of": 1}).sort("_id", 1):
+            if doc["_id"] not in doomed_set:
+                links[doc["duplicate_of"]].append(doc["_id"])
+        if not links:
+            continue
+
+        for canonical in collection.find({"_id": {"$in": list(links)}}):
+            heir, *rest = links[canonical["_id"]]
+            # Every embedding version (see services/reembed.py) moves along
+            inherited = {
+                k: v for k, v in canonical.items()
+                if k.startswith("embedding") or k in ("minhash", "lsh")
+            }
+            collection.update_one(
+                {"_id": heir},
+                {"$set": inherited, "$unset": {"duplicate_of": "", "similarity": ""}},
+            )
+            if rest:
+                collection.update_many({"_id": {"$in": rest}}, {"$set": {"duplicate_of": heir}})
+            promoted += 1
+    if promoted:
+        logging.info("Promoted %d near-duplicate chunks to canonical before delete", promoted)
+    return promoted
@@ -0,0 +1,112 @@
+import json
+import logging
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from config.settings import settings
+from services.mongo_store import mongo_store
+
+# zlib level for stored page text: extracted text compresses ~4x, and
+# higher levels cost CPU on every ingest batch for little extra saving
+COMPRESSION_LEVEL = 6
+
+_indexes_ready = False
+_init_lock = threading.Lock()
+
+
+def _pages():
+    global _indexes_ready
+    col = mongo_store.get_collection(settings.PAGE_TEXT_COLLECTION)
+    if col is None or _indexes_ready:
+        return col
+
+    with _init_lock:
+        if not _indexes_ready:
+            try:
+                col.create_index([("hash", 1), ("start", 1)])
+            except Exception:
+                logging.exception("Failed to create page text indexes")
+            _indexes_ready = True
+    return col
+
+
+def _encode(page_texts: List[str]) -> bytes:
+    return zlib.compress(json.dumps(page_texts).encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def _decode(data: bytes) -> List[str]:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def save(pdf_hash: Optional[str], start: int, page_texts: List[str]) -> None:
+    """
+    Store the extracted text of pages [start, start + len(page_texts)) (0-based)
+    of the PDF with this content hash, zlib-compressed. One document per
+    ingest batch; saving the same batch again replaces it.
+    """
+    if not pdf_hash or not page_texts or not settings.PAGE_TEXT_ENABLED:
+        return
+    col = _pages()
+    if col is None:
+        return
+
+    end = start + len(page_texts)
+    data = _encode(page_texts)
+    try:
+        col.replace_one(
+            {"_id": f"{pdf_hash}@{start}"},
+            {
+                "_id": f"{pdf_hash}@{start}",
+                "hash": pdf_hash,
+                "start": start,
+                "end": end,
+                "text": data,
+                "chars": sum(len(t) for t in page_texts),
+                "bytes": len(data),
+                "created_at": datetime.now(timezone.utc),
+            },
+            upsert=True,
+        )
+    except Exception:
+        # Re-chunking falls back to re-ingesting this PDF; ingest itself goes on
+        logging.exception("Failed to store page text of %s pages %d-%d", pdf_hash, start + 1, end)
+
+
+def load(pdf_hash: Optional[str], start: int, end: int) -> Optional[List[str]]:
+    """
+    Text of pages [start, end) (0-based), or None unless every page is stored.
+    Stored batches need not line up with the requested range.
+    """
+    if not pdf_hash or end <= start:
+        return None
+    col = _pages()
+    if col is None:
+        return None
+
+    pages: Dict[int, str] = {}
+    for doc in col.find({"hash": pdf_hash, "start": {"$lt": end}, "end": {"$gt": start}}):
+        for i, text in enumerate(_decode(doc["text"]), doc["start"]):
+            if start <= i < end:
+                pages[i] = text
+    if len(pages) != end - start:
+        return None
+    return [pages[i] for i in range(start, end)]
+
+
+def forget(pdf_hashes: Iterable[str]) -> int:
+    """
+    Drop stored text of these hashes unless another catalog entry still has
+    the same content. Returns the number of batches deleted.
+    """
+    col = _pages()
+    catalog_col = mongo_store.get_collection(settings.CATALOG_COLLECTION)
+    if col is None or catalog_col is None:
+        return 0
+
+    deleted = 0
+    for pdf_hash in {h for h in pdf_hashes if h}:
+        if catalog_col.find_one({"hash": pdf_hash}, {"_id": 1}) is None:
+            deleted += col.delete_many({"hash": pdf_hash}).deleted_count
+    return deleted
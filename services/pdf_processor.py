@@ -2,8 +2,60 @@ import io
 import logging
 import re
 from datetime import datetime
+from typing import List
 from pypdf import PdfReader
 
+def open_pdf(pdf_bytes: bytes) -> PdfReader:
+    return PdfReader(io.BytesIO(pdf_bytes))
+
+
+def extract_pages(reader: PdfReader, start: int, end: int) -> List[str]:
+    """
+    Extract text of pages [start, end) (0-based). Failed pages yield "".
+    """
+    texts = []
+    for page_index in range(start, min(end, len(reader.pages))):
+        try:
+            texts.append(reader.pages[page_index].extract_text() or "")
+        except Exception as page_err:
+            logging.warning(f"Failed to extract page {page_index}: {page_err}")
+            texts.append("")
+    return texts
+
+
+def extract_metadata(reader: PdfReader, sample_text: str) -> dict:
+    """
+    Year/date from PDF metadata, falling back to years mentioned in sample_text.
+    Returns: {"year": int, "date": str}
+    """
+    metadata = {"year": 2025, "date": ""}
+
+    # 1. Try PDF Metadata
+    if reader.metadata:
+        creation_date = reader.metadata.get('/CreationDate')
+        if creation_date:
+            # Format: D:YYYYMMDDHHmmSS...
+            # Simple parse: remove D: and take first 4 chars
+            try:
+                clean_date = creation_date.replace("D:", "")
+                year_str = clean_date[:4]
+                if year_str.isdigit() and 2000 <= int(year_str) <= 2030:
+                    metadata["year"] = int(year_str)
+                    metadata["date"] = clean_date[:8] # YYYYMMDD
+            except Exception:
+                pass
+
+    # 2. Key fallback to text regex if year is still default
+    if metadata["year"] == 2025:
+        # Look for years 2000-2030 in text
+        years = re.findall(r'\b(20[0-3]\d)\b', sample_text)
+        if years:
+            # Pick the most recent year found
+            metadata["year"] = int(max(years))
+
+    return metadata
+
+
 def extract_text_and_metadata(pdf_bytes: bytes) -> tuple[str, dict]:
     """
     Extract text and metadata (year, date) from PDF bytes.
@@ -13,44 +65,12 @@ def extract_text_and_metadata(pdf_bytes: bytes) -> tuple[str, dict]:
         return "", {"year": 2025, "date": ""}
 
     try:
-        reader = PdfReader(io.BytesIO(pdf_bytes))
-        extracted_text = []
-
-        for page_index, page in enumerate(reader.pages):
-            try:
-                text = page.extract_text()
-                if text:
-                    extracted_text.append(text)
-            except Exception as page_err:
-                logging.warning(f"Failed to extract page {page_index}: {page_err}")
-
+        reader = open_pdf(pdf_bytes)
+        extracted_text = [t for t in extract_pages(reader, 0, len(reader.pages)) if t]
         final_text = "\n".join(extracted_text)
-        
-        # Metadata Extraction
-        metadata = {"year": 2025, "date": ""}
-        
-        # 1. Try PDF Metadata
-        if reader.metadata:
-            creation_date = reader.metadata.get('/CreationDate')
-            if creation_date:
-                # Format: D:YYYYMMDDHHmmSS...
-                # Simple parse: remove D: and take first 4 chars
-                try:
-                    clean_date = creation_date.replace("D:", "")
-                    year_str = clean_date[:4]
-                    if year_str.isdigit() and 2000 <= int(year_str) <= 2030:
-                        metadata["year"] = int(year_str)
-                        metadata["date"] = clean_date[:8] # YYYYMMDD
-                except Exception:
-                    pass
 
-        # 2. Key fallback to text regex if year is still default
-        if metadata["year"] == 2025:
-            # Look for years 2000-2030 in text
-            years = re.findall(r'\b(20[0-3]\d)\b', final_text)
-            if years:
-                # Pick the most recent year found
-                metadata["year"] = int(max(years))
+        # Metadata Extraction
+        metadata = extract_metadata(reader, final_text)
 
         logging.info("Extracted %d chars. Metadata: %s", len(final_text), metadata)
         return final_text, metadata
@@ -0,0 +1,222 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Deque, Dict, Optional
+
+from config.settings import settings
+
+# Deepest stack kept per sample
+MAX_STACK_DEPTH = 128
+
+# Request ids come from the x-request-id header: only these characters
+# (and at most 64 of them) make it into a profile's file / blob name
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class _StackSampler:
+    """
+    One background thread that samples the stacks of registered request
+    threads every PROFILE_SAMPLE_INTERVAL_MS. It idles (blocked on an event)
+    while no request is being profiled.
+    """
+
+    def __init__(self):
+        self._active: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, thread_id: int) -> Counter:
+        samples: Counter = Counter()
+        with self._lock:
+            self._active[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return samples
+
+    def unregister(self, thread_id: int) -> None:
+        with self._lock:
+            self._active.pop(thread_id, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                active = dict(self._active)
+                if not active:
+                    self._wake.clear()
+            if not active:
+                self._wake.wait()
+                continue
+
+            frames = sys._current_frames()
+            # Under the lock so an unregistered request's samples are final
+            with self._lock:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_fold(frame)] += 1
+            del frames
+            time.sleep(max(0.001, settings.PROFILE_SAMPLE_INTERVAL_MS / 1000))
+
+
+def _fold(frame) -> str:
+    """
+    Collapsed-stack line (root first, ';'-separated) as used by flamegraph.pl / speedscope.
+    """
+    parts = []
+    while frame is not None and len(parts) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+_sampler = _StackSampler()
+
+# cProfile can only run one session at a time (interpreter-wide since 3.12)
+_cprofile_lock = threading.Lock()
+
+# Timestamps of stored profiles in the last hour (rate limit)
+_stored: Deque[float] = deque()
+_stored_lock = threading.Lock()
+
+
+def _allow_store() -> bool:
+    now = time.monotonic()
+    with _stored_lock:
+        while _stored and now - _stored[0] > 3600:
+            _stored.popleft()
+        if len(_stored) >= settings.PROFILE_MAX_PER_HOUR:
+            return False
+        _stored.append(now)
+        return True
+
+
+def _write(name: str, data: bytes, content_type: str) -> str:
+    if settings.PROFILE_STORAGE == "blob":
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import ContentSettings
+        from services.blob_store import get_container_client
+
+        container = get_container_client(settings.PROFILE_CONTAINER)
+        if container is None:
+            raise RuntimeError("Storage connection string missing")
+        try:
+            container.create_container()
+        except ResourceExistsError:
+            pass
+        container.upload_blob(name, data, overwrite=True, content_settings=ContentSettings(content_type=content_type))
+        return f"{settings.PROFILE_CONTAINER}/{name}"
+
+    root = os.path.realpath(settings.PROFILE_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"profile name escapes PROFILE_DIR: {name!r}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _store(function: str, request_id: str, duration_ms: float, mode: str, payload: bytes, trace=None) -> None:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    safe_id = _UNSAFE_NAME.sub("_", request_id)[:64].strip(".") or uuid.uuid4().hex
+    base = f"{function}/{stamp}_{safe_id}"
+    ext, content_type = (".prof", "application/octet-stream") if mode == "cprofile" else (".folded", "text/plain")
+
+    meta = {
+        "function": function,
+        "request_id": request_id,
+        "duration_ms": round(duration_ms, 1),
+        "threshold_ms": settings.PROFILE_SLOW_MS,
+        "mode": mode,
+        "captured_at": stamp,
+        "instance": os.getenv("WEBSITE_INSTANCE_ID", ""),
+    }
+    if trace is not None:
+        meta["trace_id"] = trace.trace_id
+        meta["stage_ms"] = trace.stage_ms()
+
+    try:
+        where = _write(base + ext, payload, content_type)
+        _write(base + ".json", json.dumps(meta, indent=2).encode("utf-8"), "application/json")
+        logging.warning(
+            "Slow %s (%.0f ms > %d ms): profile stored at %s",
+            function, duration_ms, settings.PROFILE_SLOW_MS, where
+        )
+    except Exception:
+        logging.exception("Failed to store profile for %s", function)
+
+
+@contextmanager
+def profile_if_slow(function: str, trace=None, request_id: Optional[str] = None):
+    """
+    Profile the wrapped invocation and keep the profile only if it took longer
+    than PROFILE_SLOW_MS (0 disables profiling entirely). Stored profiles are
+    rate limited to PROFILE_MAX_PER_HOUR per instance.
+    """
+    threshold = settings.PROFILE_SLOW_MS
+    if threshold <= 0:
+        yield
+        return
+
+    mode = settings.PROFILE_MODE
+    request_id = request_id or (trace.trace_id if trace is not None else uuid.uuid4().hex)
+    thread_id = threading.get_ident()
+    profiler = None
+    samples = None
+
+    if mode == "cprofile":
+        # Another request holds the profiler: run this one unprofiled
+        if _cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                _cprofile_lock.release()
+                profiler = None
+    else:
+        samples = _sampler.register(thread_id)
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        payload = None
+        if profiler is not None:
+            profiler.disable()
+            _cprofile_lock.release()
+            if duration_ms >= threshold:
+                payload = _dump_stats(profiler)
+        elif samples is not None:
+            _sampler.unregister(thread_id)
+            if duration_ms >= threshold and samples:
+                payload = "".join(f"{stack} {n}\n" for stack, n in samples.most_common()).encode("utf-8")
+
+        if payload is not None and _allow_store():
+            _store(function, request_id, duration_ms, mode if profiler is not None else "sample", payload, trace)
+
+
+def _dump_stats(profiler: cProfile.Profile) -> bytes:
+    """
+    pstats binary format (load with pstats.Stats / snakeviz).
+    """
+    import marshal
+
+    profiler.create_stats()
+    buf = io.BytesIO()
+    marshal.dump(profiler.stats, buf)
+    return buf.getvalue()
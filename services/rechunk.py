@@ -0,0 +1,327 @@
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services import catalog, ingest_jobs, near_dup, page_text
+from services.embeddings import generate_embeddings
+from services.ingest import chunk_documents, chunk_page_range
+from services.mongo_store import mongo_store
+from services.tracing import span
+from services.work_queue import delay_until, enqueue, register_handler
+
+# Job / per-PDF item statuses
+RUNNING = "running"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# Chunk documents inserted / deleted per request
+WRITE_BATCH = 500
+
+# Progress counters of a job, summed over its PDFs
+COUNTERS = ("chunks_before", "chunks_after", "near_duplicates", "embeddings_reused", "embeddings_computed")
+
+
+def _jobs():
+    return mongo_store.get_collection(settings.RECHUNK_JOBS_COLLECTION)
+
+
+def _items():
+    return mongo_store.get_collection(settings.RECHUNK_JOBS_COLLECTION + "_items")
+
+
+def item_id(job_id: str, blob_path: str) -> str:
+    return f"{job_id}:{blob_path}"
+
+
+def start_rechunk(category: Optional[str] = None, pdf_names: Optional[List[str]] = None) -> Optional[dict]:
+    """
+    Queue a re-chunk of every ready PDF (optionally of one category / some
+    of its PDFs) with the current chunk settings: one work item per PDF,
+    processed in parallel by rechunk_worker. Returns the job doc.
+    """
+    jobs = _jobs()
+    items = _items()
+    if jobs is None or items is None:
+        return None
+
+    entries = [
+        e for e in catalog.find_entries(category, pdf_names)
+        if e.get("status", catalog.READY) == catalog.READY
+    ]
+    job_id = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    job = {
+        "_id": job_id,
+        "category": category,
+        "pdf_names": pdf_names,
+        "status": RUNNING if entries else DONE,
+        "chunk_strategy": settings.CHUNK_STRATEGY,
+        "pdfs_total": len(entries),
+        "pdfs_done": 0,
+        "pdfs_skipped": 0,
+        "pdfs_failed": 0,
+        **{c: 0 for c in COUNTERS},
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    jobs.insert_one(job)
+    if entries:
+        items.insert_many([
+            {
+                "_id": item_id(job_id, e["_id"]),
+                "job_id": job_id,
+                "blob_path": e["_id"],
+                "status": RUNNING,
+                "lease_until": None,
+                "updated_at": now,
+            }
+            for e in entries
+        ])
+        for e in entries:
+            enqueue(settings.RECHUNK_QUEUE_NAME, {"job_id": job_id, "blob_path": e["_id"]})
+    return job
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    jobs = _jobs()
+    if jobs is None:
+        return None
+    return jobs.find_one({"_id": job_id})
+
+
+def progress(job: dict) -> dict:
+    """
+    Client view of a job: counters plus elapsed time and throughput.
+    """
+    finished = job["pdfs_done"] + job["pdfs_skipped"] + job["pdfs_failed"]
+    end = job.get("completed_at") or datetime.now(timezone.utc)
+    start = job["created_at"]
+    if start.tzinfo is None:
+        # pymongo returns naive UTC datetimes
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    seconds = max((end - start).total_seconds(), 1e-3)
+    return {
+        "job_id": job["_id"],
+        "category": job.get("category"),
+        "status": job["status"],
+        "pdfs_total": job["pdfs_total"],
+        "pdfs_finished": finished,
+        "pdfs_done": job["pdfs_done"],
+        "pdfs_skipped": job["pdfs_skipped"],
+        "pdfs_failed": job["pdfs_failed"],
+        **{c: job.get(c, 0) for c in COUNTERS},
+        "elapsed_seconds": round(seconds, 1),
+        "pdfs_per_second": round(finished / seconds, 3),
+        "error": job.get("error"),
+    }
+
+
+def _claim(job_id: str, blob_path: str) -> Optional[dict]:
+    """
+    Lease a PDF of the job so a redelivered message doesn't run it twice at once.
+    """
+    items = _items()
+    now = datetime.now(timezone.utc)
+    return items.find_one_and_update(
+        {
+            "_id": item_id(job_id, blob_path),
+            "status": RUNNING,
+            "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+        },
+        {"$set": {"lease_until": now + timedelta(seconds=settings.WORK_LEASE_SECONDS), "updated_at": now}},
+    )
+
+
+def _retry_at(job_id: str, blob_path: str) -> Optional[datetime]:
+    """
+    For a PDF _claim refused: when it can be claimed again (its lease
+    expiry), or None if it is finished and the message can go.
+    """
+    item = _items().find_one({"_id": item_id(job_id, blob_path), "status": RUNNING}, {"lease_until": 1})
+    if item is None:
+        return None
+    return item.get("lease_until") or datetime.now(timezone.utc)
+
+
+def _finish(job_id: str, blob_path: str, status: str, reason: Optional[str], counts: Dict[str, int]) -> None:
+    """
+    Record a PDF's outcome once and fold it into the job; the last PDF
+    completes the job.
+    """
+    from pymongo import ReturnDocument
+
+    items = _items()
+    jobs = _jobs()
+    now = datetime.now(timezone.utc)
+    marked = items.update_one(
+        {"_id": item_id(job_id, blob_path), "status": RUNNING},
+        {"$set": {"status": status, "reason": reason, "lease_until": None, "updated_at": now}},
+    )
+    if marked.modified_count != 1:
+        return
+
+    job = jobs.find_one_and_update(
+        {"_id": job_id},
+        {"$inc": {f"pdfs_{status}": 1, **counts}, "$set": {"updated_at": now}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job and job["pdfs_done"] + job["pdfs_skipped"] + job["pdfs_failed"] >= job["pdfs_total"]:
+        jobs.update_one(
+            {"_id": job_id, "status": RUNNING},
+            {"$set": {"status": DONE, "completed_at": now, "updated_at": now}},
+        )
+        logging.info("Rechunk job %s done", job_id)
+
+
+def plan_chunks(page_texts: List[str]) -> List[Tuple[int, List[Tuple[str, int, int]]]]:
+    """
+    Chunks of a whole PDF exactly as ingest would produce them with the
+    current settings: per page range, chunked batch by batch.
+    Returns [(range_start, [(text, page_start, page_end)])].
+    """
+    batch_pages = max(1, settings.INGEST_PAGE_BATCH)
+    planned = []
+    for start, end in ingest_jobs.split_ranges(len(page_texts), settings.INGEST_RANGE_PAGES):
+        chunks = []
+        for b in range(start, end, batch_pages):
+            e = min(b + batch_pages, end)
+            chunks.extend(chunk_page_range(page_texts[b:e], b + 1))
+        planned.append((start, chunks))
+    return planned
+
+
+def _rechunk(job_id: str, blob_path: str) -> Tuple[str, Optional[str], Dict[str, int]]:
+    category, _, pdf_name = blob_path.partition("/")
+    entries = catalog.find_entries(category, [pdf_name])
+    entry = entries[0] if entries else None
+    if entry is None or entry.get("status", catalog.READY) != catalog.READY:
+        return SKIPPED, "not ready", {}
+
+    with span("load_page_text") as s:
+        pages = page_text.load(entry.get("hash"), 0, entry.get("page_count") or 0)
+        s.set(stored=pages is not None)
+    if pages is None:
+        return SKIPPED, "no stored page text (re-upload to store it)", {}
+
+    collection = mongo_store.collection
+    if collection is None:
+        raise RuntimeError("MongoDB collection not available")
+
+    # An ingest starting meanwhile owns the PDF; its run id tells us
+    job = ingest_jobs.get_job(blob_path)
+    run_id = job.get("run_id") if job else None
+
+    with span("chunk") as s:
+        planned = plan_chunks(pages)
+        texts = [c[0] for _, chunks in planned for c in chunks]
+        s.set(chunks=len(texts))
+
+    # A previous attempt of this job that died before deleting the old
+    # chunks left its new ones behind: drop them, they are rebuilt below
+    leftover = {"blob_path": blob_path, "rechunk_job": job_id}
+    near_dup.promote_links(collection, leftover)
+    collection.delete_many(leftover)
+
+    with span("mongo_fetch") as s:
+        field = settings.EMBEDDING_FIELD
+        old = list(collection.find({"blob_path": blob_path}, {"text": 1, field: 1}))
+        s.set(docs_scanned=len(old))
+    if sorted(d.get("text", "") for d in old) == sorted(texts):
+        # Chunk settings didn't change anything for this PDF
+        return DONE, "unchanged", {"chunks_before": len(old), "chunks_after": len(old), "embeddings_reused": len(old)}
+
+    # Linked against other PDFs' chunks: this PDF's old ones are about to go
+    dedup = near_dup.plan(collection, category, texts, exclude_blob=blob_path)
+    unique = dedup.unique(texts)
+
+    # Existing chunks are the embedding cache: only new chunk texts are embedded
+    cached = {d["text"]: d[field] for d in old if d.get("text") and d.get(field)}
+    missing = list(dict.fromkeys(t for t in unique if t not in cached))
+    embeddings = generate_embeddings(missing)
+    if len(embeddings) != len(missing):
+        raise RuntimeError(f"embedding mismatch: texts={len(missing)} embeddings={len(embeddings)}")
+    reused = sum(1 for t in unique if t in cached)
+    cached.update(zip(missing, embeddings))
+
+    metadata = {"year": entry.get("year", 2025), "date": entry.get("date", "")}
+    spread = iter(dedup.spread([cached[t] for t in unique]))
+    documents = []
+    for start, chunks in planned:
+        documents.extend(chunk_documents(
+            blob_path, category, pdf_name, metadata, entry.get("uploaded_at"),
+            start, 0, chunks, [next(spread) for _ in chunks],
+        ))
+    dedup.apply(documents)
+    for doc in documents:
+        doc["rechunk_job"] = job_id
+
+    # New chunks first, then the old ones go: search never sees the PDF empty
+    with span("insert_many", docs=len(documents)):
+        new_ids = []
+        for i in range(0, len(documents), WRITE_BATCH):
+            new_ids.extend(collection.insert_many(documents[i:i + WRITE_BATCH]).inserted_ids)
+
+    job = ingest_jobs.get_job(blob_path)
+    if (job.get("run_id") if job else None) != run_id:
+        near_dup.promote_links(collection, {"_id": {"$in": new_ids}})
+        collection.delete_many({"_id": {"$in": new_ids}})
+        return SKIPPED, "re-ingested meanwhile", {}
+
+    old_ids = [d["_id"] for d in old]
+    with span("delete_old", docs=len(old_ids)):
+        near_dup.promote_links(collection, {"_id": {"$in": old_ids}})
+        for i in range(0, len(old_ids), WRITE_BATCH):
+            collection.delete_many({"_id": {"$in": old_ids[i:i + WRITE_BATCH]}})
+
+    # Refreshes the catalog and bumps the category's index generation
+    catalog.mark_status(blob_path, catalog.READY, chunk_count=len(documents), near_duplicates=dedup.duplicates)
+    logging.info(
+        "Rechunked %s: %d -> %d chunks (%d near-duplicates, %d embeddings reused, %d computed)",
+        blob_path, len(old), len(documents), dedup.duplicates, reused, len(missing),
+    )
+    return DONE, None, {
+        "chunks_before": len(old),
+        "chunks_after": len(documents),
+        "near_duplicates": dedup.duplicates,
+        "embeddings_reused": reused,
+        "embeddings_computed": len(missing),
+    }
+
+
+def rechunk_pdf(job_id: str, blob_path: str) -> None:
+    """
+    Rebuild the chunks of one PDF of a job from its stored page text.
+    """
+    if _items() is None or _jobs() is None:
+        raise RuntimeError("MongoDB not available")
+    if _claim(job_id, blob_path) is None:
+        retry = _retry_at(job_id, blob_path)
+        if retry is None:
+            logging.info("Rechunk of %s (job %s) already finished", blob_path, job_id)
+            return
+        # Leased: the holder may have crashed, try again once its lease expires
+        delay = delay_until(retry)
+        logging.info("Rechunk of %s (job %s) leased, retrying in %ds", blob_path, job_id, delay)
+        enqueue(settings.RECHUNK_QUEUE_NAME, {"job_id": job_id, "blob_path": blob_path}, delay)
+        return
+
+    try:
+        status, reason, counts = _rechunk(job_id, blob_path)
+    except Exception as e:
+        logging.exception("Rechunk of %s failed", blob_path)
+        status, reason, counts = FAILED, str(e), {}
+    _finish(job_id, blob_path, status, reason, counts)
+
+
+def process_rechunk_message(payload: dict) -> None:
+    rechunk_pdf(payload["job_id"], payload["blob_path"])
+
+
+# In-memory queue backend dispatches rechunk messages here
+register_handler(settings.RECHUNK_QUEUE_NAME, process_rechunk_message)
@@ -0,0 +1,541 @@
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.embeddings import embed_batch
+from services.mongo_store import mongo_store
+from services.tracing import span
+from services.work_queue import delay_until, enqueue, register_handler
+
+# Job / range statuses
+RUNNING = "running"
+DONE = "done"
+
+# Target fields live next to the serving one: embedding_<version>
+FIELD_PATTERN = re.compile(r"^embedding_[A-Za-z0-9_]{1,40}$")
+
+# 429 answers to one batch before the range is handed back to the queue
+MAX_RATE_LIMIT_RETRIES = 6
+
+# Chunks with an embedding of their own; near-duplicates (services/near_dup.py)
+# share their canonical chunk's, in whichever field is serving
+EMBEDDED = {"duplicate_of": {"$exists": False}}
+
+# Progress counters of a job, summed over its ranges
+COUNTERS = ("chunks_done", "tokens", "requests", "rate_limited")
+
+
+def _jobs():
+    return mongo_store.get_collection(settings.REEMBED_JOBS_COLLECTION)
+
+
+def _ranges():
+    return mongo_store.get_collection(settings.REEMBED_JOBS_COLLECTION + "_ranges")
+
+
+def range_id(job_id: str, index: int) -> str:
+    return f"{job_id}@{index}"
+
+
+# ---------------------------------------------------------
+# Throttling (shared by the threads of one worker)
+# ---------------------------------------------------------
+
+class _Bucket:
+    """
+    Per-minute budget refilled continuously, holding at most 10 s worth so a
+    fresh worker doesn't burst a whole minute of requests.
+    """
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 6.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Requests- and tokens-per-minute limits; a 429 pauses every thread.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self._requests = _Bucket(rpm) if rpm > 0 else None
+        self._tokens = _Bucket(tpm) if tpm > 0 else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if self._requests:
+                    wait = max(wait, self._requests.wait_time(1, now))
+                if self._tokens:
+                    wait = max(wait, self._tokens.wait_time(tokens, now))
+                if wait <= 0:
+                    if self._requests:
+                        self._requests.take(1)
+                    if self._tokens:
+                        self._tokens.take(tokens)
+                    return
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiter: Optional[RateLimiter] = None
+_pool: Optional[ThreadPoolExecutor] = None
+_init_lock = threading.Lock()
+
+
+def _get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _init_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(settings.REEMBED_MAX_RPM, settings.REEMBED_MAX_TPM)
+    return _limiter
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _init_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=max(1, settings.REEMBED_CONCURRENCY),
+                    thread_name_prefix="reembed",
+                )
+    return _pool
+
+
+# ---------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------
+
+def validate_target(field: str, deployment: str) -> Optional[str]:
+    """
+    Error message for an unusable target, or None.
+    """
+    if not deployment:
+        return "Missing deployment"
+    if not field or not FIELD_PATTERN.match(field):
+        return "field must look like embedding_<version>"
+    if field == settings.EMBEDDING_FIELD:
+        return f"{field} is the field search is serving from"
+    return None
+
+
+def _split_ids(collection) -> Tuple[List, int]:
+    """
+    Every REEMBED_RANGE_CHUNKS-th chunk _id (ascending) as range
+    boundaries, plus the chunk count. Reads ids only.
+    """
+    step = max(1, settings.REEMBED_RANGE_CHUNKS)
+    bounds = []
+    total = 0
+    for doc in collection.find(EMBEDDED, {"_id": 1}).sort("_id", 1):
+        if total and total % step == 0:
+            bounds.append(doc["_id"])
+        total += 1
+    return bounds, total
+
+
+def start_reembed(field: str, deployment: str, dimensions: int = 0) -> Optional[dict]:
+    """
+    Queue the re-embedding of every chunk with another deployment into
+    `field`, leaving the serving field untouched. The collection is split
+    into _id ranges processed in parallel by reembed_worker; the last range
+    is open-ended so chunks ingested meanwhile are covered too. A running
+    job for the same field is returned instead of starting another one,
+    after re-queueing its stalled ranges (see resume).
+    """
+    jobs = _jobs()
+    ranges = _ranges()
+    collection = mongo_store.collection
+    if jobs is None or ranges is None or collection is None:
+        return None
+
+    running = jobs.find_one({"field": field, "status": RUNNING})
+    if running:
+        resume(running["_id"])
+        return running
+
+    bounds, total = _split_ids(collection)
+    edges = [None] + bounds + [None]
+    job_id = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    job = {
+        "_id": job_id,
+        "field": field,
+        "deployment": deployment,
+        "dimensions": dimensions or 0,
+        "status": RUNNING,
+        "ranges_total": len(edges) - 1,
+        "ranges_done": 0,
+        "chunks_total": total,
+        **{c: 0 for c in COUNTERS},
+        "missing": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    jobs.insert_one(job)
+    ranges.insert_many([
+        {
+            "_id": range_id(job_id, i),
+            "job_id": job_id,
+            "lo": edges[i],
+            "hi": edges[i + 1],
+            "cursor": None,
+            "chunks_done": 0,
+            "status": RUNNING,
+            "lease_until": None,
+            "updated_at": now,
+        }
+        for i in range(len(edges) - 1)
+    ])
+    for i in range(len(edges) - 1):
+        enqueue_range(job_id, i)
+    return job
+
+
+def resume(job_id: str) -> int:
+    """
+    Re-queue the running ranges of a job nobody is working on: lease expired
+    (worker crashed) or untouched for a whole lease (message lost). A range
+    that is in fact still queued just gets a duplicate message, which the
+    lease and the cursor checkpoint make harmless. Returns the ranges re-queued.
+    """
+    ranges = _ranges()
+    now = datetime.now(timezone.utc)
+    idle = {
+        "status": RUNNING,
+        "$or": [
+            {"lease_until": {"$lt": now}},
+            {"lease_until": None, "updated_at": {"$lt": now - timedelta(seconds=settings.WORK_LEASE_SECONDS)}},
+        ],
+    }
+    resumed = 0
+    for r in list(ranges.find({"job_id": job_id, **idle}, {"_id": 1})):
+        # Conditional, so a range claimed meanwhile keeps its lease; the
+        # touch keeps repeated calls from queueing it again right away
+        touched = ranges.update_one({"_id": r["_id"], **idle}, {"$set": {"lease_until": None, "updated_at": now}})
+        if touched.modified_count == 1:
+            enqueue_range(job_id, int(r["_id"].rpartition("@")[2]))
+            resumed += 1
+    if resumed:
+        logging.info("Reembed job %s: re-queued %d stalled ranges", job_id, resumed)
+    return resumed
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    jobs = _jobs()
+    if jobs is None:
+        return None
+    return jobs.find_one({"_id": job_id})
+
+
+def progress(job: dict) -> dict:
+    """
+    Client view of a job: counters, throughput, ETA and, once every chunk
+    has the new field, the settings to switch serving over.
+    """
+    end = job.get("completed_at") or datetime.now(timezone.utc)
+    start = job["created_at"]
+    if start.tzinfo is None:
+        # pymongo returns naive UTC datetimes
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    seconds = max((end - start).total_seconds(), 1e-3)
+    rate = job["chunks_done"] / seconds
+    remaining = max(job["chunks_total"] - job["chunks_done"], 0)
+
+    view = {
+        "job_id": job["_id"],
+        "field": job["field"],
+        "deployment": job["deployment"],
+        "dimensions": job.get("dimensions") or 0,
+        "status": job["status"],
+        "ranges_total": job["ranges_total"],
+        "ranges_done": job["ranges_done"],
+        "chunks_total": job["chunks_total"],
+        **{c: job.get(c, 0) for c in COUNTERS},
+        "elapsed_seconds": round(seconds, 1),
+        "chunks_per_second": round(rate, 2),
+        "eta_seconds": round(remaining / rate, 1) if job["status"] == RUNNING and rate > 0 else None,
+        "missing": job.get("missing"),
+        "error": job.get("error"),
+    }
+    if job["status"] == DONE and job.get("missing") == 0:
+        view["cutover"] = {
+            "EMBEDDING_FIELD": job["field"],
+            "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": job["deployment"],
+            "EMBEDDING_DIMENSIONS": job.get("dimensions") or 0,
+        }
+    return view
+
+
+def _claim(job_id: str, index: int) -> Optional[dict]:
+    """
+    Lease a range of the job so a redelivered message doesn't run it twice at once.
+    """
+    from pymongo import ReturnDocument
+
+    now = datetime.now(timezone.utc)
+    return _ranges().find_one_and_update(
+        {
+            "_id": range_id(job_id, index),
+            "status": RUNNING,
+            "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+        },
+        {"$set": {"lease_until": now + timedelta(seconds=settings.WORK_LEASE_SECONDS), "updated_at": now}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _retry_at(job_id: str, index: int) -> Optional[datetime]:
+    """
+    For a range _claim refused: when it can be claimed again (its lease
+    expiry), or None if it is done and the message can go.
+    """
+    work = _ranges().find_one({"_id": range_id(job_id, index), "status": RUNNING}, {"lease_until": 1})
+    if work is None:
+        return None
+    return work.get("lease_until") or datetime.now(timezone.utc)
+
+
+def _checkpoint(job_id: str, index: int, expected_cursor, cursor, counts: Dict[str, int]) -> bool:
+    """
+    Advance a range's _id cursor atomically and fold the batch into the job.
+    False means another worker took the range over and this one must stop.
+    """
+    now = datetime.now(timezone.utc)
+    result = _ranges().update_one(
+        {"_id": range_id(job_id, index), "cursor": expected_cursor, "status": RUNNING},
+        {"$set": {"cursor": cursor, "updated_at": now}, "$inc": {"chunks_done": counts["chunks_done"]}},
+    )
+    if result.modified_count != 1:
+        return False
+    _jobs().update_one({"_id": job_id}, {"$inc": counts, "$set": {"updated_at": now}})
+    return True
+
+
+def _release(job_id: str, index: int) -> None:
+    _ranges().update_one({"_id": range_id(job_id, index)}, {"$set": {"lease_until": None}})
+
+
+def _complete(job_id: str, index: int) -> None:
+    """
+    Mark a range done once; the last range completes the job and records
+    how many chunks still lack the field (0 means ready for cutover).
+    """
+    from pymongo import ReturnDocument
+
+    jobs = _jobs()
+    now = datetime.now(timezone.utc)
+    marked = _ranges().update_one(
+        {"_id": range_id(job_id, index), "status": RUNNING},
+        {"$set": {"status": DONE, "lease_until": None, "updated_at": now}},
+    )
+    if marked.modified_count != 1:
+        return
+
+    job = jobs.find_one_and_update(
+        {"_id": job_id},
+        {"$inc": {"ranges_done": 1}, "$set": {"updated_at": now}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not job or job["ranges_done"] < job["ranges_total"]:
+        return
+
+    missing = mongo_store.collection.count_documents({**EMBEDDED, job["field"]: {"$exists": False}})
+    jobs.update_one(
+        {"_id": job_id, "status": RUNNING},
+        {"$set": {"status": DONE, "missing": missing, "completed_at": now, "updated_at": now}},
+    )
+    logging.info("Reembed job %s done: %d chunks, %d still missing %s", job_id, job["chunks_done"], missing, job["field"])
+
+
+# ---------------------------------------------------------
+# Workers
+# ---------------------------------------------------------
+
+def _estimate_tokens(texts: List[str]) -> int:
+    return sum(len(t) // 4 + 1 for t in texts)
+
+
+def _embed(texts: List[str], deployment: str, dimensions: int) -> Tuple[List[List[float]], Dict[str, int]]:
+    """
+    One throttled embeddings request, retried with backoff on 429s.
+    """
+    from openai import RateLimitError
+
+    limiter = _get_limiter()
+    counts = {"tokens": 0, "requests": 0, "rate_limited": 0}
+    with span("embeddings", inputs=len(texts)) as s:
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            limiter.acquire(_estimate_tokens(texts))
+            counts["requests"] += 1
+            try:
+                embeddings, tokens = embed_batch(texts, deployment, dimensions)
+            except RateLimitError as e:
+                counts["rate_limited"] += 1
+                s.add("rate_limited")
+                if attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise
+                retry_after = None
+                if getattr(e, "response", None) is not None:
+                    retry_after = e.response.headers.get("retry-after")
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = min(2 ** attempt, 60)
+                logging.warning("Reembed rate limited, pausing %.1fs", delay)
+                limiter.pause(delay)
+                continue
+            s.add("batches")
+            s.add("tokens", tokens)
+            counts["tokens"] = tokens
+            if len(embeddings) != len(texts):
+                raise RuntimeError(f"embedding mismatch: texts={len(texts)} embeddings={len(embeddings)}")
+            return embeddings, counts
+    raise AssertionError("unreachable")
+
+
+def run_range(job_id: str, index: int, deadline: float) -> bool:
+    """
+    Re-embed the chunks of one _id range that lack the target field,
+    REEMBED_CONCURRENCY batches at a time, checkpointing the cursor after
+    each round. Stops when the range is exhausted or the time.monotonic()
+    deadline passes.
+    Returns True when there is nothing left for this worker to do, False when
+    the caller should schedule a continuation of the range.
+    """
+    from pymongo import UpdateOne
+
+    job = get_job(job_id)
+    if not job or job["status"] != RUNNING:
+        logging.info("Reembed job %s no longer running, skipping range %d", job_id, index)
+        return True
+
+    work = _claim(job_id, index)
+    if work is None:
+        retry = _retry_at(job_id, index)
+        if retry is None:
+            logging.info("Reembed range %s already done", range_id(job_id, index))
+            return True
+        # Leased: the holder may have crashed, try again once its lease expires
+        delay = delay_until(retry)
+        logging.info("Reembed range %s leased, retrying in %ds", range_id(job_id, index), delay)
+        enqueue_range(job_id, index, delay)
+        return True
+
+    collection = mongo_store.collection
+    if collection is None:
+        raise RuntimeError("MongoDB collection not available")
+
+    field = job["field"]
+    batch_size = max(1, settings.REEMBED_BATCH_SIZE)
+    concurrency = max(1, settings.REEMBED_CONCURRENCY)
+    pool = _get_pool()
+    cursor = work["cursor"]
+
+    while True:
+        bounds = {}
+        if cursor is not None:
+            bounds["$gt"] = cursor
+        elif work["lo"] is not None:
+            bounds["$gte"] = work["lo"]
+        if work["hi"] is not None:
+            bounds["$lt"] = work["hi"]
+        query = {**EMBEDDED, field: {"$exists": False}}
+        if bounds:
+            query["_id"] = bounds
+
+        with span("mongo_fetch") as s:
+            docs = list(collection.find(query, {"text": 1}).sort("_id", 1).limit(batch_size * concurrency))
+            s.set(docs_scanned=len(docs))
+        if not docs:
+            break
+
+        # Empty chunks still get a vector so they aren't reported missing
+        texts = [d.get("text") or " " for d in docs]
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        try:
+            # Workers record their spans into the message's trace
+            futures = [
+                pool.submit(contextvars.copy_context().run, _embed, b, job["deployment"], job.get("dimensions") or 0)
+                for b in batches
+            ]
+            results = [f.result() for f in futures]
+        except Exception as e:
+            _jobs().update_one({"_id": job_id}, {"$set": {"error": str(e)}})
+            _release(job_id, index)
+            raise
+
+        embeddings = [emb for embs, _ in results for emb in embs]
+        counts = {"chunks_done": len(docs), "tokens": 0, "requests": 0, "rate_limited": 0}
+        for _, c in results:
+            for k, v in c.items():
+                counts[k] += v
+
+        with span("mongo_write", docs=len(docs)):
+            collection.bulk_write(
+                [UpdateOne({"_id": d["_id"]}, {"$set": {field: emb}}) for d, emb in zip(docs, embeddings)],
+                ordered=False,
+            )
+
+        last = docs[-1]["_id"]
+        if not _checkpoint(job_id, index, cursor, last, counts):
+            logging.info("Reembed range %s taken over by another worker", range_id(job_id, index))
+            return True
+        cursor = last
+
+        if time.monotonic() >= deadline:
+            logging.info("Time budget reached for reembed range %s", range_id(job_id, index))
+            _release(job_id, index)
+            return False
+
+    _complete(job_id, index)
+    return True
+
+
+def enqueue_range(job_id: str, index: int, delay_seconds: Optional[int] = None) -> None:
+    enqueue(settings.REEMBED_QUEUE_NAME, {"job_id": job_id, "range": index}, delay_seconds)
+
+
+def process_reembed_message(payload: dict) -> None:
+    """
+    Queue worker entry point: re-embed (or continue) one _id range of a job.
+    """
+    deadline = time.monotonic() + settings.INGEST_TIME_BUDGET_SECONDS
+    if _jobs() is None or _ranges() is None:
+        raise RuntimeError("MongoDB not available")
+    if not run_range(payload["job_id"], payload["range"], deadline):
+        enqueue_range(payload["job_id"], payload["range"])
+
+
+# In-memory queue backend dispatches reembed messages here
+register_handler(settings.REEMBED_QUEUE_NAME, process_reembed_message)
@@ -0,0 +1,123 @@
+import logging
+import time
+import numpy as np
+from typing import List, Dict, Optional
+from config.settings import settings
+from services.tracing import span
+
+
+def mmr_rerank(
+    query_embedding: List[float],
+    docs: List[Dict],
+    top_k: int,
+    lambda_mult: float = 0.5,
+    relevance: Optional[np.ndarray] = None,
+) -> List[Dict]:
+    """
+    Maximal Marginal Relevance selection over the docs' own embeddings.
+    lambda_mult=1.0 is pure relevance, 0.0 is pure diversity.
+    relevance overrides the query cosine (e.g. with reranker scores).
+    """
+    if not docs or top_k <= 0:
+        return []
+    if len(docs) <= 1:
+        return docs[:top_k]
+
+    matrix = np.array([d.get("embedding", []) for d in docs], dtype=np.float32)
+    query_vec = np.array(query_embedding, dtype=np.float32)
+    if matrix.ndim != 2 or matrix.shape[1] != query_vec.shape[0]:
+        logging.warning("MMR skipped: embedding shape mismatch")
+        return docs[:top_k]
+
+    # Normalize once so every similarity below is a plain dot product
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+    q_norm = np.linalg.norm(query_vec)
+    if q_norm > 0:
+        query_vec = query_vec / q_norm
+
+    if relevance is None:
+        relevance = matrix @ query_vec
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    pairwise = matrix @ matrix.T
+
+    n = len(docs)
+    k = min(top_k, n)
+    selected: List[int] = []
+    # Highest similarity of each candidate to anything already selected
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    for _ in range(k):
+        if selected:
+            mmr = lambda_mult * relevance - (1.0 - lambda_mult) * max_sim
+        else:
+            mmr = relevance.copy()
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, pairwise[:, best])
+
+    return [docs[i] for i in selected]
+
+
+def _mmr_stage(query_embedding, question, docs, keep):
+    # Use reranker scores as relevance when an earlier stage produced them
+    relevance = None
+    if docs and all("rerank_score" in d for d in docs):
+        relevance = np.array([d["rerank_score"] for d in docs], dtype=np.float32)
+    return mmr_rerank(
+        query_embedding, docs, keep, lambda_mult=settings.MMR_LAMBDA, relevance=relevance
+    )
+
+
+def _cross_encoder_stage(query_embedding, question, docs, keep):
+    from services.cross_encoder import cross_encoder_rerank
+    return cross_encoder_rerank(question, docs, keep)
+
+
+# Registry of rerank stages: name -> fn(query_embedding, question, docs, keep)
+RERANK_STAGES = {
+    "cross_encoder": _cross_encoder_stage,
+    "mmr": _mmr_stage,
+}
+
+
+def rerank_chunks(
+    query_embedding: List[float],
+    question: str,
+    chunks: List[Dict],
+    top_k: int,
+    stages: Optional[List[str]] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> List[Dict]:
+    """
+    Run the configured rerank stages between retrieval and prompt building.
+    Intermediate stages may reorder/filter; the last one picks the final top_k.
+    If timings is given, the added latency of each stage (ms) is recorded in it.
+    """
+    if stages is None:
+        stages = settings.RERANK_STAGES
+
+    active = [s for s in stages if s in RERANK_STAGES]
+    for name in stages:
+        if name not in RERANK_STAGES:
+            logging.warning(f"Unknown rerank stage '{name}' ignored")
+
+    docs = chunks
+    for i, name in enumerate(active):
+        keep = top_k if i == len(active) - 1 else len(docs)
+        start = time.perf_counter()
+        with span(f"rerank.{name}", docs_in=len(docs)) as s:
+            try:
+                docs = RERANK_STAGES[name](query_embedding, question, docs, keep)
+            except Exception:
+                logging.exception(f"Rerank stage '{name}' failed, keeping previous order")
+                s.set(error="stage_failed")
+            s.set(docs_out=min(len(docs), top_k) if i == len(active) - 1 else len(docs))
+        if timings is not None:
+            timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    return docs[:top_k]
@@ -0,0 +1,200 @@
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    from services.vector_index import VectorIndex
+
+# Distinct filters whose row masks are kept per cached index
+MASK_CACHE_SIZE = 64
+
+
+def _int(value, name: str) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer")
+
+
+def _date(value, name: str) -> Optional[str]:
+    """
+    Chunk dates are stored as YYYYMMDD (see pdf_processor.extract_metadata);
+    accept that or YYYY-MM-DD / YYYY-MM / YYYY.
+    """
+    if value is None or value == "":
+        return None
+    digits = re.sub(r"[-/]", "", str(value).strip())
+    if not digits.isdigit() or len(digits) not in (4, 6, 8):
+        raise ValueError(f"'{name}' must be a date like YYYY-MM-DD")
+    return digits
+
+
+def _range(low, high, name: str) -> Tuple:
+    if low is not None and high is not None and low > high:
+        raise ValueError(f"empty {name} range")
+    return low, high
+
+
+class SearchFilter:
+    """
+    Structured retrieval filter on chunk metadata: PDFs, year range, date
+    range and page range (a chunk matches if its pages overlap the range).
+    Evaluated as a row mask on cached vector indexes and as a Mongo query
+    on the streaming scan.
+    """
+
+    def __init__(
+        self,
+        pdf_names: Optional[List[str]] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        page_from: Optional[int] = None,
+        page_to: Optional[int] = None,
+    ):
+        self.pdf_names = sorted(set(pdf_names)) if pdf_names else None
+        self.year_from, self.year_to = _range(year_from, year_to, "year")
+        self.date_from, self.date_to = date_from, date_to
+        self.page_from, self.page_to = _range(page_from, page_to, "page")
+
+    @classmethod
+    def from_request(cls, body: Dict, pdf_name=None) -> "SearchFilter":
+        """
+        Parse the "filters" object of a chat request:
+        {"pdf_names": [...], "year": 2021 | "year_from"/"year_to",
+         "date_from"/"date_to", "page_from"/"page_to"}.
+        pdf_name (str or list) is the request's filename scope, if any.
+        Raises ValueError on malformed values.
+        """
+        raw = body.get("filters") or {}
+        if not isinstance(raw, dict):
+            raise ValueError("'filters' must be an object")
+
+        names = raw.get("pdf_names") or pdf_name or []
+        if isinstance(names, str):
+            names = [names]
+        if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+            raise ValueError("'pdf_names' must be a list of file names")
+
+        year = _int(raw.get("year"), "year")
+        year_from = _int(raw.get("year_from"), "year_from")
+        year_to = _int(raw.get("year_to"), "year_to")
+        if year is not None:
+            year_from = year_to = year
+
+        date_from = _date(raw.get("date_from"), "date_from")
+        date_to = _date(raw.get("date_to"), "date_to")
+        # Partial bounds cover the whole month/year
+        if date_from is not None:
+            date_from = date_from.ljust(8, "0")
+        if date_to is not None:
+            date_to = date_to.ljust(8, "9")
+        _range(date_from, date_to, "date")
+
+        return cls(
+            pdf_names=names or None,
+            year_from=year_from,
+            year_to=year_to,
+            date_from=date_from,
+            date_to=date_to,
+            page_from=_int(raw.get("page_from"), "page_from"),
+            page_to=_int(raw.get("page_to"), "page_to"),
+        )
+
+    def with_pdf_names(self, pdf_names: List[str]) -> "SearchFilter":
+        return SearchFilter(
+            pdf_names, self.year_from, self.year_to,
+            self.date_from, self.date_to, self.page_from, self.page_to,
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return self.key == ()
+
+    @property
+    def key(self) -> Tuple:
+        """
+        Hashable identity of the filter (mask cache key); () when empty.
+        """
+        parts = (
+            ("pdf", tuple(self.pdf_names)) if self.pdf_names else None,
+            ("year", self.year_from, self.year_to) if self.year_from is not None or self.year_to is not None else None,
+            ("date", self.date_from, self.date_to) if self.date_from or self.date_to else None,
+            ("page", self.page_from, self.page_to) if self.page_from is not None or self.page_to is not None else None,
+        )
+        return tuple(p for p in parts if p)
+
+    def to_dict(self) -> Dict:
+        return {name: value for name, *value in self.key}
+
+    def mongo_query(self) -> Dict:
+        """
+        Conditions for the streaming scan, merged into the category filter.
+        """
+        query: Dict = {}
+        if self.pdf_names:
+            query["pdf_name"] = {"$in": self.pdf_names}
+        if self.year_from is not None or self.year_to is not None:
+            query["year"] = _bounds(self.year_from, self.year_to)
+        if self.date_from or self.date_to:
+            # "" (unknown date) sorts below every bound, so it never matches
+            query["date"] = _bounds(self.date_from or "0", self.date_to)
+        if self.page_to is not None:
+            query["page_number"] = {"$lte": self.page_to}
+        if self.page_from is not None:
+            # Legacy chunks have no page_end: they cover page_number only
+            query["$or"] = [
+                {"page_end": {"$gte": self.page_from}},
+                {"page_end": {"$exists": False}, "page_number": {"$gte": self.page_from}},
+            ]
+        return query
+
+    def mask(self, index: "VectorIndex") -> Optional["np.ndarray"]:
+        """
+        Boolean row mask over a cached index (None = all rows). Built from
+        the index's metadata columns and cached on the index per filter.
+        """
+        if self.is_empty:
+            return None
+        cached = index.masks.get(self.key)
+        if cached is not None:
+            return cached
+
+        import numpy as np
+        mask = np.ones(len(index), dtype=bool)
+        if self.pdf_names:
+            # Posting lists: rows per PDF code, so this touches only the matching rows
+            codes = [index.pdf_code(n) for n in self.pdf_names]
+            mask = np.zeros(len(index), dtype=bool)
+            for code in codes:
+                if code is not None:
+                    mask[index.pdf_rows[code]] = True
+        if self.year_from is not None:
+            mask &= index.years >= self.year_from
+        if self.year_to is not None:
+            mask &= index.years <= self.year_to
+        if self.date_from or self.date_to:
+            # 0 = unknown date, never matches a date filter
+            mask &= index.dates >= max(int(self.date_from or 0), 1)
+            if self.date_to:
+                mask &= index.dates <= int(self.date_to)
+        if self.page_from is not None:
+            mask &= index.page_ends >= self.page_from
+        if self.page_to is not None:
+            mask &= index.pages <= self.page_to
+        mask = index.mask_links(mask)
+
+        index.masks.set(self.key, mask)
+        return mask
+
+
+def _bounds(low, high) -> Dict:
+    out = {}
+    if low is not None:
+        out["$gte"] = low
+    if high is not None:
+        out["$lte"] = high
+    return out
@@ -0,0 +1,364 @@
+import logging
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from services import metrics
+from services.mongo_store import mongo_store
+from services.tracing import span
+from services.ttl_cache import TTLCache
+from services.vector_search import MIN_SCORE, chunk_projection, cosine_scores
+
+# Retrieval modes of a session turn
+FULL = "full"        # regular vector search
+NARROW = "narrow"    # vector search restricted to the PDFs of the cached evidence
+REUSE = "reuse"      # no search: the cached evidence is rescored against the new query
+
+# Longest client-supplied session id accepted
+MAX_SESSION_ID = 128
+# Answer text kept per turn for the conversation history
+MAX_ANSWER_CHARS = 2000
+
+# Questions that lean on an earlier turn: connectives up front or pronouns
+_FOLLOW_UP = re.compile(
+    r"^\s*(and|also|but|so|then|what about|how about|why|how so|more|same)\b"
+    r"|\b(it|its|this|that|these|those|they|them|their|he|him|his|she|her|the same|above|former|latter)\b",
+    re.IGNORECASE,
+)
+FOLLOW_UP_MAX_WORDS = 3
+
+_REWRITE_PROMPT = (
+    "Rewrite the user's last question as a standalone search query, resolving "
+    "references to the earlier conversation. Reply with the query only."
+)
+
+
+def valid_session_id(session_id) -> bool:
+    return isinstance(session_id, str) and 0 < len(session_id) <= MAX_SESSION_ID
+
+
+def is_follow_up(question: str) -> bool:
+    return bool(_FOLLOW_UP.search(question)) or len(question.split()) <= FOLLOW_UP_MAX_WORDS
+
+
+class RetrievalPlan:
+    def __init__(self, mode: str, docs: Optional[List[Dict]] = None, pdf_names: Optional[List[str]] = None,
+                 similarity: float = 0.0):
+        self.mode = mode
+        self.docs = docs or []
+        self.pdf_names = pdf_names or []
+        self.similarity = similarity
+
+
+class Session:
+    """
+    Conversation state of one chat session: its recent turns (question,
+    standalone query, answer, query embedding) and the chunks retrieved for
+    them, which later follow-ups may reuse instead of searching again.
+    The retrieval scope (category + filters) is part of the state: a turn
+    in another scope never reuses evidence.
+    """
+
+    def __init__(self, session_id: str, scope: str = "", turns: Optional[List[Dict]] = None,
+                 chunk_ids: Optional[List] = None, pdf_names: Optional[List[str]] = None):
+        self.id = session_id
+        self.scope = scope
+        self.turns = turns or []
+        self.chunk_ids = chunk_ids or []
+        self.pdf_names = pdf_names or []
+        # Evidence docs (no embedding) and their embedding matrix; kept by the
+        # memory store, fetched by chunk id for sessions loaded from Mongo
+        self._docs: Optional[List[Dict]] = None if self.chunk_ids else []
+        self._matrix: Optional[np.ndarray] = None
+        # The current question was rewritten by prefixing the topic
+        self._anchored = False
+
+    # --- Query rewriting --------------------------------------------------
+
+    def standalone_query(self, question: str) -> str:
+        """
+        The search query for a question: follow-ups are rewritten to stand
+        on their own (SESSION_REWRITE), other questions are kept as they are.
+        """
+        mode = settings.SESSION_REWRITE
+        if not self.turns or mode == "off" or not is_follow_up(question):
+            return question
+        if mode == "llm":
+            rewritten = self._llm_rewrite(question)
+            if rewritten:
+                return rewritten
+        # Heuristic: anchor the follow-up on the topic of the conversation
+        self._anchored = True
+        return f"{self.turns[-1]['topic']} {question}"
+
+    def _llm_rewrite(self, question: str) -> Optional[str]:
+        from services.llm_router import get_router
+
+        history = "\n".join(
+            f"User: {t['question']}\nAssistant: {t['answer'][:300]}"
+            for t in self.turns[-settings.SESSION_HISTORY_TURNS:]
+        )
+        messages = [
+            {"role": "system", "content": _REWRITE_PROMPT},
+            {"role": "user", "content": f"Conversation:\n{history}\n\nLast question:\n{question}"},
+        ]
+        with span("rewrite_query") as s:
+            try:
+                content, provider, _ = get_router().complete(messages, temperature=0.0, max_tokens=64)
+                s.set(provider=provider.name)
+            except Exception as e:
+                logging.warning(f"Session query rewrite failed, using heuristic: {e}")
+                s.set(error="rewrite_failed")
+                return None
+        return (content or "").strip().strip('"') or None
+
+    # --- Retrieval ----------------------------------------------------------
+
+    def plan(self, query_embedding: List[float], scope: str, top_k: int) -> RetrievalPlan:
+        """
+        Decide how much retrieval a turn needs. A query close to an earlier
+        turn's (SESSION_REUSE_SIMILARITY) is answered from the cached evidence
+        when at least top_k of those chunks still clear the score floor; a
+        related one (SESSION_NARROW_SIMILARITY) is searched within the PDFs
+        the evidence came from; anything else gets a full search.
+        """
+        if not self.turns or scope != self.scope:
+            return RetrievalPlan(FULL)
+
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        previous = np.stack([t["embedding"] for t in self.turns])
+        if previous.shape[1] != len(query_vec):
+            return RetrievalPlan(FULL)
+        similarity = float(cosine_scores(query_vec, previous).max())
+
+        if similarity >= settings.SESSION_REUSE_SIMILARITY:
+            docs, matrix = self.evidence()
+            if docs and matrix.shape[1] == len(query_vec):
+                scores = cosine_scores(query_vec, matrix)
+                order = np.argsort(-scores)
+                hits = [
+                    dict(docs[i], embedding=matrix[i].tolist(), score=float(scores[i]))
+                    for i in order
+                    if scores[i] > MIN_SCORE
+                ]
+                if len(hits) >= top_k:
+                    return RetrievalPlan(REUSE, docs=hits, similarity=similarity)
+
+        if similarity >= settings.SESSION_NARROW_SIMILARITY and self.pdf_names:
+            return RetrievalPlan(NARROW, pdf_names=self.pdf_names, similarity=similarity)
+        return RetrievalPlan(FULL, similarity=similarity)
+
+    def evidence(self) -> Tuple[List[Dict], Optional[np.ndarray]]:
+        if self._docs is None:
+            self._docs, self._matrix = _fetch_chunks(self.chunk_ids)
+        return self._docs, self._matrix
+
+    def record_turn(self, question: str, query: str, query_embedding: List[float], answer: str,
+                    candidates: List[Dict], scope: str) -> None:
+        """
+        Append a turn and merge its retrieved candidates into the evidence
+        (newest first, SESSION_MAX_CHUNKS kept). A new scope starts over.
+        """
+        if scope != self.scope:
+            self.turns, self.chunk_ids, self.pdf_names = [], [], []
+            self._docs, self._matrix = [], None
+            self.scope = scope
+
+        # A heuristic rewrite only prefixes the topic; keep the original one
+        topic = self.turns[-1]["topic"] if self._anchored and self.turns else query
+        turn = {
+            "question": question,
+            "query": query,
+            "topic": topic,
+            "answer": (answer or "")[:MAX_ANSWER_CHARS],
+            "embedding": np.asarray(query_embedding, dtype=np.float32),
+        }
+        self.turns = (self.turns + [turn])[-settings.SESSION_MAX_TURNS:]
+        self._anchored = False
+
+        fresh = [d for d in candidates if d.get("_id") is not None and d.get("embedding") is not None]
+        if self._docs is None:
+            # Evidence not fetched this turn (Mongo store): merge ids only
+            ids = _unique([d["_id"] for d in fresh] + self.chunk_ids)
+            self.chunk_ids = ids[:settings.SESSION_MAX_CHUNKS]
+            self.pdf_names = sorted({d["pdf_name"] for d in fresh if d.get("pdf_name")} | set(self.pdf_names))
+            return
+
+        entries = [(d, d["embedding"]) for d in fresh]
+        if self._matrix is not None:
+            entries += [(d, self._matrix[i]) for i, d in enumerate(self._docs)]
+        docs, rows, seen = [], [], set()
+        for doc, emb in entries:
+            if doc["_id"] in seen:
+                continue
+            seen.add(doc["_id"])
+            docs.append({k: v for k, v in doc.items() if k not in ("embedding", "score")})
+            rows.append(np.asarray(emb, dtype=np.float32))
+            if len(docs) >= settings.SESSION_MAX_CHUNKS:
+                break
+
+        if len({len(r) for r in rows}) > 1:
+            # Mixed dimensions (corpus re-embedded mid-session): keep the new turn's only
+            keep = len(rows[0])
+            docs, rows = zip(*[(d, r) for d, r in zip(docs, rows) if len(r) == keep])
+            docs, rows = list(docs), list(rows)
+        self._docs = docs
+        self._matrix = np.stack(rows) if rows else None
+        self.chunk_ids = [d["_id"] for d in docs]
+        self.pdf_names = sorted({d["pdf_name"] for d in docs if d.get("pdf_name")})
+
+    def history_messages(self) -> List[Dict[str, str]]:
+        """
+        The last SESSION_HISTORY_TURNS exchanges as chat messages.
+        """
+        messages = []
+        for t in self.turns[-settings.SESSION_HISTORY_TURNS:] if settings.SESSION_HISTORY_TURNS > 0 else []:
+            messages.append({"role": "user", "content": t["question"]})
+            messages.append({"role": "assistant", "content": t["answer"]})
+        return messages
+
+    # --- Persistence (Mongo store) -----------------------------------------
+
+    def to_doc(self) -> Dict:
+        return {
+            "_id": self.id,
+            "scope": self.scope,
+            "turns": [dict(t, embedding=t["embedding"].tolist()) for t in self.turns],
+            "chunk_ids": self.chunk_ids,
+            "pdf_names": self.pdf_names,
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict) -> "Session":
+        turns = [dict(t, embedding=np.asarray(t["embedding"], dtype=np.float32)) for t in doc.get("turns", [])]
+        return cls(doc["_id"], doc.get("scope", ""), turns, doc.get("chunk_ids"), doc.get("pdf_names"))
+
+
+def _unique(values: List) -> List:
+    seen = set()
+    return [v for v in values if not (v in seen or seen.add(v))]
+
+
+def _fetch_chunks(chunk_ids: List) -> Tuple[List[Dict], Optional[np.ndarray]]:
+    """
+    Evidence chunks by _id, in the given order (deleted chunks are dropped).
+    """
+    collection = mongo_store.collection
+    if not chunk_ids or collection is None:
+        return [], None
+    with span("fetch_docs", docs=len(chunk_ids)) as s:
+        field = settings.EMBEDDING_FIELD
+        found = {d["_id"]: d for d in collection.find({"_id": {"$in": list(chunk_ids)}}, chunk_projection(True))}
+        # Near-duplicate chunks are scored with their canonical chunk's embedding
+        canonical = {d["duplicate_of"] for d in found.values() if not d.get(field) and d.get("duplicate_of") is not None}
+        shared = {}
+        if canonical:
+            shared = {c["_id"]: c.get(field) for c in collection.find({"_id": {"$in": list(canonical)}}, {field: 1})}
+        s.set(docs_scanned=len(found) + len(canonical))
+    docs, rows = [], []
+    for chunk_id in chunk_ids:
+        doc = found.get(chunk_id)
+        if doc is None:
+            continue
+        emb = doc.get(field) or shared.get(doc.get("duplicate_of"))
+        if emb:
+            rows.append(np.asarray(emb, dtype=np.float32))
+            docs.append({k: v for k, v in doc.items() if k != field})
+    if rows and len({len(r) for r in rows}) > 1:
+        # Mixed dimensions (re-embedded corpus): not reusable
+        return [], None
+    return docs, np.stack(rows) if rows else None
+
+
+class MemorySessionStore:
+    """
+    Sessions of this instance only, LRU-bounded with idle TTL.
+    """
+
+    def __init__(self):
+        self.cache = TTLCache(settings.SESSION_TTL_SECONDS, max_size=settings.SESSION_MAX_SESSIONS)
+        metrics.REGISTRY.register_cache("sessions", self.cache)
+
+    def load(self, session_id: str) -> Optional[Session]:
+        return self.cache.get(session_id)
+
+    def save(self, session: Session) -> None:
+        self.cache.set(session.id, session)
+
+
+class MongoSessionStore:
+    """
+    Sessions shared by every instance in SESSION_COLLECTION. Evidence is
+    stored as chunk ids and fetched again when a follow-up reuses it;
+    expired sessions are removed by a TTL index on expires_at.
+    """
+
+    def __init__(self):
+        self._indexes_ready = False
+        self._lock = threading.Lock()
+
+    def _col(self):
+        col = mongo_store.get_collection(settings.SESSION_COLLECTION)
+        if col is None or self._indexes_ready:
+            return col
+        with self._lock:
+            if not self._indexes_ready:
+                try:
+                    col.create_index("expires_at", expireAfterSeconds=0)
+                except Exception:
+                    logging.exception("Failed to create session TTL index")
+                self._indexes_ready = True
+        return col
+
+    def load(self, session_id: str) -> Optional[Session]:
+        col = self._col()
+        if col is None:
+            return None
+        # The TTL monitor runs about once a minute: check expiry here too
+        doc = col.find_one({"_id": session_id, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        return Session.from_doc(doc) if doc else None
+
+    def save(self, session: Session) -> None:
+        col = self._col()
+        if col is None:
+            return
+        doc = session.to_doc()
+        doc["expires_at"] = datetime.now(timezone.utc) + timedelta(seconds=settings.SESSION_TTL_SECONDS)
+        col.replace_one({"_id": session.id}, doc, upsert=True)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MongoSessionStore() if settings.SESSION_STORE == "mongo" else MemorySessionStore()
+    return _store
+
+
+def load_session(session_id: str) -> Session:
+    """
+    The stored session, or a new empty one. Store errors degrade to a
+    stateless turn rather than failing the chat request.
+    """
+    try:
+        session = get_store().load(session_id)
+    except Exception:
+        logging.exception("Failed to load chat session")
+        session = None
+    return session or Session(session_id)
+
+
+def save_session(session: Session) -> None:
+    try:
+        get_store().save(session)
+    except Exception:
+        logging.exception("Failed to save chat session")
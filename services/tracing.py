@@ -0,0 +1,236 @@
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from config.settings import settings
+
+# Active trace / innermost open span of the current invocation
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+_otel_warned = False
+
+
+class Span:
+    """
+    One timed stage. Attributes are free-form (doc counts, bytes, tokens, cache hits).
+    """
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attrs")
+
+    def __init__(self, name: str, parent_id: Optional[int], span_id: int, attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+
+class _NoopSpan:
+    """
+    Returned when no trace is recording: every call is a cheap no-op.
+    """
+
+    __slots__ = ()
+    attrs: Dict[str, Any] = {}
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def add(self, key: str, amount: float = 1) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, name: str, request_id: Optional[str] = None):
+        self.trace_id = request_id or uuid.uuid4().hex
+        self.name = name
+        self.wall_start_ns = time.time_ns()
+        self.perf_start = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def new_span(self, name: str, parent: Optional[Span], attrs: Dict[str, Any]) -> Span:
+        with self._lock:
+            span = Span(name, parent.span_id if parent else None, len(self.spans), attrs)
+            self.spans.append(span)
+        return span
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "total_ms": round(self.root.duration_ms, 2),
+            "spans": [
+                {
+                    "id": s.span_id,
+                    "parent": s.parent_id,
+                    "name": s.name,
+                    "start_ms": round((s.start - self.perf_start) * 1000, 2),
+                    "duration_ms": round(s.duration_ms, 2),
+                    "attrs": s.attrs,
+                }
+                for s in self.spans
+            ],
+        }
+
+    def stage_ms(self) -> Dict[str, float]:
+        """
+        Total milliseconds per span name (children of the root and below).
+        """
+        out: Dict[str, float] = {}
+        for s in self.spans[1:]:
+            out[s.name] = round(out.get(s.name, 0.0) + s.duration_ms, 2)
+        return out
+
+
+def _export(tr: Trace) -> None:
+    if settings.METRICS_ENABLED:
+        from services.metrics import record_trace
+        record_trace(tr)
+
+    exporter = settings.TRACING_EXPORTER
+    if exporter == "log":
+        logging.info("trace %s", json.dumps(tr.to_dict(), default=str))
+    elif exporter == "otel":
+        _export_otel(tr)
+
+
+def _export_otel(tr: Trace) -> None:
+    """
+    Replay the finished trace through the OpenTelemetry API, so whatever SDK /
+    exporter the host configured (e.g. Azure Monitor) receives it.
+    """
+    global _otel_warned
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        if not _otel_warned:
+            logging.warning("TRACING_EXPORTER=otel but opentelemetry-api is not installed")
+            _otel_warned = True
+        return
+
+    tracer = otel_trace.get_tracer("pdfrag")
+
+    def to_ns(t: float) -> int:
+        return tr.wall_start_ns + int((t - tr.perf_start) * 1e9)
+
+    otel_spans: Dict[int, Any] = {}
+    for s in tr.spans:
+        parent = otel_spans.get(s.parent_id)
+        ctx = otel_trace.set_span_in_context(parent) if parent is not None else None
+        attrs = {k: v for k, v in s.attrs.items() if isinstance(v, (str, bool, int, float))}
+        if s.parent_id is None:
+            attrs["pdfrag.trace_id"] = tr.trace_id
+        otel_spans[s.span_id] = tracer.start_span(s.name, context=ctx, start_time=to_ns(s.start), attributes=attrs)
+    for s in reversed(tr.spans):
+        otel_spans[s.span_id].end(end_time=to_ns(s.end if s.end is not None else time.perf_counter()))
+
+
+@contextmanager
+def trace(name: str, request_id: Optional[str] = None, record: bool = False, **attrs) -> Iterator[Optional[Trace]]:
+    """
+    Root of one invocation's spans. Records when TRACING_EXPORTER or
+    METRICS_ENABLED is set, or record=True (chat debug); otherwise yields
+    None and spans are no-ops.
+    Inside an already active trace it is just a nested span.
+    """
+    active = _current_trace.get()
+    if active is not None:
+        with span(name, **attrs):
+            yield active
+        return
+
+    if not record and settings.TRACING_EXPORTER == "none" and not settings.METRICS_ENABLED:
+        yield None
+        return
+
+    tr = Trace(name, request_id)
+    root = tr.new_span(name, None, dict(attrs))
+    t_token = _current_trace.set(tr)
+    s_token = _current_span.set(root)
+    try:
+        yield tr
+    except BaseException as exc:
+        root.set(error=type(exc).__name__)
+        raise
+    finally:
+        root.end = time.perf_counter()
+        _current_span.reset(s_token)
+        _current_trace.reset(t_token)
+        try:
+            _export(tr)
+        except Exception:
+            logging.exception("Trace export failed")
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time one stage of the current trace: `with span("mongo_fetch") as s: s.set(docs=n)`.
+    """
+    tr = _current_trace.get()
+    if tr is None:
+        yield NOOP_SPAN
+        return
+
+    s = tr.new_span(name, _current_span.get(), dict(attrs))
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as exc:
+        s.set(error=type(exc).__name__)
+        raise
+    finally:
+        s.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def current_span():
+    """
+    Innermost open span (or the no-op span), for annotating from nested code.
+    """
+    return _current_span.get() or NOOP_SPAN
+
+
+def traced(name: str):
+    """
+    Decorator for function entry points: one trace per invocation, tagged
+    with the status code when the function returns an HttpResponse.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace(name):
+                response = fn(*args, **kwargs)
+                status = getattr(response, "status_code", None)
+                if status is not None:
+                    current_span().set(status=status)
+                return response
+        return wrapper
+    return decorator
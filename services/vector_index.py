@@ -0,0 +1,460 @@
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from services import catalog, metrics
+from services.mongo_store import mongo_store
+from services.search_filters import MASK_CACHE_SIZE
+from services.tracing import span
+from services.ttl_cache import TTLCache
+
+# Rows fetched per Mongo batch while building
+BUILD_BATCH = 2000
+
+# Rows the PCA projection of a reduced-dimension index is fitted on
+PCA_SAMPLE_ROWS = 4096
+
+
+# Chunk metadata kept per row for filter masks (see services/search_filters.py)
+META_FIELDS = {"pdf_name": 1, "year": 1, "date": 1, "page_number": 1, "page_end": 1, "duplicate_of": 1}
+
+
+def _date_int(value) -> int:
+    # Stored as "YYYYMMDD"; 0 = unknown
+    value = str(value or "")
+    return int(value) if len(value) == 8 and value.isdigit() else 0
+
+
+class VectorIndex:
+    """
+    In-memory search matrix of one category (or of the whole collection):
+    L2-normalized float32 rows plus the chunk _ids and the metadata columns
+    filters run on (PDF code, year, date, pages). Chunk bodies stay in
+    Mongo and are fetched for the final top-k only.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        ids: List,
+        matrix: np.ndarray,
+        pdf_codes: np.ndarray,
+        pdf_names: List[str],
+        generation: int,
+        build_ms: float,
+        years: Optional[np.ndarray] = None,
+        dates: Optional[np.ndarray] = None,
+        pages: Optional[np.ndarray] = None,
+        page_ends: Optional[np.ndarray] = None,
+        full_dim: Optional[int] = None,
+        projection: Optional[np.ndarray] = None,
+        canonical_rows: Optional[np.ndarray] = None,
+    ):
+        self.key = key
+        self.ids = ids
+        self.matrix = matrix
+        self.pdf_codes = pdf_codes
+        self.pdf_names = pdf_names
+        self.generation = generation
+        self.build_ms = build_ms
+        self.built_at = time.monotonic()
+        # Rows may hold a reduced copy (VECTOR_INDEX_REDUCED_DIM) of full_dim embeddings
+        self.full_dim = full_dim or matrix.shape[1]
+        self.projection = projection
+        # Rows past `primary` are near-duplicate chunks (services/near_dup.py)
+        # scored with the matrix row of their canonical chunk
+        self.primary = len(matrix)
+        self.canonical_rows = canonical_rows if canonical_rows is not None else np.empty(0, dtype=np.int32)
+
+        n = len(ids)
+        self.years = years if years is not None else np.zeros(n, dtype=np.int16)
+        self.dates = dates if dates is not None else np.zeros(n, dtype=np.int32)
+        self.pages = pages if pages is not None else np.zeros(n, dtype=np.int32)
+        self.page_ends = page_ends if page_ends is not None else self.pages
+
+        # Posting list per PDF code: sorted row indices of that PDF's chunks
+        self._pdf_lookup = {name: code for code, name in enumerate(pdf_names)}
+        order = np.argsort(pdf_codes, kind="stable")
+        self.pdf_rows = np.split(order, np.cumsum(np.bincount(pdf_codes, minlength=len(pdf_names)))[:-1])
+
+        # Row masks of recently used filters
+        self.masks = TTLCache(settings.VECTOR_INDEX_TTL_SECONDS, max_size=MASK_CACHE_SIZE)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        # Dimension of the stored embeddings (and of the queries it accepts)
+        return self.full_dim
+
+    @property
+    def search_dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def reduced(self) -> bool:
+        """
+        True when rows are truncated/projected: scores are approximate and
+        hits need rescoring against the full embeddings.
+        """
+        return self.search_dim != self.full_dim
+
+    def project(self, query_vec: np.ndarray) -> np.ndarray:
+        if self.projection is not None:
+            return query_vec @ self.projection
+        return query_vec[: self.search_dim]
+
+    @property
+    def nbytes(self) -> int:
+        # ids are Python objects (~100 bytes each with the list slot),
+        # posting lists one int64 per row
+        columns = self.years.nbytes + self.dates.nbytes + self.pages.nbytes + self.page_ends.nbytes
+        columns += self.canonical_rows.nbytes
+        if self.projection is not None:
+            columns += self.projection.nbytes
+        return self.matrix.nbytes + self.pdf_codes.nbytes + columns + len(self.ids) * 108
+
+    def pdf_code(self, pdf_name: str) -> Optional[int]:
+        return self._pdf_lookup.get(pdf_name)
+
+    def row_vector(self, row: int) -> np.ndarray:
+        if row >= self.primary:
+            row = self.canonical_rows[row - self.primary]
+        return self.matrix[row]
+
+    def mask_links(self, mask: np.ndarray) -> np.ndarray:
+        """
+        A near-duplicate row stands in for its canonical chunk only when the
+        filter excludes the canonical one (e.g. scoped to the other PDF).
+        """
+        if len(self.canonical_rows):
+            mask[self.primary:] &= ~mask[self.canonical_rows]
+        return mask
+
+    def search(
+        self,
+        query_vec: np.ndarray,
+        top_k: int,
+        mask: Optional[np.ndarray] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row indices and cosine scores of the top_k rows, best first.
+        With a boolean row mask only the selected rows can be returned;
+        start/stop limit the search to a row range (one shard of the index).
+        Near-duplicate rows are only reachable through a mask.
+        Scores of a reduced index are approximate (see reduced).
+        """
+        stop = len(self.ids) if stop is None else min(stop, len(self.ids))
+        if mask is None:
+            stop = min(stop, self.primary)
+        if self.reduced:
+            query_vec = self.project(query_vec)
+        norm = np.linalg.norm(query_vec)
+        if norm == 0 or stop <= start:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query_vec = (query_vec / norm).astype(np.float32)
+
+        rows, scores = self._search_primary(query_vec, top_k, mask, start, min(stop, self.primary))
+        if stop <= self.primary:
+            return rows, scores
+
+        lo = max(start, self.primary)
+        linked = np.flatnonzero(mask[lo:stop]) + lo
+        if not len(linked):
+            return rows, scores
+        rows = np.concatenate([rows, linked])
+        scores = np.concatenate([scores, self.matrix[self.canonical_rows[linked - self.primary]] @ query_vec])
+        k = min(top_k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def _search_primary(
+        self, query_vec: np.ndarray, top_k: int, mask: Optional[np.ndarray], start: int, stop: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if stop <= start:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        matrix = self.matrix[start:stop]
+
+        rows = None
+        candidates = len(matrix)
+        if mask is None:
+            scores = matrix @ query_vec
+        else:
+            mask = mask[start:stop]
+            rows = np.flatnonzero(mask)
+            candidates = len(rows)
+            if not candidates:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            if candidates * 2 < len(matrix):
+                # Selective filter: score only the matching rows
+                scores = matrix[rows] @ query_vec
+            else:
+                # Broad filter: one full product is cheaper than the gather
+                scores = matrix @ query_vec
+                scores[~mask] = -np.inf
+                rows = None
+
+        k = min(top_k, candidates)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return rows[top] + start, scores[top]
+        return top + start, scores[top]
+
+
+class _Reducer:
+    """
+    Turns the full-dimension blocks of an index build into the first-pass
+    rows: unchanged, truncated to the leading dims (Matryoshka-trained models
+    such as text-embedding-3-*) or projected on the top PCA components,
+    fitted on the first PCA_SAMPLE_ROWS rows. Rows are L2-normalized first.
+    """
+
+    def __init__(self, full_dim: int):
+        target = settings.VECTOR_INDEX_REDUCED_DIM
+        self.dim = target if 0 < target < full_dim else full_dim
+        self.method = settings.VECTOR_INDEX_REDUCTION
+        self.projection: Optional[np.ndarray] = None
+        self.blocks: List[np.ndarray] = []
+        self._pending: List[np.ndarray] = []
+
+    def add(self, block: np.ndarray) -> None:
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        np.divide(block, norms, out=block, where=norms > 0)
+        if self.dim == block.shape[1]:
+            self.blocks.append(block)
+        elif self.method != "pca":
+            self.blocks.append(np.ascontiguousarray(block[:, : self.dim]))
+        elif self.projection is not None:
+            self.blocks.append(block @ self.projection)
+        else:
+            self._pending.append(block)
+            if sum(len(b) for b in self._pending) >= PCA_SAMPLE_ROWS:
+                self._fit()
+
+    def _fit(self) -> None:
+        sample = np.vstack(self._pending)
+        if len(sample) < self.dim:
+            # Too few rows to estimate the components: keep full vectors
+            self.dim = sample.shape[1]
+            self.blocks.extend(self._pending)
+        else:
+            # Uncentered: the components that best preserve dot products
+            _, _, vt = np.linalg.svd(sample, full_matrices=False)
+            self.projection = np.ascontiguousarray(vt[: self.dim].T, dtype=np.float32)
+            self.blocks.extend(b @ self.projection for b in self._pending)
+        self._pending = []
+
+    def finish(self) -> np.ndarray:
+        if self._pending:
+            self._fit()
+        matrix = np.vstack(self.blocks) if self.blocks else np.empty((0, self.dim), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+# key -> index, least recently used first
+_indexes: "OrderedDict[str, VectorIndex]" = OrderedDict()
+_lock = threading.Lock()
+_build_locks: Dict[str, threading.Lock] = {}
+
+
+def _key(category: Optional[str]) -> str:
+    return category.lower() if category and category.lower() != "all" else catalog.ALL_CATEGORIES
+
+
+def _budget_bytes() -> int:
+    return settings.VECTOR_INDEX_MAX_MB * 1024 * 1024
+
+
+def _fresh(index: VectorIndex, generation: int) -> bool:
+    return (
+        index.generation == generation
+        and time.monotonic() - index.built_at < settings.VECTOR_INDEX_TTL_SECONDS
+    )
+
+
+def _build(key: str, generation: int) -> Optional[VectorIndex]:
+    collection = mongo_store.collection
+    if collection is None:
+        return None
+    mongo_filter = {} if key == catalog.ALL_CATEGORIES else {"category": key}
+
+    # Skip categories that cannot fit the budget (search falls back to a streaming scan)
+    field = settings.EMBEDDING_FIELD
+    sample = collection.find_one({**mongo_filter, field: {"$exists": True}}, {field: 1})
+    if not sample or not sample.get(field):
+        return None
+    full_dim = len(sample[field])
+    search_dim = settings.VECTOR_INDEX_REDUCED_DIM or full_dim
+    estimate = collection.count_documents(mongo_filter) * min(search_dim, full_dim) * 4
+    if estimate > _budget_bytes():
+        logging.warning(
+            "Vector index for '%s' would need ~%d MB (> VECTOR_INDEX_MAX_MB=%d), not caching",
+            key, estimate // (1024 * 1024), settings.VECTOR_INDEX_MAX_MB
+        )
+        return None
+
+    with span("build_index", scope=key) as s:
+        start = time.perf_counter()
+        ids: List = []
+        reducer = _Reducer(full_dim)
+        rows: List[List[float]] = []
+        codes: List[int] = []
+        names: Dict[str, int] = {}
+        years: List[int] = []
+        dates: List[int] = []
+        pages: List[int] = []
+        page_ends: List[int] = []
+        dims: Counter = Counter()
+        links: List[Dict] = []
+
+        def add_meta(doc: Dict) -> None:
+            ids.append(doc["_id"])
+            codes.append(names.setdefault(doc.get("pdf_name", ""), len(names)))
+            years.append(int(doc.get("year") or 0))
+            dates.append(_date_int(doc.get("date")))
+            page = int(doc.get("page_number") or 0)
+            pages.append(page)
+            page_ends.append(int(doc.get("page_end") or page))
+
+        cursor = collection.find(mongo_filter, {**META_FIELDS, field: 1}).batch_size(BUILD_BATCH)
+        for doc in cursor:
+            emb = doc.get(field)
+            if not emb:
+                if doc.get("duplicate_of") is not None:
+                    links.append(doc)
+                continue
+            dims[len(emb)] += 1
+            if len(emb) != full_dim:
+                continue
+            add_meta(doc)
+            rows.append(emb)
+            if len(rows) == BUILD_BATCH:
+                reducer.add(np.asarray(rows, dtype=np.float32))
+                rows = []
+        if rows:
+            reducer.add(np.asarray(rows, dtype=np.float32))
+
+        if len(dims) > 1:
+            logging.warning("Vector index '%s': mixed embedding dimensions %s, kept %d", key, dict(dims), full_dim)
+
+        matrix = reducer.finish()
+
+        # Near-duplicates go after the embedded rows, pointing at their canonical row
+        canonical_rows: List[int] = []
+        if links:
+            row_of = {_id: r for r, _id in enumerate(ids)}
+            for doc in links:
+                row = row_of.get(doc["duplicate_of"])
+                if row is not None:
+                    add_meta(doc)
+                    canonical_rows.append(row)
+
+        index = VectorIndex(
+            key, ids, matrix, np.asarray(codes, dtype=np.int32), list(names),
+            generation, (time.perf_counter() - start) * 1000,
+            years=np.asarray(years, dtype=np.int16),
+            dates=np.asarray(dates, dtype=np.int32),
+            pages=np.asarray(pages, dtype=np.int32),
+            page_ends=np.asarray(page_ends, dtype=np.int32),
+            full_dim=full_dim,
+            projection=reducer.projection,
+            canonical_rows=np.asarray(canonical_rows, dtype=np.int32),
+        )
+        s.set(rows=len(index), linked=len(canonical_rows), bytes=index.nbytes, search_dim=index.search_dim)
+
+    logging.info("Built vector index '%s': %d rows x %d dims (of %d), %.1f MB in %.0f ms",
+                 key, len(index), index.search_dim, index.dim, index.nbytes / 1e6, index.build_ms)
+    return index
+
+
+def _store(index: VectorIndex) -> None:
+    with _lock:
+        _indexes[index.key] = index
+        _indexes.move_to_end(index.key)
+        total = sum(i.nbytes for i in _indexes.values())
+        while total > _budget_bytes() and len(_indexes) > 1:
+            _, evicted = _indexes.popitem(last=False)
+            total -= evicted.nbytes
+            logging.info("Evicted vector index '%s' (%.1f MB)", evicted.key, evicted.nbytes / 1e6)
+
+
+def get_index(category: Optional[str]) -> Optional[VectorIndex]:
+    """
+    Cached index of a category (None/"all" = whole collection), rebuilt when
+    the category's chunk generation changed or the index is older than
+    VECTOR_INDEX_TTL_SECONDS. None if disabled, unavailable or over budget.
+    """
+    if not settings.VECTOR_INDEX_ENABLED:
+        return None
+
+    key = _key(category)
+    generation = catalog.get_generation(None if key == catalog.ALL_CATEGORIES else key)
+
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None and _fresh(index, generation):
+            _indexes.move_to_end(key)
+            return index
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    # One build per key at a time; concurrent requests wait for it
+    with build_lock:
+        with _lock:
+            index = _indexes.get(key)
+        if index is not None and _fresh(index, generation):
+            return index
+        try:
+            index = _build(key, generation)
+        except Exception:
+            logging.exception("Vector index build failed for '%s'", key)
+            return None
+        if index is not None:
+            _store(index)
+        return index
+
+
+def invalidate(category: Optional[str] = None) -> None:
+    with _lock:
+        if category is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(_key(category), None)
+            _indexes.pop(catalog.ALL_CATEGORIES, None)
+
+
+def stats() -> List[Dict]:
+    with _lock:
+        return [
+            {"key": i.key, "rows": len(i), "dim": i.dim, "search_dim": i.search_dim, "bytes": i.nbytes, "build_ms": round(i.build_ms, 1), "generation": i.generation}
+            for i in _indexes.values()
+        ]
+
+
+def _metrics_lines() -> List[str]:
+    indexes = stats()
+    lines = [
+        "# HELP pdfrag_vector_index_bytes Memory held per cached vector index",
+        "# TYPE pdfrag_vector_index_bytes gauge",
+    ]
+    lines += [f'pdfrag_vector_index_bytes{{scope="{i["key"]}"}} {i["bytes"]}' for i in indexes]
+    lines += [
+        "# HELP pdfrag_vector_index_rows Rows per cached vector index",
+        "# TYPE pdfrag_vector_index_rows gauge",
+    ]
+    lines += [f'pdfrag_vector_index_rows{{scope="{i["key"]}"}} {i["rows"]}' for i in indexes]
+    return lines
+
+
+metrics.REGISTRY.register_collector(_metrics_lines)
@@ -1,7 +1,68 @@
+import contextvars
+import heapq
 import logging
+import threading
+import time
 import numpy as np
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed, wait
+from typing import List, Dict, Optional, Tuple
+from config.settings import settings
+from services import catalog
 from services.mongo_store import mongo_store
+from services.search_filters import SearchFilter
+from services.tracing import span
+from services.vector_index import VectorIndex, get_index
+
+# Minimum cosine score for a chunk to be considered relevant
+MIN_SCORE = 0.15
+
+# Chunk fields returned to chat_api / rerank; vectors are added per call, so
+# other embedding versions (see services/reembed.py) never leave Mongo
+BODY_FIELDS = (
+    "text", "pdf_name", "category", "blob_path", "chunk_index", "page_number",
+    "page_end", "year", "date", "uploaded_at", "download_url", "duplicate_of",
+)
+
+
+def chunk_projection(with_embedding: bool) -> Dict:
+    """
+    Projection of a chunk body, optionally with the serving embedding
+    (settings.EMBEDDING_FIELD).
+    """
+    projection = dict.fromkeys(BODY_FIELDS, 1)
+    if with_embedding:
+        projection[settings.EMBEDDING_FIELD] = 1
+    return projection
+
+
+def serving_embedding(doc: Dict) -> Optional[List[float]]:
+    """
+    The doc's serving embedding, moved to doc["embedding"] where rerank
+    stages and callers expect it.
+    """
+    field = settings.EMBEDDING_FIELD
+    if field != "embedding":
+        doc["embedding"] = doc.pop(field, None)
+    return doc.get("embedding")
+
+
+def resolve_links(collection, docs: List[Dict]) -> None:
+    """
+    Near-duplicate chunks (services/near_dup.py) have no embedding of their
+    own: give them their canonical chunk's, in one query.
+    """
+    wanted = {d["duplicate_of"] for d in docs if d.get("embedding") is None and d.get("duplicate_of") is not None}
+    if not wanted:
+        return
+    field = settings.EMBEDDING_FIELD
+    found = {c["_id"]: c.get(field) for c in collection.find({"_id": {"$in": list(wanted)}}, {field: 1})}
+    for d in docs:
+        if d.get("embedding") is None and d.get("duplicate_of") in found:
+            d["embedding"] = found[d["duplicate_of"]]
+
+
+# Rows below which splitting a category into several shards isn't worth a thread hop
+SHARD_MIN_ROWS = 20000
 
 
 def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
@@ -10,14 +71,28 @@ def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
     return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
 
 
+def cosine_scores(query_vec: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity of one query against every row of a matrix.
+    Zero-norm rows (or a zero query) score 0.
+    """
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vec)
+    dots = matrix @ query_vec
+    return np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+
 def search_vectors(
     query_embedding: List[float],
     category: Optional[str],
     pdf_name: Optional[str] = None,
     top_k: int = 5,
+    filters: Optional[SearchFilter] = None,
 ) -> List[Dict]:
     """
-    Vector search with STRICT category and filename filtering.
+    Vector search with STRICT category and filename filtering, plus the
+    optional metadata filters (PDFs, year/date/page ranges).
+    Returned docs keep their 'embedding' and carry the cosine 'score',
+    so rerank stages can work without fetching anything again.
     """
 
     collection = mongo_store.collection
@@ -32,17 +107,292 @@ def search_vectors(
     if category and category.lower() != "all":
         mongo_filter["category"] = category.lower()
 
+    filters = filters or SearchFilter()
+    if pdf_name and not filters.pdf_names:
+        filters = filters.with_pdf_names([pdf_name])
+    mongo_filter.update(filters.mongo_query())
+
     logging.info(f"Vector search filter: {mongo_filter}")
 
-    docs = list(collection.find(mongo_filter))
+    # Global search: per-category shards scored in parallel
+    if "category" not in mongo_filter and settings.VECTOR_INDEX_ENABLED and settings.SEARCH_SHARDS_ENABLED:
+        results = _search_shards(collection, query_vec, top_k, filters)
+        if results is not None:
+            return results
+
+    # Cached in-memory index of the scope; falls back to a streaming scan
+    index = get_index(category)
+    if index is not None:
+        return _search_index(collection, index, query_vec, top_k, filters)
+
+    return _scan(collection, mongo_filter, query_vec, top_k, category)
+
+
+def _scan(collection, mongo_filter: Dict, query_vec: np.ndarray, top_k: int, category: Optional[str]) -> List[Dict]:
+    """
+    Streaming scan: read the scope's embeddings from Mongo and score them.
+    """
+    docs = []
+    with span("mongo_fetch") as s:
+        scanned = 0
+        links = []
+        for doc in collection.find(mongo_filter, chunk_projection(True)):
+            scanned += 1
+            emb = serving_embedding(doc)
+            if emb is None and doc.get("duplicate_of") is not None:
+                links.append(doc)
+            # Skip legacy/broken docs whose dimension does not match the query
+            elif emb and len(emb) == len(query_vec):
+                docs.append(doc)
+        # Near-duplicates count only when the filter left their canonical chunk out
+        in_scope = {d["_id"] for d in docs}
+        links = [d for d in links if d["duplicate_of"] not in in_scope]
+        resolve_links(collection, links)
+        docs += [d for d in links if d.get("embedding") and len(d["embedding"]) == len(query_vec)]
+        # Embeddings dominate the payload: BSON doubles, 8 bytes each
+        s.set(docs_scanned=scanned, docs_usable=len(docs), embedding_bytes=len(docs) * len(query_vec) * 8)
+
+    if not docs:
+        return []
+
+    with span("build_matrix", scope=category or "all") as s:
+        matrix = np.array([d["embedding"] for d in docs], dtype=np.float32)
+        s.set(bytes=matrix.nbytes)
+
+    with span("score", candidates=len(docs)) as s:
+        # Score all chunks with one matrix-vector product
+        scores = cosine_scores(query_vec, matrix)
+
+        k = min(top_k, len(docs))
+        top_idx = np.argpartition(-scores, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-scores[top_idx])]
+
+        # return only relevant chunks
+        results = []
+        for i in top_idx:
+            score = float(scores[i])
+            if score > MIN_SCORE:
+                doc = docs[i]
+                doc["score"] = score
+                results.append(doc)
+        s.set(returned=len(results))
+    return results
+
+
+def _search_index(collection, index: VectorIndex, query_vec: np.ndarray, top_k: int, filters: SearchFilter) -> List[Dict]:
+    """
+    Score against the cached matrix (restricted to the filter's row mask),
+    then fetch only the winning chunks.
+    """
+    # Same rule as the scan: chunks of another dimension never match
+    if index.dim != len(query_vec):
+        return []
+
+    with span("index_search", rows=len(index)) as s:
+        mask = filters.mask(index)
+        if mask is not None:
+            s.set(filter=filters.to_dict(), rows_selected=int(mask.sum()))
+        rows, scores = index.search(query_vec, _candidates(index, top_k), mask=mask)
+        hits = _hits(index, rows, scores)
+        s.set(returned=len(hits))
+
+    return _fetch_hits(collection, hits, query_vec, top_k)
+
+
+def _candidates(index: VectorIndex, top_k: int) -> int:
+    # Reduced indexes over-fetch for the exact rescoring pass
+    return top_k * max(1, settings.VECTOR_RESCORE_FACTOR) if index.reduced else top_k
+
+
+def _hits(index: VectorIndex, rows: np.ndarray, scores: np.ndarray) -> List[Tuple[float, VectorIndex, int]]:
+    # Approximate scores of a reduced index are only checked after rescoring
+    floor = -np.inf if index.reduced else MIN_SCORE
+    return [(float(sc), index, int(r)) for r, sc in zip(rows, scores) if sc > floor]
+
+
+def _fetch_hits(collection, hits: List[Tuple[float, VectorIndex, int]], query_vec: np.ndarray, top_k: int) -> List[Dict]:
+    """
+    Chunk bodies of (score, index, row) hits, best first. The embedding
+    comes from the index, so Mongo only returns the text and metadata;
+    hits of a reduced-dimension index come back with their full embedding
+    and are rescored exactly before the top_k are kept.
+    """
+    if not hits:
+        return []
+
+    rescore = any(index.reduced for _, index, _ in hits)
+    with span("fetch_docs", docs_scanned=len(hits)) as s:
+        ids = [index.ids[row] for _, index, row in hits]
+        found = {d["_id"]: d for d in collection.find({"_id": {"$in": ids}}, chunk_projection(rescore))}
+        s.set(found=len(found))
+        if rescore:
+            s.set(embedding_bytes=len(found) * len(query_vec) * 8)
+
+    if rescore:
+        for doc in found.values():
+            serving_embedding(doc)
+        resolve_links(collection, list(found.values()))
+
+    results = []
+    to_rescore = []
+    for score, index, row in hits:
+        doc = found.get(index.ids[row])
+        if doc is None:
+            # Deleted after the index was built
+            continue
+        if index.reduced:
+            emb = doc.get("embedding")
+            if emb and len(emb) == len(query_vec):
+                to_rescore.append(doc)
+            continue
+        doc["embedding"] = index.row_vector(row).tolist()
+        doc["score"] = score
+        results.append(doc)
+
+    if to_rescore:
+        with span("rescore", candidates=len(to_rescore)) as s:
+            exact = cosine_scores(query_vec, np.array([d["embedding"] for d in to_rescore], dtype=np.float32))
+            for doc, score in zip(to_rescore, exact):
+                if score > MIN_SCORE:
+                    doc["score"] = float(score)
+                    results.append(doc)
+            results.sort(key=lambda d: d["score"], reverse=True)
+            s.set(returned=min(len(results), top_k))
+    return results[:top_k]
+
+
+# ---------------------------------------------------------
+# Scatter-gather global search
+# ---------------------------------------------------------
+
+# "shard": row ranges of built indexes, short and sized to the pool.
+# "slow": index builds and streaming scans. They can outlive the request
+# that started them, so they get their own threads and never hold up the
+# next request's shards.
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def _get_pool(kind: str) -> ThreadPoolExecutor:
+    pool = _pools.get(kind)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(kind)
+            if pool is None:
+                pool = _pools[kind] = ThreadPoolExecutor(
+                    max_workers=max(1, settings.SEARCH_SHARD_WORKERS),
+                    thread_name_prefix=f"search-{kind}",
+                )
+    return pool
+
+
+def _submit(pool: ThreadPoolExecutor, fn, *args):
+    # Workers record their spans into the request's trace
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _plan_shards(index: VectorIndex) -> List[Tuple[VectorIndex, int, int]]:
+    """
+    Split a category index into row ranges of similar size, so one huge
+    category doesn't keep a single worker busy while the others idle.
+    """
+    target = max(SHARD_MIN_ROWS, -(-len(index) // max(1, settings.SEARCH_SHARD_WORKERS)))
+    pieces = -(-len(index) // target)
+    step = -(-len(index) // pieces)
+    return [(index, lo, min(lo + step, len(index))) for lo in range(0, len(index), step)]
+
+
+def _search_shards(collection, query_vec: np.ndarray, top_k: int, filters: SearchFilter) -> Optional[List[Dict]]:
+    """
+    Global search as one search per category (row ranges of the cached
+    category indexes, or a streaming scan for categories that have none)
+    on a thread pool; NumPy releases the GIL during the matrix products.
+    Each shard returns its local top_k and the hits are merged with a heap.
+    SEARCH_SHARD_TIMEOUT_MS covers the whole search, index builds included:
+    categories whose index isn't built by then and shards still running
+    are dropped, and the search returns what the others found.
+    None when the catalog lists no categories, or may be missing some
+    (backfill not done), so the caller searches unsharded.
+    """
+    categories = [c for c in catalog.list_categories() if catalog.list_pdfs(c, limit=1)[1]]
+    if not categories or not catalog.backfilled():
+        return None
+
+    deadline = time.monotonic() + settings.SEARCH_SHARD_TIMEOUT_MS / 1000
+    masks = {}
+    fetch_k = top_k
+
+    def plan(index: VectorIndex) -> List[Tuple[VectorIndex, int, int]]:
+        if not len(index) or index.dim != len(query_vec):
+            return []
+        mask = filters.mask(index)
+        if mask is not None and not mask.any():
+            # Filter excludes the whole category
+            return []
+        masks[index.key] = mask
+        return _plan_shards(index)
+
+    def search_shard(index: VectorIndex, start: int, stop: int) -> List[Tuple]:
+        rows, scores = index.search(query_vec, _candidates(index, top_k), mask=masks[index.key], start=start, stop=stop)
+        return _hits(index, rows, scores)
+
+    def scan_shard(category: str) -> List[Tuple]:
+        mongo_filter = {"category": category, **filters.mongo_query()}
+        return [(d["score"], None, d) for d in _scan(collection, mongo_filter, query_vec, top_k, category)]
+
+    with span("shard_search", categories=len(categories), workers=settings.SEARCH_SHARD_WORKERS) as s:
+        # Missing category indexes are built concurrently (one build per
+        # key); a category's shards start as soon as its index is ready
+        builds = {_submit(_get_pool("slow"), get_index, c): c for c in categories}
+        futures = []
+        shards = scans = failed = 0
+        try:
+            for f in as_completed(builds, timeout=max(0.0, deadline - time.monotonic())):
+                try:
+                    index = f.result()
+                except Exception:
+                    logging.exception("Search shard index failed")
+                    failed += 1
+                    continue
+                if index is None:
+                    futures.append(_submit(_get_pool("slow"), scan_shard, builds[f]))
+                    scans += 1
+                    continue
+                planned = plan(index)
+                if planned:
+                    fetch_k = max(fetch_k, _candidates(index, top_k))
+                futures += [_submit(_get_pool("shard"), search_shard, *shard) for shard in planned]
+                shards += len(planned)
+        except FuturesTimeout:
+            pass
+        # Categories not built in time count as late shards; a build that
+        # already started finishes and serves later requests
+        late = [f for f in builds if not f.done()]
+        for f in late:
+            f.cancel()
 
-    scored = []
-    for doc in docs:
-        emb = np.array(doc.get("embedding", []), dtype=np.float32)
-        score = cosine_similarity(query_vec, emb)
-        scored.append((score, doc))
+        done, pending = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        for f in pending:
+            f.cancel()
 
-    scored.sort(key=lambda x: x[0], reverse=True)
+        candidates = []
+        for f in done:
+            try:
+                candidates.extend(f.result())
+            except Exception:
+                logging.exception("Search shard failed")
+                failed += 1
+        timed_out = len(pending) + len(late)
+        if timed_out or failed:
+            logging.warning("Global search: %d shard(s) timed out, %d failed; returning partial results", timed_out, failed)
+        s.set(
+            shards=shards, scans=scans, late_builds=len(late),
+            timed_out=timed_out, failed=failed, candidates=len(candidates),
+        )
 
-    # return only relevant chunks
-    return [doc for score, doc in scored[:top_k] if score > 0.15]
+    best = heapq.nlargest(fetch_k, candidates, key=lambda c: c[0])
+    # Bodies of index hits in one query; scan hits already carry theirs
+    results = [hit for _, index, hit in best if index is None]
+    results += _fetch_hits(collection, [h for h in best if h[1] is not None], query_vec, top_k)
+    results.sort(key=lambda d: d["score"], reverse=True)
+    return results[:top_k]
@@ -0,0 +1,145 @@
+import logging
+import time
+from typing import Callable, Dict, List
+
+from config.settings import settings
+from services.tracing import span, trace
+
+
+def _step(timings: Dict[str, float], name: str, fn: Callable[[], object]) -> None:
+    """
+    Run one warm-up step under its own span; failures are logged, never raised
+    (a half-warm instance still serves requests).
+    """
+    start = time.perf_counter()
+    try:
+        with span(name):
+            fn()
+    except Exception:
+        logging.exception("Warm-up step '%s' failed", name)
+    timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def _import_sdks() -> None:
+    # Deferred by the services modules; pay for them here instead of in the first request
+    import numpy  # noqa: F401
+    import openai  # noqa: F401
+    import pymongo  # noqa: F401
+    import pypdf  # noqa: F401
+    import azure.storage.blob  # noqa: F401
+
+
+def _connect_mongo() -> None:
+    from services.mongo_store import mongo_store
+
+    # First access creates the pooled client and pings the server
+    if mongo_store.collection is None:
+        raise RuntimeError("MongoDB unavailable")
+
+
+def _connect_storage() -> None:
+    from services.blob_store import get_blob_service
+
+    if get_blob_service() is None:
+        raise RuntimeError("Storage connection string missing")
+
+
+def _openai_clients() -> None:
+    from services.embeddings import get_embedding_client
+    from services.llm_router import get_router
+
+    get_embedding_client()
+    for provider in get_router().providers:
+        provider.client
+
+
+def _load_catalog() -> None:
+    from services import catalog
+
+    catalog.list_categories()
+    catalog.get_latest_pdf()
+
+
+def _hot_scopes() -> List[str]:
+    """
+    Index keys to preload: WARMUP_CATEGORIES, or for "auto" the whole
+    collection (auto-scoped and global chats), the latest PDF's category and
+    then the categories with the most chunks.
+    """
+    from services import catalog
+
+    configured = settings.WARMUP_CATEGORIES.strip().lower()
+    if configured != "auto":
+        scopes = [c.strip() for c in configured.split(",") if c.strip()]
+    else:
+        scopes = ["all"]
+        latest = catalog.get_latest_pdf()
+        if latest and latest.get("category"):
+            scopes.append(latest["category"].lower())
+
+        sizes = {}
+        for category in catalog.list_categories():
+            entries, _ = catalog.list_pdfs(category)
+            sizes[category] = sum(e.get("chunk_count") or 0 for e in entries)
+        scopes += sorted((c for c, n in sizes.items() if n), key=lambda c: -sizes[c])
+
+    unique: List[str] = []
+    for scope in scopes:
+        if scope not in unique:
+            unique.append(scope)
+    return unique[:settings.WARMUP_MAX_INDEXES]
+
+
+def _preload_global() -> None:
+    from services import catalog
+    from services.vector_index import get_index
+
+    if not settings.SEARCH_SHARDS_ENABLED:
+        get_index(None)
+        return
+    # Global search runs on the category indexes (shards)
+    for category in catalog.list_categories():
+        if catalog.list_pdfs(category, limit=1)[1]:
+            get_index(category)
+
+
+def _preload_indexes(timings: Dict[str, float]) -> None:
+    from services.vector_index import get_index
+
+    if not settings.VECTOR_INDEX_ENABLED:
+        return
+    for scope in _hot_scopes():
+        if scope == "all":
+            _step(timings, "index:all", _preload_global)
+        else:
+            _step(timings, f"index:{scope}", lambda scope=scope: get_index(scope))
+
+
+def _load_scorer() -> None:
+    if "cross_encoder" not in settings.RERANK_STAGES:
+        return
+    from services.cross_encoder import get_scorer
+    get_scorer()
+
+
+def run_warmup() -> Dict[str, float]:
+    """
+    Open pooled clients, ping Mongo, load the catalog and preload the hot
+    vector indexes so the next request on this instance is a warm one.
+    Returns milliseconds per step (and "total").
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    with trace("warmup"):
+        _step(timings, "import_sdks", _import_sdks)
+        _step(timings, "mongo", _connect_mongo)
+        _step(timings, "storage", _connect_storage)
+        _step(timings, "openai_clients", _openai_clients)
+        _step(timings, "catalog", _load_catalog)
+        _preload_indexes(timings)
+        _step(timings, "scorer", _load_scorer)
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    logging.info("Warm-up finished in %.0f ms: %s", timings["total"], timings)
+    return timings
@@ -0,0 +1,121 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, Optional, Tuple
+from config.settings import settings
+
+# Global lazy queue clients, one per queue name
+_clients: Dict[str, object] = {}
+
+# In-memory backend (WORK_QUEUE_BACKEND=memory): local runs and benchmarks
+# (monotonic time the message becomes visible, body)
+_memory_queues: Dict[str, Deque[Tuple[float, str]]] = defaultdict(deque)
+_memory_lock = threading.Lock()
+_handlers: Dict[str, Callable[[dict], None]] = {}
+
+
+def _get_queue_client(queue_name: str):
+    client = _clients.get(queue_name)
+    if client is not None:
+        return client
+
+    from azure.core.exceptions import ResourceExistsError
+    from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+
+    conn = settings.AZURE_STORAGE_CONNECTION_STRING
+    if not conn:
+        raise RuntimeError("Storage connection string missing")
+
+    # Functions queue triggers expect base64 encoded messages by default
+    client = QueueClient.from_connection_string(
+        conn, queue_name, message_encode_policy=TextBase64EncodePolicy()
+    )
+    try:
+        client.create_queue()
+    except ResourceExistsError:
+        pass
+
+    _clients[queue_name] = client
+    return client
+
+
+def enqueue(queue_name: str, payload: dict, delay_seconds: Optional[int] = None) -> None:
+    """
+    Send a JSON message to a storage queue (optionally hidden for delay_seconds).
+    Works against Azure Storage or Azurite.
+    """
+    body = json.dumps(payload)
+    if settings.WORK_QUEUE_BACKEND == "memory":
+        with _memory_lock:
+            _memory_queues[queue_name].append((time.monotonic() + (delay_seconds or 0), body))
+    else:
+        client = _get_queue_client(queue_name)
+        client.send_message(body, visibility_timeout=delay_seconds)
+    logging.info("Enqueued message on '%s': %s", queue_name, payload)
+
+
+def delay_until(when: datetime) -> int:
+    """
+    Visibility delay (seconds, at least 1) for a message that should not be
+    delivered before `when`, e.g. the expiry of a work item's lease.
+    """
+    if when.tzinfo is None:
+        # pymongo returns naive UTC datetimes
+        when = when.replace(tzinfo=timezone.utc)
+    seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    # Storage queues hide messages for at most 7 days
+    return int(min(max(seconds + 1, 1), 7 * 24 * 3600))
+
+
+def register_handler(queue_name: str, handler: Callable[[dict], None]) -> None:
+    """
+    Handler used by drain() for the in-memory backend.
+    """
+    _handlers[queue_name] = handler
+
+
+def drain(queue_name: str, workers: int = 4) -> int:
+    """
+    Process in-memory messages with a pool of parallel workers until the queue
+    (including messages enqueued by the handlers themselves) is empty.
+    Returns the number of messages handled.
+    """
+    handler = _handlers[queue_name]
+    handled = 0
+
+    def pop() -> Optional[str]:
+        with _memory_lock:
+            q = _memory_queues[queue_name]
+            now = time.monotonic()
+            for i, (visible_at, body) in enumerate(q):
+                if visible_at <= now:
+                    del q[i]
+                    return body
+            return None
+
+    def pending() -> bool:
+        with _memory_lock:
+            return bool(_memory_queues[queue_name])
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"queue-{queue_name}") as pool:
+        while True:
+            batch = []
+            while len(batch) < workers and (body := pop()) is not None:
+                batch.append(body)
+            if not batch:
+                if not pending():
+                    break
+                # Only delayed messages left
+                time.sleep(0.05)
+                continue
+            for fut in [pool.submit(handler, json.loads(b)) for b in batch]:
+                try:
+                    fut.result()
+                except Exception:
+                    logging.exception("In-memory queue handler failed")
+                handled += 1
+    return handled
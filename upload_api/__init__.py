@@ -2,8 +2,72 @@ import logging
 import azure.functions as func
 import json
 import os
-from azure.storage.blob import BlobServiceClient, ContentSettings
+from concurrent.futures import ThreadPoolExecutor
+from azure.core.exceptions import ResourceExistsError
 
+from config.settings import settings
+from services.blob_store import get_container_client
+from services.tracing import traced
+
+_container_ready = False
+
+EXISTS_MESSAGE = (
+    "A document with this name already exists. Please rename the file "
+    "or remove the existing document before uploading again."
+)
+
+
+def _ensure_container(container_client) -> None:
+    global _container_ready
+    if _container_ready:
+        return
+    try:
+        container_client.create_container()
+    except ResourceExistsError:
+        pass
+    _container_ready = True
+
+
+def _upload_one(container_client, category: str, file_item) -> dict:
+    """
+    Upload one multipart file as a block blob. Large files are staged in
+    blocks uploaded BLOB_MAX_CONCURRENCY at a time, streamed from the request.
+    """
+    # Use ORIGINAL filename
+    filename = file_item.filename
+    if not filename:
+        filename = "uploaded_file.pdf"
+
+    # Clean filename just in case
+    filename = os.path.basename(filename)
+
+    # Construct path: category/filename
+    blob_path = f"{category}/{filename}"
+    result = {"file": filename, "blob_path": blob_path}
+
+    from azure.storage.blob import ContentSettings
+
+    try:
+        # overwrite=False fails atomically if the blob exists (no exists() round-trip)
+        container_client.get_blob_client(blob_path).upload_blob(
+            file_item.stream,
+            overwrite=False,
+            max_concurrency=settings.BLOB_MAX_CONCURRENCY,
+            content_settings=ContentSettings(content_type="application/pdf")
+        )
+        result["status"] = "uploaded"
+        logging.info(f"Uploaded: {blob_path}")
+    except ResourceExistsError:
+        result["status"] = "exists"
+        result["error"] = EXISTS_MESSAGE
+    except Exception as e:
+        logging.exception(f"Upload failed: {blob_path}")
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+
+@traced("upload_api")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("Upload API triggered")
 
@@ -37,65 +101,45 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             )
 
         # 3. Connection
-        connection_string = (
-            os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-            or os.getenv("AzureWebJobsStorage")
-        )
-        if not connection_string:
+        container_client = get_container_client()
+        if container_client is None:
             raise ValueError("Storage connection string missing")
+        _ensure_container(container_client)
 
-        blob_service = BlobServiceClient.from_connection_string(connection_string)
-        container_client = blob_service.get_container_client("pdfs")
-        
-        if not container_client.exists():
-            container_client.create_container()
+        # 4. Upload files in parallel, one status per file
+        workers = max(1, min(len(files), settings.UPLOAD_MAX_PARALLEL_FILES))
+        if workers == 1:
+            results = [_upload_one(container_client, category, f) for f in files]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as pool:
+                results = list(pool.map(lambda f: _upload_one(container_client, category, f), files))
 
-        uploaded_paths = []
+        uploaded_paths = [r["blob_path"] for r in results if r["status"] == "uploaded"]
+        failed = [r for r in results if r["status"] != "uploaded"]
 
-        # 4. Upload Each File
-        for file_item in files:
-            # Use ORIGINAL filename
-            filename = file_item.filename
-            if not filename:
-                filename = "uploaded_file.pdf"
-            
-            # Clean filename just in case
-            filename = os.path.basename(filename)
+        if not failed:
+            status_code, message = 200, "Upload successful"
+        elif not uploaded_paths:
+            # Keep the single-file 409 contract when nothing was uploaded
+            all_exist = all(r["status"] == "exists" for r in failed)
+            status_code = 409 if all_exist else 500
+            message = EXISTS_MESSAGE if all_exist and len(results) == 1 else "Upload failed"
+        else:
+            status_code = 207
+            message = f"Uploaded {len(uploaded_paths)} of {len(results)} files"
 
-            # Construct path: category/filename
-            blob_path = f"{category}/{filename}"
-            
-            blob_client = container_client.get_blob_client(blob_path)
-            
-            # Check if file already exists
-            if blob_client.exists():
-                return func.HttpResponse(
-                    json.dumps({
-                        "error": "A document with this name already exists. Please rename the file or remove the existing document before uploading again."
-                    }),
-                    status_code=409,
-                    mimetype="application/json"
-                )
-
-            # Read file content
-            file_content = file_item.read()
-            
-            blob_client.upload_blob(
-                file_content,
-                overwrite=False,
-                content_settings=ContentSettings(content_type="application/pdf")
-            )
-            
-            uploaded_paths.append(blob_path)
-            logging.info(f"Uploaded: {blob_path}")
+        body = {
+            "message": message,
+            "category": category,
+            "files": uploaded_paths,
+            "results": results,
+        }
+        if not uploaded_paths:
+            body["error"] = message
 
         return func.HttpResponse(
-            json.dumps({
-                "message": "Upload successful",
-                "category": category,
-                "files": uploaded_paths
-            }),
-            status_code=200,
+            json.dumps(body),
+            status_code=status_code,
             mimetype="application/json"
         )
 
@@ -0,0 +1,88 @@
+import logging
+import azure.functions as func
+import json
+import os
+
+from config.settings import settings
+from services.blob_store import get_container_client, generate_upload_sas
+from services.tracing import traced
+
+
+@traced("upload_sas_api")
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Issues short-lived SAS URLs so the browser can upload large PDFs
+    straight to blob storage (block staging) without passing through
+    the Function. Body: {"category": str, "files": [str, ...]}
+
+    Existing blobs are not checked here: the client commits the block
+    list with If-None-Match: * and reports a 409/412 as "exists".
+    """
+    logging.info("Upload SAS API triggered")
+
+    from services.auth import validate_pin
+    if auth_error := validate_pin(req):
+        return auth_error
+
+    try:
+        try:
+            body = req.get_json()
+        except ValueError:
+            body = {}
+        if not isinstance(body, dict):
+            return func.HttpResponse(
+                json.dumps({"error": "Request body must be a JSON object"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+
+        category = (body.get("category") or "uncategorized").lower()
+        names = body.get("files") or []
+        if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+            return func.HttpResponse(
+                json.dumps({"error": "files must be a list of names"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+        if not names:
+            return func.HttpResponse(
+                json.dumps({"error": "No files requested"}),
+                status_code=400,
+                mimetype="application/json"
+            )
+
+        if get_container_client() is None:
+            raise ValueError("Storage connection string missing")
+
+        results = []
+        for name in names:
+            filename = os.path.basename(name or "") or "uploaded_file.pdf"
+            blob_path = f"{category}/{filename}"
+            url = generate_upload_sas(blob_path, settings.UPLOAD_SAS_TTL_SECONDS)
+            if url is None:
+                # No account key (e.g. managed identity): client falls back to multipart
+                return func.HttpResponse(
+                    json.dumps({"error": "Direct upload not available"}),
+                    status_code=501,
+                    mimetype="application/json"
+                )
+            results.append({
+                "file": filename,
+                "blob_path": blob_path,
+                "status": "ready",
+                "upload_url": url,
+            })
+
+        return func.HttpResponse(
+            json.dumps({"category": category, "results": results}),
+            status_code=200,
+            mimetype="application/json"
+        )
+
+    except Exception as e:
+        logging.exception("Upload SAS API failed")
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=500,
+            mimetype="application/json"
+        )
@@ -0,0 +1,13 @@
+import logging
+import azure.functions as func
+
+from services.warmup import run_warmup
+
+
+def main(warmupContext: func.Context) -> None:
+    """
+    Runs on every new instance before it receives traffic (Premium / Elastic
+    Premium plans): opens clients and preloads the hot indexes.
+    """
+    logging.info("Warm-up trigger fired")
+    run_warmup()
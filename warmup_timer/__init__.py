@@ -0,0 +1,14 @@
+import logging
+import azure.functions as func
+
+from services.warmup import run_warmup
+
+
+def main(timer: func.TimerRequest) -> None:
+    """
+    Keeps one instance warm on plans without the warm-up trigger (and
+    refreshes its indexes before VECTOR_INDEX_TTL_SECONDS expires them).
+    """
+    if timer.past_due:
+        logging.info("Warm-up timer is past due")
+    run_warmup()